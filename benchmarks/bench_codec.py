@@ -0,0 +1,73 @@
+'''
+Cost of decoding search pages with the standard library json module versus
+orjson, and bytes on the wire for plain versus gzip-compressed responses and
+request bodies, against the local HTTPS stand-in server.
+
+    python benchmarks/bench_codec.py [--pages 200]
+'''
+import os
+import sys
+import json
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fortidlp.codec import StdlibCodec, OrjsonCodec
+from fortidlp.connector import APIHandler
+from fortidlp.fortidlp import Agents, Incidents
+from fortidlp.metrics import Metrics
+from mock_server import MockFortiDLPServer, _record
+
+
+def decode_time(codec, page, count):
+    start = time.perf_counter()
+    for _ in range(count):
+        codec.loads(page)
+    return (time.perf_counter() - start) / count
+
+
+def transfer(host, codec, compress_threshold, pages):
+    metrics = Metrics()
+    connection = APIHandler(metrics=metrics, codec=codec, compress_threshold=compress_threshold)
+    connection.conn({'Authorization': 'Bearer benchmark'}, host, enable_ssl=False)
+    start = time.perf_counter()
+    for _ in range(pages):
+        assert Incidents(connection).search_incidents()['status']
+    elapsed = time.perf_counter() - start
+    ids = [f'{i:08d}-0000-4000-8000-000000000000' for i in range(10000)]
+    assert Agents(connection).delete_archived_agents(ids, chunk_size=len(ids))['status']
+    connection.close()
+    snapshot = metrics.snapshot()
+    search = snapshot['POST /api/v2/incidents/search']
+    delete = snapshot['PUT /api/v1/admin/agents/archived/delete']
+    return pages / elapsed, search['bytes_received'] / pages, delete['bytes_sent']
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--pages', type=int, default=200)
+    args = parser.parse_args()
+
+    page = json.dumps({'results': [_record(n, 2048) for n in range(100)]}).encode()
+    stdlib = StdlibCodec()
+    try:
+        fast = OrjsonCodec()
+    except ImportError:
+        fast = None
+
+    print(f'decode a {len(page) / 1024:.0f} KiB page:')
+    print(f'  json:    {decode_time(stdlib, page, args.pages) * 1000:7.2f} ms')
+    if fast is not None:
+        print(f'  orjson:  {decode_time(fast, page, args.pages) * 1000:7.2f} ms')
+
+    with MockFortiDLPServer(page_size=100, record_size=2048) as host:
+        rate, received, sent = transfer(host, stdlib, None, args.pages)
+        print(f'json, plain:    {rate:7.1f} pages/s  {received / 1024:7.1f} KiB/page received  {sent / 1024:7.1f} KiB sent for 10000 IDs')
+    with MockFortiDLPServer(page_size=100, record_size=2048, compress=True) as host:
+        rate, received, sent = transfer(host, fast or stdlib, 1024, args.pages)
+        print(f'{(fast or stdlib).name}, gzip:   {rate:7.1f} pages/s  {received / 1024:7.1f} KiB/page received  {sent / 1024:7.1f} KiB sent for 10000 IDs')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+'''
+MB/s of Policies.export_policy_groups style downloads against the local HTTPS
+stand-in server, comparing the previous 1 KiB iter_content loop with the
+streaming readinto path, and checking that a dropped connection is resumed.
+
+    python benchmarks/bench_download.py [--size-mb 256]
+'''
+import os
+import sys
+import time
+import hashlib
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fortidlp.connector import APIHandler
+from mock_server import MockFortiDLPServer
+
+URL = '/api/v1/policies/export'
+
+
+def connect(host):
+    connection = APIHandler()
+    connection.conn({'Authorization': 'Bearer benchmark'}, host, enable_ssl=False)
+    return connection
+
+
+def small_chunks(host, folder):
+    connection = connect(host)
+    start = time.perf_counter()
+    response = connection.session.get(f'https://{host}{URL}', headers=connection.headers, verify=False, stream=True)
+    with open(os.path.join(folder, 'before.zip'), 'wb') as f:
+        for chunk in response.iter_content(chunk_size=1024):
+            f.write(chunk)
+    return time.perf_counter() - start
+
+
+def streaming(host, folder):
+    connection = connect(host)
+    start = time.perf_counter()
+    result = connection.download(URL, download_folder=folder)
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--size-mb', type=int, default=256)
+    args = parser.parse_args()
+    size = args.size_mb << 20
+
+    with tempfile.TemporaryDirectory() as folder, MockFortiDLPServer(download_size=size) as host:
+        before = small_chunks(host, folder)
+        after, result = streaming(host, folder)
+
+    print(f'1 KiB iter_content:  {args.size_mb / before:8.1f} MB/s')
+    print(f'streaming readinto:  {args.size_mb / after:8.1f} MB/s ({before / after:.1f}x)')
+
+    server = MockFortiDLPServer(download_size=size, drop_after=size // 3)
+    with tempfile.TemporaryDirectory() as folder:
+        host = server.start()
+        try:
+            seconds, result = streaming(host, folder)
+            intact = hashlib.sha256(server.payload).hexdigest() == result.get('hash')
+        finally:
+            server.stop()
+    print(f'resumed after drop:  {args.size_mb / seconds:8.1f} MB/s, status={result["status"]}, size={result.get("size")}, hash ok={intact}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+'''
+Rows/s of the columnar export of agents to CSV, Parquet and Arrow IPC against
+the local HTTPS stand-in server, each file being read back and checked
+against the records the API returned.
+
+    python benchmarks/bench_export.py [--pages 20] [--page-size 500]
+
+Parquet and Arrow IPC are skipped without pyarrow.
+'''
+import os
+import sys
+import csv
+import json
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fortidlp import export
+from fortidlp.connector import APIHandler
+from fortidlp.fortidlp import Agents
+from mock_server import MockFortiDLPServer
+
+
+def read_back(path: str, format: str) -> list:
+    '''The rows of an exported file as dicts.'''
+    if format == 'csv':
+        with open(path, newline='', encoding='utf-8') as f:
+            return list(csv.DictReader(f))
+    if format == 'parquet':
+        return export.pyarrow.parquet.read_table(path).to_pylist()
+    with export.pyarrow.ipc.open_file(path) as reader:
+        return reader.read_all().to_pylist()
+
+
+def check(rows: list, records: list, format: str):
+    assert len(rows) == len(records), (len(rows), len(records))
+    for row, record in zip(rows, records):
+        assert row['id'] == record['id']
+        assert row['cluster_data.padding'] == record['cluster_data']['padding']
+        assert json.loads(row['users']) == record['users']
+        if format != 'csv':
+            assert row[export.EXTRA_COLUMN] is None
+
+
+def check_empty(folder: str, format: str):
+    '''An export without records is a readable file with the declared columns.'''
+    path = os.path.join(folder, f'empty.{format}')
+    result = export.write(iter([]), path, columns=['id', 'hostname'])
+    assert result['rows'] == 0
+    if format == 'csv':
+        with open(path, newline='', encoding='utf-8') as f:
+            assert next(csv.reader(f)) == ['id', 'hostname']
+    else:
+        table = export.pyarrow.parquet.read_table(path) if format == 'parquet' else export.pyarrow.ipc.open_file(path).read_all()
+        assert table.num_rows == 0 and table.column_names == ['id', 'hostname']
+
+
+def check_types(folder: str):
+    '''A later value the inferred type cannot hold fails instead of turning into a null.'''
+    pages = [[{'id': 'a', 'size': 1}], [{'id': 'b', 'size': 'large'}]]
+    path = os.path.join(folder, 'mixed.parquet')
+    try:
+        export.write(iter(pages), path, batch_rows=1)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError('a string in an int64 column was accepted')
+    assert not os.path.exists(path)
+    export.write(iter(pages), path, batch_rows=1, column_types={'size': export.pyarrow.string()})
+    assert [row['size'] for row in read_back(path, 'parquet')] == ['1', 'large']
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--pages', type=int, default=20)
+    parser.add_argument('--page-size', type=int, default=500)
+    args = parser.parse_args()
+
+    formats = ['csv'] + (['parquet', 'arrow'] if export.pyarrow is not None else [])
+    if export.pyarrow is None:
+        print('pyarrow is not installed: Parquet and Arrow IPC skipped')
+
+    with MockFortiDLPServer(pages=args.pages, page_size=args.page_size, record_size=1024) as host, tempfile.TemporaryDirectory() as folder:
+        connection = APIHandler()
+        connection.conn({'Authorization': 'Bearer benchmark'}, host, enable_ssl=False)
+        agents = Agents(connection)
+        records = list(agents.iter_agents(results_per_page=args.page_size))
+
+        for format in formats:
+            path = os.path.join(folder, f'agents.{format}')
+            start = time.perf_counter()
+            result = export.export_agents(path, agents, results_per_page=args.page_size)
+            elapsed = time.perf_counter() - start
+            check(read_back(path, format), records, format)
+            check_empty(folder, format)
+            print(f'{format:8s} {result["rows"]:7d} rows  {elapsed * 1000:8.1f} ms  {result["rows"] / elapsed:9.0f} rows/s  '
+                  f'{os.path.getsize(path) / 1024:9.1f} KiB')
+        if export.pyarrow is not None:
+            check_types(folder)
+        connection.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+'''
+Memory held per record by plain dicts versus the compact models of
+fortidlp.models, for agent and incident shaped records decoded from JSON
+pages as the client receives them.
+
+    python benchmarks/bench_models.py [--records 100000]
+'''
+import os
+import sys
+import json
+import time
+import argparse
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fortidlp.models import Agent, Incident
+from mock_server import _record
+
+PAGE_SIZE = 1000
+
+
+def _agent(number):
+    return {
+        'id': f'{number:08d}-0000-4000-8000-000000000000',
+        'hostname': f'LAPTOP-{number:06d}',
+        'status': 'online',
+        'os': 'windows',
+        'os_version': '10.0.19045',
+        'agent_version': '7.1.3',
+        'ip_address': f'10.{number >> 16 & 255}.{number >> 8 & 255}.{number & 255}',
+        'last_seen': f'2026-01-01T00:{number % 60:02d}:00Z',
+        'users': [{'name': f'user-{number}', 'email': f'user-{number}@example.com', 'domain': 'CORP'}],
+        'labels': [{'id': str(number % 7), 'name': 'Finance'}, {'id': '42', 'name': 'Laptops'}],
+    }
+
+
+def pages(make, records):
+    '''JSON pages of `records` records, as the API would send them.'''
+    for start in range(0, records, PAGE_SIZE):
+        yield json.dumps({'results': [make(n) for n in range(start, min(records, start + PAGE_SIZE))]})
+
+
+def decode(texts, model=None):
+    kept = []
+    for text in texts:
+        items = json.loads(text)['results']
+        kept.extend(model.from_list(items) if model else items)
+    return kept
+
+
+def held(make, records, model=None):
+    '''Bytes still allocated once every page has been decoded and kept, and the decoding time.'''
+    texts = list(pages(make, records))
+    start = time.perf_counter()
+    decode(texts, model)
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    kept = decode(texts, model)
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return size, elapsed, kept
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--records', type=int, default=100000)
+    args = parser.parse_args()
+
+    for name, make, model in (('agents', _agent, Agent), ('incidents', lambda n: _record(n, 600), Incident)):
+        plain, plain_time, dicts = held(make, args.records)
+        compact, compact_time, models = held(make, args.records, model)
+        assert models[-1].raw == dicts[-1]
+        del dicts, models
+        print(f'{name:9s} dict: {plain / args.records:7.0f} B/record ({plain_time:5.2f} s)   '
+              f'{model.__name__}: {compact / args.records:7.0f} B/record ({compact_time:5.2f} s)   '
+              f'saving {(1 - compact / plain) * 100:4.1f}%')
+
+
+if __name__ == '__main__':
+    main()
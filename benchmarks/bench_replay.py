@@ -0,0 +1,79 @@
+'''
+Client-side cost of pagination, streamed parsing and bulk calls, replayed
+from a cassette so the network is out of the measurement.
+
+    python benchmarks/bench_replay.py [--runs 20] [--cassette traffic.cassette.gz]
+
+Without --cassette the traffic is first recorded from the local stand-in
+server. A cassette recorded against a real tenant with the same calls (see
+APIHandler.record) replays its production payloads instead.
+'''
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fortidlp.chunking import submit_chunks
+from fortidlp.connector import APIHandler
+from fortidlp.fortidlp import Incidents
+from mock_server import MockFortiDLPServer
+
+IDS = [f'{i:08d}-0000-4000-8000-000000000000' for i in range(10000)]
+
+CASES = {
+    'iter_incidents': lambda c: sum(1 for _ in Incidents(c).iter_incidents(results_per_page=500)),
+    'iter_incidents(stream)': lambda c: sum(1 for _ in Incidents(c).iter_incidents(results_per_page=500, stream=True)),
+    # Fixed chunk sizes: adaptive ones depend on timing, so the request
+    # bodies would not match the recorded ones.
+    'delete_archived_agents': lambda c: submit_chunks(
+        lambda chunk: c.insert('/api/v1/admin/agents/archived/delete', params={'agent_ids': chunk}),
+        IDS, chunk_size=1000, adaptive=False)['data']['succeeded'],
+}
+
+
+def _connection(host):
+    connection = APIHandler()
+    connection.conn({'Authorization': 'Bearer benchmark'}, host, enable_ssl=False)
+    return connection
+
+
+def record(path):
+    with MockFortiDLPServer(pages=20, page_size=500, record_size=2048) as host:
+        connection = _connection(host)
+        connection.record(path)
+        for case in CASES.values():
+            case(connection)
+        connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=20)
+    parser.add_argument('--cassette', help='cassette to replay (recorded from the stand-in server when omitted)')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        path = args.cassette
+        if path is None:
+            path = os.path.join(folder, 'bench.cassette.gz')
+            record(path)
+
+        connection = _connection('replay.invalid')
+        for name, case in CASES.items():
+            connection.replay(path, latency_scale=0)
+            timings, items = [], 0
+            for _ in range(args.runs):
+                start = time.perf_counter()
+                items = case(connection)
+                timings.append(time.perf_counter() - start)
+            timings.sort()
+            print(f'{name:24s} {items:7d} items  median {timings[len(timings) // 2] * 1000:8.2f} ms  '
+                  f'{items / timings[len(timings) // 2]:10.0f} items/s')
+        connection.close()
+
+
+if __name__ == '__main__':
+    main()
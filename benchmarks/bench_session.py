@@ -0,0 +1,54 @@
+'''
+Requests/sec of APIHandler against the local HTTPS stand-in server, comparing
+a fresh connection per call (the previous behaviour) with the pooled session.
+
+    python benchmarks/bench_session.py [--requests 500]
+'''
+import os
+import sys
+import time
+import argparse
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fortidlp.connector import APIHandler
+from mock_server import MockFortiDLPServer
+
+requests.packages.urllib3.disable_warnings()
+
+
+def unpooled(host, count):
+    headers = {'Authorization': 'Bearer benchmark'}
+    start = time.perf_counter()
+    for _ in range(count):
+        requests.request('POST', f'https://{host}/api/v2/agents/search', headers=headers, json={}, verify=False).json()
+    return count / (time.perf_counter() - start)
+
+
+def pooled(host, count):
+    connection = APIHandler()
+    connection.conn({'Authorization': 'Bearer benchmark'}, host, enable_ssl=False)
+    start = time.perf_counter()
+    for _ in range(count):
+        connection.send('/api/v2/agents/search')
+    elapsed = time.perf_counter() - start
+    connection.close()
+    return count / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=500)
+    args = parser.parse_args()
+
+    with MockFortiDLPServer() as host:
+        before = unpooled(host, args.requests)
+        after = pooled(host, args.requests)
+
+    print(f'new connection per call: {before:8.1f} req/s')
+    print(f'pooled session:          {after:8.1f} req/s ({after / before:.1f}x)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+'''
+Import time and cold-start latency, as paid by short-lived invocations.
+
+Every measurement runs in a fresh interpreter: the import of fortidlp alone
+(requests is now loaded on first use) and a cold start made of the import,
+auth() and a first API call against the local stand-in server, with the
+token probed eagerly, lazily, or skipped thanks to a primed TokenCache.
+
+    python benchmarks/bench_startup.py [--runs 15] [--latency 0.05]
+'''
+import os
+import sys
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from mock_server import MockFortiDLPServer
+
+IMPORT = '''
+import time
+start = time.perf_counter()
+{imports}
+print(time.perf_counter() - start)
+'''
+
+COLD_START = '''
+import sys, time
+start = time.perf_counter()
+import fortidlp
+from fortidlp.fortidlp import auth, TokenCache
+fortidlp.ignore_certificate()
+cache = TokenCache(sys.argv[3]) if sys.argv[3] else None
+result = auth(sys.argv[1], 'benchmark', validate=sys.argv[2], token_cache=cache)
+assert result['status'], result
+assert fortidlp.fortidlp.fortidlp_connection.send('/api/v2/agents/search')['status']
+print(time.perf_counter() - start)
+'''
+
+
+def run(code, *args):
+    output = subprocess.run([sys.executable, '-c', code, *args], cwd=ROOT, check=True, capture_output=True, text=True).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def median_ms(code, runs, *args):
+    return statistics.median(run(code, *args) for _ in range(runs)) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=15)
+    parser.add_argument('--latency', type=float, default=0.05, help='simulated round-trip time of the server (seconds)')
+    args = parser.parse_args()
+
+    print('import time (median):')
+    print(f'  import fortidlp:            {median_ms(IMPORT.format(imports="import fortidlp"), args.runs):7.1f} ms')
+    print(f'  import requests, fortidlp:  {median_ms(IMPORT.format(imports="import requests, fortidlp"), args.runs):7.1f} ms (previous behaviour)')
+
+    with tempfile.TemporaryDirectory() as folder, MockFortiDLPServer(latency=args.latency) as host:
+        cache = os.path.join(folder, 'tokens.json')
+        run(COLD_START, host, 'eager', cache)
+
+        print(f'cold start, import + auth + first call (median, {args.latency * 1000:.0f} ms server latency):')
+        print(f'  validate=eager:             {median_ms(COLD_START, args.runs, host, "eager", ""):7.1f} ms')
+        print(f'  validate=lazy:              {median_ms(COLD_START, args.runs, host, "lazy", ""):7.1f} ms')
+        print(f'  token cache hit:            {median_ms(COLD_START, args.runs, host, "eager", cache):7.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
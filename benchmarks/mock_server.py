@@ -0,0 +1,305 @@
+'''
+Local stand-in for the FortiDLP management API, used by the benchmarks.
+
+The server speaks HTTPS with a throw-away self-signed certificate (generated
+with the openssl command line tool) and keeps connections alive, so the
+numbers reflect what a client sees against a real management host.
+
+It can also run as its own process, printing its host on the first line of
+stdout and serving until stdin is closed, which keeps its memory and CPU
+out of the measurements of the client:
+
+    python benchmarks/mock_server.py --pages 10 --throttle-every 5
+'''
+import sys
+import os
+import ssl
+import gzip
+import json
+import time
+import argparse
+import shutil
+import tempfile
+import threading
+import subprocess
+from datetime import datetime, timedelta, timezone
+from urllib.parse import parse_qs, urlsplit
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def _self_signed_certificate(folder):
+    cert = os.path.join(folder, 'cert.pem')
+    key = os.path.join(folder, 'key.pem')
+    subprocess.run(
+        ['openssl', 'req', '-x509', '-newkey', 'ec', '-pkeyopt', 'ec_paramgen_curve:prime256v1', '-nodes', '-days', '1',
+         '-subj', '/CN=127.0.0.1', '-keyout', key, '-out', cert],
+        check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    return cert, key
+
+
+def _record(number, size):
+    '''A fake record of roughly `size` bytes, shaped like an incident.'''
+    return {
+        'id': f'{number:08d}-0000-4000-8000-000000000000',
+        'timestamp': f'2026-01-01T00:00:{number % 60:02d}Z',
+        'hostname': f'host-{number}',
+        'users': [{'name': f'user-{number}', 'email': f'user-{number}@example.com'}],
+        'labels': [{'id': str(number % 7), 'name': 'label'}],
+        'cluster_data': {'padding': 'x' * max(0, size - 300)},
+    }
+
+
+# End of the time line the records are spread over with `timeline_days`.
+TIMELINE_END = datetime(2026, 2, 1, tzinfo=timezone.utc)
+
+
+def _time(value):
+    # Times without a timezone are UTC, as for the API.
+    moment = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    return moment if moment.tzinfo is not None else moment.replace(tzinfo=timezone.utc)
+
+
+class _TLSServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients closing a connection part way through a body is expected.
+        pass
+
+    def finish_request(self, request, client_address):
+        # The TLS handshake runs in the connection thread rather than in the
+        # accept loop, so concurrent clients are not serialised.
+        try:
+            request = self.context.wrap_socket(request, server_side=True)
+        except (ssl.SSLError, OSError):
+            return
+        super().finish_request(request, client_address)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = b''
+        if length <= 1 << 20:
+            body = self.rfile.read(length)
+        else:
+            while length > 0:
+                length -= len(self.rfile.read(min(length, 1 << 20)))
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        if self.headers.get('Content-Encoding') == 'gzip':
+            if self.server.reject_gzip:
+                return self._json(b'{"errorMessage": "Unsupported Media Type"}', status=415)
+            body = gzip.decompress(body)
+        if self._throttled():
+            return
+        if self.path.startswith('/api/v1/policies/export'):
+            return self._download()
+        if self.path.split('?')[0].endswith('/search'):
+            return self._search(body)
+        body = json.dumps({'results': [], 'path': self.path}).encode()
+        self._json(body)
+
+    def _throttled(self) -> bool:
+        # Every `throttle_every`-th request is refused with a 429.
+        server = self.server
+        if not server.throttle_every:
+            return False
+        with server.counter_lock:
+            server.counter += 1
+            throttled = server.counter % server.throttle_every == 0
+        if throttled:
+            body = b'{"errorMessage": "Too Many Requests"}'
+            self.send_response(429)
+            self.send_header('Retry-After', str(server.retry_after))
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        return throttled
+
+    def _json(self, body, status=200):
+        # Responses are gzip-compressed when the server is set to and the client accepts it.
+        self.send_response(status)
+        if self.server.compress and 'gzip' in self.headers.get('Accept-Encoding', ''):
+            body = gzip.compress(body, compresslevel=5)
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _search(self, body):
+        # Cursor pagination over `pages` pages of `page_size` records; the
+        # cursor is the number of the next page.
+        request = json.loads(body or b'{}')
+        if self.server.timeline_days:
+            return self._timeline(request)
+        page = int(request.get('cursor') or parse_qs(urlsplit(self.path).query).get('cursor', ['0'])[0])
+        server = self.server
+        records = [_record(page * server.page_size + i, server.record_size) for i in range(server.page_size)]
+        reply = {'results': records if page < server.pages else []}
+        if page + 1 < server.pages:
+            reply['next_cursor'] = str(page + 1)
+        self._json(json.dumps(reply).encode())
+
+    def _timeline(self, request):
+        # The `pages * page_size` records are spread evenly over the last
+        # `timeline_days` days; the search returns the ones inside its
+        # time_range (both ends included) in sort_order, the cursor being the
+        # offset of the next page.
+        server = self.server
+        total = server.pages * server.page_size
+        start = TIMELINE_END - timedelta(days=server.timeline_days)
+        step = server.timeline_days * 86400 * 10**6 // total
+        time_range = request.get('time_range') or {}
+        low = (_time(time_range['start_time']) - start) // timedelta(microseconds=1) if time_range.get('start_time') else 0
+        high = (_time(time_range['to']) - start) // timedelta(microseconds=1) if time_range.get('to') else total * step
+        numbers = range(max(0, -(-low // step)), min(total - 1, high // step) + 1)
+        if parse_qs(urlsplit(self.path).query).get('sort_order', ['desc'])[0] == 'desc':
+            numbers = numbers[::-1]
+
+        offset = int(request.get('cursor') or 0)
+        records = []
+        for number in numbers[offset:offset + server.page_size]:
+            moment = start + timedelta(microseconds=number * step)
+            records.append(dict(_record(number, server.record_size), timestamp=moment.isoformat().replace('+00:00', 'Z')))
+        reply = {'results': records}
+        if offset + server.page_size < len(numbers):
+            reply['next_cursor'] = str(offset + server.page_size)
+        self._json(json.dumps(reply).encode())
+
+    def _download(self):
+        payload = self.server.payload
+        start = 0
+        requested = self.headers.get('Range', '')
+        if requested.startswith('bytes='):
+            start = int(requested[6:].split('-')[0])
+            self.send_response(206)
+            self.send_header('Content-Range', f'bytes {start}-{len(payload) - 1}/{len(payload)}')
+        else:
+            self.send_response(200)
+        self.send_header('Content-Type', 'application/zip')
+        self.send_header('Content-Length', str(len(payload) - start))
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('ETag', '"export"')
+        self.end_headers()
+
+        view = memoryview(payload)[start:]
+        if self.server.drop_after is not None and not self.server.dropped:
+            # Simulate a dropped connection once, part way through the body.
+            self.server.dropped = True
+            self.wfile.write(view[:self.server.drop_after])
+            self.close_connection = True
+            self.connection.shutdown(2)
+            return
+        for offset in range(0, len(view), 1 << 20):
+            self.wfile.write(view[offset:offset + (1 << 20)])
+
+    do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = _reply
+
+
+class MockFortiDLPServer:
+    '''
+    Run the stand-in API in a background thread.
+
+        with MockFortiDLPServer(latency=0.001) as host:
+            fortidlp_connection.conn({'Authorization': 'Bearer x'}, host, enable_ssl=False)
+    '''
+
+    def __init__(self, latency: float = 0.0, download_size: int = 1 << 20, drop_after: int = None, pages: int = 1, page_size: int = 100, record_size: int = 1024,
+                 throttle_every: int = None, retry_after: float = 0, compress: bool = False, reject_gzip: bool = False,
+                 timeline_days: int = None):
+        self.latency = latency
+        self.throttle_every = throttle_every
+        self.retry_after = retry_after
+        self.compress = compress
+        self.reject_gzip = reject_gzip
+        self.timeline_days = timeline_days
+        self.pages = pages
+        self.page_size = page_size
+        self.record_size = record_size
+        self.download_size = download_size
+        self.drop_after = drop_after
+        self._folder = None
+        self._httpd = None
+        self._thread = None
+
+    @property
+    def payload(self) -> bytes:
+        return self._httpd.payload
+
+    @property
+    def host(self) -> str:
+        return f'127.0.0.1:{self._httpd.server_address[1]}'
+
+    def start(self) -> str:
+        self._folder = tempfile.mkdtemp(prefix='fortidlp-mock-')
+        cert, key = _self_signed_certificate(self._folder)
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(cert, key)
+
+        self._httpd = _TLSServer(('127.0.0.1', 0), _Handler)
+        self._httpd.context = context
+        self._httpd.latency = self.latency
+        self._httpd.pages = self.pages
+        self._httpd.page_size = self.page_size
+        self._httpd.record_size = self.record_size
+        self._httpd.payload = os.urandom(self.download_size)
+        self._httpd.drop_after = self.drop_after
+        self._httpd.dropped = False
+        self._httpd.throttle_every = self.throttle_every
+        self._httpd.retry_after = self.retry_after
+        self._httpd.compress = self.compress
+        self._httpd.reject_gzip = self.reject_gzip
+        self._httpd.timeline_days = self.timeline_days
+        self._httpd.counter = 0
+        self._httpd.counter_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self.host
+
+    def stop(self):
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+        if self._folder:
+            shutil.rmtree(self._folder, ignore_errors=True)
+            self._folder = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--download-size', type=int, default=1 << 20)
+    parser.add_argument('--pages', type=int, default=1)
+    parser.add_argument('--page-size', type=int, default=100)
+    parser.add_argument('--record-size', type=int, default=1024)
+    parser.add_argument('--throttle-every', type=int, default=None)
+    parser.add_argument('--retry-after', type=float, default=0)
+    parser.add_argument('--compress', action='store_true')
+    parser.add_argument('--reject-gzip', action='store_true')
+    parser.add_argument('--timeline-days', type=int, default=None)
+    args = parser.parse_args()
+
+    with MockFortiDLPServer(**vars(args)) as host:
+        print(host, flush=True)
+        sys.stdin.read()
+
+
+if __name__ == '__main__':
+    main()
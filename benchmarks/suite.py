@@ -0,0 +1,274 @@
+'''
+Benchmark suite of the main SDK paths against the local stand-in API.
+
+    python benchmarks/suite.py [--output results.json] [--runs 20] [--latency 0.005]
+    python benchmarks/suite.py --compare before.json after.json
+
+Each scenario runs in a fresh interpreter against its own mock server, also
+in a separate process, and reports throughput, p50/p99 latency of the timed
+operation and the peak RSS of the client process:
+
+    agents       Agents.iter_agents over every page (operation: one page)
+    incidents    Incidents.search_incidents with every include_* flag set
+    export       Policies.export_policy_groups downloads
+    bulk_delete  Agents.delete_archived_agents of 10000 IDs in chunks
+    throttled    Agents.iter_agents with every 5th request answered 429
+    audit_scan   Audit.scan_audit_logs of 30 days over 8 workers (operation: the whole scan)
+    auth         import + auth() + first call, the cold start of a script
+
+The results are written as JSON (with the SDK version, Python version and
+git commit), so two runs can be compared with --compare.
+'''
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tempfile
+import resource
+import statistics
+import subprocess
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, ROOT)
+
+# Mock server options of each scenario (see mock_server.py).
+SCENARIOS = {
+    'agents': {'pages': 20, 'page_size': 500, 'record_size': 512},
+    'incidents': {'pages': 1, 'page_size': 100, 'record_size': 2048},
+    'export': {'download_size': 64 << 20},
+    'bulk_delete': {},
+    'throttled': {'pages': 20, 'page_size': 500, 'record_size': 512, 'throttle_every': 5},
+    'audit_scan': {'pages': 40, 'page_size': 500, 'record_size': 256, 'timeline_days': 30},
+    'auth': {},
+}
+
+
+def _percentile(values, q):
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def _connection(host):
+    from fortidlp.connector import APIHandler
+    connection = APIHandler()
+    connection.conn({'Authorization': 'Bearer benchmark'}, host, enable_ssl=False)
+    return connection
+
+
+def _paginate(connection, runs):
+    from fortidlp.fortidlp import Agents
+    agents = Agents(connection)
+    latencies, items = [], 0
+    for _ in range(runs):
+        last = time.perf_counter()
+        for page in agents.iter_agents(results_per_page=500).iter_pages():
+            now = time.perf_counter()
+            latencies.append(now - last)
+            items += len(page)
+            last = now
+    return {'operations': len(latencies), 'items': items, 'latencies': latencies}
+
+
+def _incidents(connection, runs):
+    from fortidlp.fortidlp import Incidents
+    incidents = Incidents(connection)
+    latencies, items = [], 0
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = incidents.search_incidents(include_agents=True, include_cluster_data=True, include_labels=True, include_users=True)
+        latencies.append(time.perf_counter() - start)
+        items += len(result['data']['results'])
+    return {'operations': runs, 'items': items, 'latencies': latencies}
+
+
+def _export(connection, runs):
+    from fortidlp.fortidlp import Policies
+    policies = Policies(connection)
+    latencies, size = [], 0
+    with tempfile.TemporaryDirectory() as folder:
+        for _ in range(runs):
+            start = time.perf_counter()
+            result = policies.export_policy_groups(['benchmark'], download_folder=folder)
+            latencies.append(time.perf_counter() - start)
+            size += result['size']
+            os.remove(result['data'])
+    return {'operations': runs, 'bytes': size, 'latencies': latencies}
+
+
+def _bulk_delete(connection, runs):
+    from fortidlp.fortidlp import Agents
+    agents = Agents(connection)
+    ids = [f'{i:08d}-0000-4000-8000-000000000000' for i in range(10000)]
+    latencies = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = agents.delete_archived_agents(ids, chunk_size=1000, workers=4)
+        latencies.append(time.perf_counter() - start)
+        assert result['status'], result
+    return {'operations': runs, 'items': runs * len(ids), 'latencies': latencies}
+
+
+def _audit_scan(connection, runs):
+    from fortidlp.fortidlp import Audit
+    audit = Audit(connection)
+    latencies, items = [], 0
+    for _ in range(runs):
+        start = time.perf_counter()
+        for page in audit.scan_audit_logs('2026-01-02T00:00:00Z', '2026-02-01T00:00:00Z', results_per_page=500, workers=8).iter_pages():
+            items += len(page)
+        latencies.append(time.perf_counter() - start)
+    return {'operations': runs, 'items': items, 'latencies': latencies}
+
+
+def _auth(host, runs):
+    # One cold start per interpreter: the child measures from before the import.
+    code = (
+        'import time\n'
+        'start = time.perf_counter()\n'
+        'import fortidlp\n'
+        'import fortidlp.fortidlp as api\n'
+        'api.ssl_verification = False\n'
+        'assert api.auth(%r, "benchmark")["status"]\n'
+        'assert api.fortidlp_connection.send("/api/v2/agents/search")["status"]\n'
+        'import resource\n'
+        'print(time.perf_counter() - start, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)\n'
+    ) % host
+    latencies, rss = [], []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, '-c', code], cwd=ROOT, check=True, capture_output=True, text=True).stdout.split()
+        latencies.append(float(output[0]))
+        rss.append(int(output[1]))
+    return {'operations': runs, 'latencies': latencies, 'peak_rss_kb': max(rss)}
+
+
+RUNNERS = {
+    'agents': _paginate,
+    'incidents': _incidents,
+    'export': _export,
+    'bulk_delete': _bulk_delete,
+    'throttled': _paginate,
+    'audit_scan': _audit_scan,
+}
+
+
+def run_scenario(name, host, runs):
+    '''Run one scenario in this process and return its measurements.'''
+    start = time.perf_counter()
+    if name == 'auth':
+        result = _auth(host, runs)
+    else:
+        connection = _connection(host)
+        result = RUNNERS[name](connection, runs)
+        result['throttle'] = connection.throttle_stats.snapshot()
+        connection.close()
+    elapsed = time.perf_counter() - start
+
+    latencies = result.pop('latencies')
+    summary = {
+        'elapsed': elapsed,
+        'operations': result.pop('operations'),
+        'ops_per_sec': len(latencies) / elapsed,
+        'p50': _percentile(latencies, 0.5),
+        'p99': _percentile(latencies, 0.99),
+        'mean': statistics.mean(latencies),
+        'peak_rss_kb': result.pop('peak_rss_kb', resource.getrusage(resource.RUSAGE_SELF).ru_maxrss),
+    }
+    if 'items' in result:
+        summary['items_per_sec'] = result['items'] / elapsed
+    if 'bytes' in result:
+        summary['mb_per_sec'] = result['bytes'] / elapsed / (1 << 20)
+    summary.update(result)
+    return summary
+
+
+def _server(options, latency):
+    arguments = [sys.executable, os.path.join(HERE, 'mock_server.py'), '--latency', str(latency)]
+    for key, value in options.items():
+        arguments += ['--' + key.replace('_', '-'), str(value)]
+    process = subprocess.Popen(arguments, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+    return process, process.stdout.readline().strip()
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, check=True, capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(scenarios, runs, latency):
+    results = {}
+    for name in scenarios:
+        server, host = _server(SCENARIOS[name], latency)
+        try:
+            output = subprocess.run(
+                [sys.executable, __file__, '--scenario', name, '--host', host, '--runs', str(runs)],
+                cwd=ROOT, check=True, capture_output=True, text=True,
+            ).stdout
+        finally:
+            server.stdin.close()
+            server.wait()
+        results[name] = json.loads(output)
+        print(f"{name:12s} {results[name]['ops_per_sec']:9.1f} ops/s  p50 {results[name]['p50'] * 1000:8.2f} ms  "
+              f"p99 {results[name]['p99'] * 1000:8.2f} ms  peak RSS {results[name]['peak_rss_kb'] / 1024:6.1f} MiB", file=sys.stderr)
+
+    from fortidlp.fortidlp import version
+    return {
+        'version': version,
+        'commit': _git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'config': {'runs': runs, 'latency': latency, 'scenarios': {name: SCENARIOS[name] for name in scenarios}},
+        'results': results,
+    }
+
+
+def compare(before, after):
+    '''Print the change of each metric between two result files.'''
+    for name, new in after['results'].items():
+        old = before['results'].get(name)
+        if old is None:
+            continue
+        changes = []
+        for metric in ('ops_per_sec', 'items_per_sec', 'mb_per_sec', 'p50', 'p99', 'peak_rss_kb'):
+            if old.get(metric) and new.get(metric) is not None:
+                changes.append(f'{metric} {(new[metric] / old[metric] - 1) * 100:+6.1f}%')
+        print(f'{name:12s} ' + '  '.join(changes))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS), help='scenario to run (default: all)')
+    parser.add_argument('--runs', type=int, default=20)
+    parser.add_argument('--latency', type=float, default=0.005, help='simulated server latency (seconds)')
+    parser.add_argument('--output', help='write the JSON results to this file instead of stdout')
+    parser.add_argument('--host', help=argparse.SUPPRESS)
+    parser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'))
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0]) as before, open(args.compare[1]) as after:
+            compare(json.load(before), json.load(after))
+        return
+
+    if args.host:
+        # Child process: run one scenario against an already running server.
+        print(json.dumps(run_scenario(args.scenario[0], args.host, args.runs)))
+        return
+
+    results = run_suite(args.scenario or list(SCENARIOS), args.runs, args.latency)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -1 +1,3 @@
-from fortidlp.fortidlp import *
\ No newline at end of file
+from fortidlp.fortidlp import *
+from fortidlp.executor import bulk, BulkResult, BulkProgress
+from fortidlp.client import Client, AuthenticationError
@@ -0,0 +1,5 @@
+import sys
+
+from fortidlp.cli import main
+
+sys.exit(main())
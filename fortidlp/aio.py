@@ -0,0 +1,429 @@
+'''
+Asyncio flavour of the FortiDLP client.
+
+Every resource class of fortidlp.fortidlp has an Async counterpart whose
+methods return coroutines instead of results, so many calls can be in flight
+from one event loop:
+
+    from fortidlp import aio
+
+    await aio.auth(host, access_token)
+    agents = aio.AsyncAgents()
+    results = await asyncio.gather(*(agents.get_agents(filter=f) for f in filters))
+    async for agent in agents.iter_agents():
+        ...
+
+Requires the optional aiohttp dependency (pip install fortidlp[async]).
+
+The threaded helpers (Audit.scan_audit_logs, Audit.tail and
+Incidents.scan_incidents) have no asyncio version: they raise TypeError
+here and are used from the sync resources or a Client.
+'''
+import os
+import json
+import asyncio
+import hashlib
+import tempfile
+from datetime import datetime
+from typing import Optional
+
+try:
+    import aiohttp
+except ImportError:  # pragma: no cover - optional dependency
+    aiohttp = None
+
+import fortidlp.fortidlp as _sync
+from fortidlp.auth import AuthenticationHandler, TokenCache
+from fortidlp.pagination import AsyncPaginator
+from fortidlp.download import DOWNLOAD_CHUNK_SIZE
+from fortidlp.jsonstream import AsyncStreamedPage
+from fortidlp.connector import STREAM_CHUNK_SIZE
+from fortidlp.codec import default_codec
+from fortidlp.coalesce import AsyncSingleFlight, flight_key
+from fortidlp.chunking import DEFAULT_CHUNK_SIZE, submit_chunks_async
+from fortidlp.fortidlp import (
+    Resource, Audit, Cases, Operators, Users, Policies, PoliciesData, Incidents,
+    SaaS, Agents, AgentConfigs, AgentEnrollment, Labels,
+)
+
+
+def _query(params: dict) -> list:
+    '''Flatten query parameters into the (key, str) pairs aiohttp accepts.'''
+    query = []
+    for key, value in params.items():
+        for item in value if isinstance(value, (list, tuple)) else [value]:
+            if isinstance(item, bool):
+                item = str(item).lower()
+            query.append((key, item if isinstance(item, str) else str(item)))
+    return query
+
+
+def _error(status, text, codec) -> dict:
+    try:
+        error_message = codec.loads(text).get('errorMessage', text)
+    except (ValueError, AttributeError):
+        error_message = text
+    return {
+        'status': False,
+        'data': {'status_code': status, 'error_message': error_message}
+    }
+
+
+class AsyncAPIHandler:
+
+    def __init__(self, pool_maxsize=100, pool_maxsize_per_host=0, keepalive_timeout=15, max_concurrency=100, codec=None, coalesce=True):
+        self.host = None
+        self.headers = None
+        self.SSL_Verify = True
+        self.debug_enabled = False
+
+        # pool_maxsize caps the open connections, pool_maxsize_per_host the
+        # connections to one host (0 means no limit) and max_concurrency the
+        # number of requests in flight at any time.
+        self.pool_maxsize = pool_maxsize
+        self.pool_maxsize_per_host = pool_maxsize_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.max_concurrency = max_concurrency
+        self._session = None
+        self._semaphore = None
+
+        # JSON codec of the bodies, None for the process default (see fortidlp.codec).
+        self.codec = codec
+
+        # Identical GETs and searches in flight at the same time share one
+        # request (see fortidlp.coalesce); None when coalesce=False.
+        self.flights = AsyncSingleFlight() if coalesce else None
+
+    @property
+    def session(self) -> 'aiohttp.ClientSession':
+        if aiohttp is None:
+            raise ImportError("The asyncio client requires aiohttp. Install it with: pip install fortidlp[async]")
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.pool_maxsize,
+                limit_per_host=self.pool_maxsize_per_host,
+                keepalive_timeout=self.keepalive_timeout,
+            )
+            self._session = aiohttp.ClientSession(connector=connector)
+        return self._session
+
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    def conn(self, headers=None, host=None, enable_debug=False, enable_ssl=True, organization = None):
+        self.host = host
+        self.headers = headers
+        self.debug_enabled = enable_debug
+        self.SSL_Verify = enable_ssl
+
+    async def get(self, url, params=None, request_type=None, stream=False) -> dict:
+        return await self._exec("GET", url, params, request_type=request_type, stream_items=stream)
+
+    async def send(self, url, params=None, request_type=None, stream=False) -> dict:
+        return await self._exec("POST", url, params, request_type=request_type, stream_items=stream)
+
+    async def insert(self, url, params=None, request_type=None) -> dict:
+        return await self._exec("PUT", url, params, request_type=request_type)
+
+    async def update(self, url, params=None, request_type=None) -> dict:
+        return await self._exec("PATCH", url, params, request_type=request_type)
+
+    async def delete(self, url, params=None, request_type=None) -> dict:
+        return await self._exec("DELETE", url, params, request_type=request_type)
+
+    async def download(self, url, params=None, request_type=None, file_format = 'zip', download_folder = '', fileobj = None, chunk_size = DOWNLOAD_CHUNK_SIZE, hash_algorithm = 'sha256') -> dict:
+        download = {'folder': download_folder or '.', 'fileobj': fileobj, 'chunk_size': chunk_size, 'hash_algorithm': hash_algorithm}
+        return await self._exec("GET", url, params, request_type=request_type, download_file=download, file_format=file_format)
+
+    async def upload(self, url, file, params=None, request_type=None, field='file') -> dict:
+        '''
+        Upload `file` as multipart/form-data: a path, a binary file object or a
+        requests style files dict, as for APIHandler.upload; `params` are sent
+        as form fields.
+        '''
+        path = os.fspath(file) if isinstance(file, (str, os.PathLike)) else None
+        if path is None and not isinstance(file, dict) and not hasattr(file, 'read'):
+            raise TypeError(f"upload expects a path, a binary file object or a files dict, not {type(file).__name__}")
+        opened = open(path, 'rb') if path is not None else None
+        try:
+            files = file if isinstance(file, dict) else {field: opened or file}
+            return await self._exec("POST", url, params, upload_file=files)
+        finally:
+            if opened is not None:
+                opened.close()
+
+    async def _exec(self, method, url, params=None, download_file=False, request_type=None, file_format=None, upload_file=None, stream_items=False) -> dict:
+        if method not in ['GET', 'POST', 'PUT', 'PATCH', 'DELETE']:
+            raise ValueError("Method not supported")
+
+        if not self.headers or not self.host:
+            return {"status": False, "data": "NOT AUTHENTICATED. Run Auth() first."}
+
+        params = {k: v for k, v in (params or {}).items() if v is not None}
+        url = f"https://{self.host}{url}"
+
+        headers = dict(self.headers)
+        if request_type:
+            headers['Content-Type'] = request_type
+
+        if self.debug_enabled:
+            print("URL = ", url)
+            print(json.dumps(params, indent=4))
+
+        codec = self.codec or default_codec()
+        data = None
+        if method in ['POST', 'PUT', 'PATCH'] and not upload_file:
+            data = codec.dumps(params)
+            headers.setdefault('Content-Type', 'application/json')
+        if upload_file:
+            data = _form(upload_file, params)
+
+        request = {
+            'headers': headers,
+            'params': _query(params) if method == 'GET' else None,
+            'ssl': None if self.SSL_Verify else False,
+            'data': data,
+        }
+        try:
+            if download_file or stream_items:
+                return await self._open(method, url, request, codec, download_file, file_format, stream_items)
+            key = flight_key(method, url, params) if self.flights is not None and not upload_file else None
+            if key is not None:
+                (status, body, encoding), _ = await self.flights.do(key, lambda: self._read(method, url, request))
+            else:
+                status, body, encoding = await self._read(method, url, request)
+        except aiohttp.ClientConnectionError as e:
+            return {
+                'status': False,
+                'data': {'status_code': 500, 'error_message': f'Failed to connect to {url}. Error: {e}'}
+            }
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            return {
+                'status': False,
+                'data': {'status_code': 500, 'error_message': e}
+            }
+
+        if status >= 400:
+            return _error(status, body.decode(encoding, errors='replace'), codec)
+        try:
+            return {'status': True, 'data': codec.loads(body)}
+        except ValueError:  # If response is not JSON
+            return {'status': True, 'data': body.decode(encoding, errors='replace')}
+
+    async def _read(self, method, url, request):
+        '''Send the request and return (status, body, encoding) once the body is read.'''
+        async with self.semaphore:
+            async with self.session.request(method, url, **request) as response:
+                body = await response.read()
+                return response.status, body, response.get_encoding()
+
+    async def _open(self, method, url, request, codec, download_file, file_format, stream_items):
+        '''Downloads and streamed pages, read while the response is open.'''
+        async with self.semaphore:
+            response = await self.session.request(method, url, **request)
+            streaming = False
+            try:
+                if response.status >= 400:
+                    return _error(response.status, await response.text(), codec)
+
+                if download_file:
+                    filename_function = url.split('/')[-1].replace('-','_')
+                    filename_function = filename_function.split('?')[0]
+                    options = download_file if isinstance(download_file, dict) else {}
+                    return await self._handle_file_download(response, filename_function, file_format, **options)
+
+                # The response is released once the page has been read.
+                streaming = True
+                return {'status': True, 'data': AsyncStreamedPage(response.content.iter_chunked(STREAM_CHUNK_SIZE), on_close=response.release)}
+            finally:
+                if not streaming:
+                    response.release()
+
+    async def _handle_file_download(self, response, filename_prefix, file_format='zip', folder='.', fileobj=None, chunk_size=DOWNLOAD_CHUNK_SIZE, hash_algorithm='sha256'):
+        digest = hashlib.new(hash_algorithm) if hash_algorithm else None
+        size = 0
+
+        async def copy(out):
+            nonlocal size
+            async for chunk in response.content.iter_chunked(chunk_size):
+                out.write(chunk)
+                if digest is not None:
+                    digest.update(chunk)
+                size += len(chunk)
+
+        if fileobj is not None:
+            await copy(fileobj)
+            filename = fileobj
+        else:
+            date_now = datetime.now().strftime("%Y%m%d_%H%M%S")
+            filename = f"{folder}/{filename_prefix}_{date_now}.{file_format}"
+            fd, temp_name = tempfile.mkstemp(dir=folder, prefix=f'.{os.path.basename(filename)}.', suffix='.part')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    await copy(f)
+                os.replace(temp_name, filename)
+            except BaseException:
+                if os.path.exists(temp_name):
+                    os.unlink(temp_name)
+                raise
+        return {'status': True, 'data': filename, 'size': size, 'hash': digest.hexdigest() if digest is not None else None}
+
+
+def _form(files: dict, fields: dict) -> 'aiohttp.FormData':
+    '''The multipart body of an upload, taking the same files dict as MultipartStream.'''
+    data = aiohttp.FormData()
+    for name, value in fields.items():
+        data.add_field(name, value if isinstance(value, (str, bytes)) else json.dumps(value))
+    for name, value in files.items():
+        filename, content_type = getattr(value, 'name', name), 'application/octet-stream'
+        if isinstance(value, tuple):
+            filename, value, content_type = (value + (content_type,))[:3]
+        if isinstance(value, str):
+            value = value.encode()
+        if not isinstance(value, (bytes, bytearray)) and not hasattr(value, 'read'):
+            raise TypeError(f"upload file {name!r} must be bytes or a binary file object, not {type(value).__name__}")
+        data.add_field(name, value, filename=os.path.basename(str(filename)), content_type=content_type)
+    return data
+
+
+fortidlp_async_connection = AsyncAPIHandler()
+
+
+def _sync_only(resource: str, method: str) -> TypeError:
+    return TypeError(f"{resource}.{method} drives blocking calls from threads and has no asyncio version; "
+                     f"use fortidlp.{resource} or a fortidlp.Client instead")
+
+
+class AsyncResource(Resource):
+    '''Base of the async resource classes, bound to the asyncio connection.'''
+
+    @property
+    def connection(self) -> AsyncAPIHandler:
+        return self._connection if self._connection is not None else fortidlp_async_connection
+
+    def _chunked(self, call, items: list, chunk_size: int = DEFAULT_CHUNK_SIZE, workers: int = 4, planner=None):
+        return submit_chunks_async(call, items, chunk_size=chunk_size, workers=workers, planner=planner)
+
+
+class AsyncAudit(AsyncResource, Audit):
+
+    def iter_audit_logs(self, filter: list = None, start_time: str = None, end_time: str = None, operation_types: list = None, results_per_page: int = 100, sort_order: str = 'desc', cursor: Optional[str] = None, max_items: Optional[int] = None, typed: bool = False) -> AsyncPaginator:
+        return AsyncPaginator(lambda page_cursor: self.get_audit_logs(filter, start_time, end_time, operation_types, results_per_page, sort_order, page_cursor), cursor=cursor, max_items=max_items, model=_sync.AuditLog if typed else None)
+
+    def scan_audit_logs(self, *args, **kwargs):
+        raise _sync_only('Audit', 'scan_audit_logs')
+
+    def tail(self, *args, **kwargs):
+        raise _sync_only('Audit', 'tail')
+
+
+class AsyncCases(AsyncResource, Cases):
+    pass
+
+
+class AsyncOperators(AsyncResource, Operators):
+    pass
+
+
+class AsyncUsers(AsyncResource, Users):
+    pass
+
+
+class AsyncPolicies(AsyncResource, Policies):
+    pass
+
+
+class AsyncPoliciesData(AsyncResource, PoliciesData):
+    pass
+
+
+class AsyncIncidents(AsyncResource, Incidents):
+
+    def iter_incidents(self, filter: list = [], include_agents: str = True, include_cluster_data: str = True, include_labels: str = True, include_users: str = True, results_per_page: int = 100, cursor: Optional[str] = None, max_items: Optional[int] = None, stream: bool = False, typed: bool = False) -> AsyncPaginator:
+        return AsyncPaginator(lambda page_cursor: self.search_incidents(filter, include_agents, include_cluster_data, include_labels, include_users, results_per_page, page_cursor, stream), cursor=cursor, max_items=max_items, model=_sync.Incident if typed else None)
+
+    def scan_incidents(self, *args, **kwargs):
+        raise _sync_only('Incidents', 'scan_incidents')
+
+
+class AsyncSaaS(AsyncResource, SaaS):
+    pass
+
+
+class AsyncAgents(AsyncResource, Agents):
+
+    def iter_agents(self, filter: list = [], results_per_page: int = 100, sort_order: str = "asc", cursor: Optional[str] = None, max_items: Optional[int] = None, typed: bool = False) -> AsyncPaginator:
+        return AsyncPaginator(lambda page_cursor: self.get_agents(filter, results_per_page, sort_order, page_cursor), cursor=cursor, max_items=max_items, model=_sync.Agent if typed else None)
+
+
+class AsyncAgentConfigs(AsyncResource, AgentConfigs):
+    pass
+
+
+class AsyncAgentEnrollment(AsyncResource, AgentEnrollment):
+    pass
+
+
+class AsyncLabels(AsyncResource, Labels):
+
+    def iter_labels(self, filter: list = [], results_per_page: int = 100, sort_order: str = "asc", cursor: Optional[str] = None, max_items: Optional[int] = None, typed: bool = False) -> AsyncPaginator:
+        return AsyncPaginator(lambda page_cursor: self.get_labels(filter, results_per_page, sort_order, page_cursor), cursor=cursor, max_items=max_items, model=_sync.Label if typed else None)
+
+
+async def auth(host: str, access_token: str, pool_maxsize: int = 100, pool_maxsize_per_host: int = 0, keepalive_timeout: float = 15, max_concurrency: int = 100, token_cache: Optional[TokenCache] = None, coalesce: bool = True) -> dict:
+    '''
+    Authenticate the asyncio connection. Debug and certificate settings are
+    taken from fortidlp.enable_debug() / fortidlp.ignore_certificate(). With a
+    TokenCache the probe is skipped while the token is recorded as valid.
+    '''
+    global fortidlp_async_connection
+
+    login = AuthenticationHandler()
+    headers = login.headers(access_token)
+    connection = AsyncAPIHandler(pool_maxsize=pool_maxsize, pool_maxsize_per_host=pool_maxsize_per_host, keepalive_timeout=keepalive_timeout, max_concurrency=max_concurrency, coalesce=coalesce)
+
+    status = False
+    data = None
+    if token_cache is not None and token_cache.valid(host, access_token):
+        status, data = True, 'AUTHENTICATION_CACHED'
+    for url in login.urls if not status else []:
+        try:
+            async with connection.session.get(f'https://{host}/{url}', headers=headers, ssl=False) as res:
+                await res.read()
+                if res.status in login.errors:
+                    data = login.errors[res.status]
+                    continue
+                status = True
+                data = 'AUTHENTICATION_SUCCEEDED'
+                if token_cache is not None:
+                    token_cache.record(host, access_token)
+                break
+        except aiohttp.ClientError as err:
+            data = str(err)
+            break
+
+    if not status:
+        await connection.close()
+    else:
+        await fortidlp_async_connection.close()
+        fortidlp_async_connection = connection
+        fortidlp_async_connection.conn(headers, host, _sync.debug, _sync.ssl_verification)
+
+    return {
+        'status': status,
+        'data': data
+    }
@@ -1,28 +1,53 @@
-import requests
+import os
+import json
+import time
+import hashlib
+import logging
+import tempfile
+import threading
+from typing import Optional
+
+from fortidlp.lazy import requests
+
+logger = logging.getLogger(__name__)
+
+# Headers carrying credentials, never printed or written to disk.
+SECRET_HEADERS = ('authorization', 'proxy-authorization', 'cookie', 'set-cookie', 'x-api-key')
+REDACTED = 'REDACTED'
+
+
+def redact_headers(headers) -> dict:
+    return {name: REDACTED if name.lower() in SECRET_HEADERS else value for name, value in (headers or {}).items()}
 
 class AuthenticationHandler:
-      
-    def test_authentication(self, headers, host):
+
+    urls = ['api/v2/users/search', 'api/v2/dashboards']
+    errors = {
+        401: "Unauthorized",
+        403: "Forbidden",
+        404: "Not Found",
+        500: "Internal Server Error",
+    }
+
+    @staticmethod
+    def headers(access_token):
+        return {"Authorization": f"Bearer {access_token}"}
+
+    def test_authentication(self, headers, host, session=None):
         data = None
         status = False
         response_headers = None
-        urls = ['api/v2/users/search', 'api/v2/dashboards']
+        client = session or requests
 
-        for url in urls:
+        for url in self.urls:
 
             url = f'https://{host}/{url}'
             try:
-                res = requests.get(url, headers=headers, verify=False)
+                res = client.get(url, headers=headers, verify=False)
                 res_code = res.status_code
                 status = False
-                if res_code == 401:
-                    data = "Unauthorized"
-                elif res_code == 403:
-                    data = "Forbidden"
-                elif res_code == 404:
-                    data = "Not Found"
-                elif res_code == 500:
-                    data = "Internal Server Error"
+                if res_code in self.errors:
+                    data = self.errors[res_code]
                 else:
                     data = res
                     status = True
@@ -31,10 +56,74 @@ class AuthenticationHandler:
 
             except requests.exceptions.RequestException as err:
                 raise SystemExit(err) from err
-        
+
         return status, data, response_headers
 
-    def get_headers(self, fdlp_host, access_token):
-        headers = {"Authorization": f"Bearer {access_token}"}
-        status, data, res_headers = self.test_authentication(headers, fdlp_host)
-        return (headers, fdlp_host) if status else (None, data)
\ No newline at end of file
+    def get_headers(self, fdlp_host, access_token, session=None):
+        headers = self.headers(access_token)
+        status, data, res_headers = self.test_authentication(headers, fdlp_host, session=session)
+        return (headers, fdlp_host) if status else (None, data)
+
+
+class TokenCache:
+    '''
+    On-disk record of "token validated for host X until T", letting repeated
+    cold starts skip the authentication probe. Only a hash of the host and
+    token is written, never the token itself; the file is created readable by
+    the owner only, by default in a per-user folder ($XDG_CACHE_HOME or
+    ~/.cache, then fortidlp/) created private to the owner. Entries expire
+    after `ttl` seconds and are forgotten as soon as the API rejects the
+    token. The cache is only a shortcut: when it cannot be read or written,
+    the token is probed as without it.
+    '''
+
+    def __init__(self, path: Optional[str] = None, ttl: float = 3600):
+        cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+        self.path = path or os.path.join(cache_home, 'fortidlp', 'token-cache.json')
+        self.ttl = ttl
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(host: str, access_token: str) -> str:
+        return hashlib.sha256(f'{host}\0{access_token}'.encode()).hexdigest()
+
+    def _load(self) -> dict:
+        try:
+            with open(self.path) as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        now = time.time()
+        return {key: expires for key, expires in entries.items() if expires > now}
+
+    def _save(self, entries: dict):
+        folder = os.path.dirname(os.path.abspath(self.path))
+        try:
+            os.makedirs(folder, mode=0o700, exist_ok=True)
+            fd, temp_name = tempfile.mkstemp(dir=folder, prefix='.token-cache.', suffix='.part')
+        except OSError as e:
+            logger.warning("Token cache %s not written: %s", self.path, e)
+            return
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(entries, f)
+            os.replace(temp_name, self.path)
+        except OSError as e:
+            logger.warning("Token cache %s not written: %s", self.path, e)
+            if os.path.exists(temp_name):
+                os.unlink(temp_name)
+
+    def valid(self, host: str, access_token: str) -> bool:
+        return self.key(host, access_token) in self._load()
+
+    def record(self, host: str, access_token: str):
+        with self._lock:
+            entries = self._load()
+            entries[self.key(host, access_token)] = time.time() + self.ttl
+            self._save(entries)
+
+    def forget(self, host: str, access_token: str):
+        with self._lock:
+            entries = self._load()
+            if entries.pop(self.key(host, access_token), None) is not None:
+                self._save(entries)
@@ -0,0 +1,151 @@
+'''
+Opt-in response cache for the read-mostly endpoints.
+
+    cache = ResponseCache(ttl=60, ttls={'/api/v1/operators': 600}, maxsize=512)
+    fortidlp.auth(host, token, cache=cache)
+
+GET responses are cached per method, URL and parameters for the TTL of the
+longest matching path prefix (or the default `ttl`; with neither, the call is
+not cached) in an LRU bounded to `maxsize` entries. Expired entries that came
+with an ETag or Last-Modified header are revalidated with If-None-Match /
+If-Modified-Since, so an unchanged resource costs a 304 instead of a full
+payload. A successful POST, PUT, PATCH or DELETE drops the cached entries of
+the same resource path and of its parent collections, e.g. deleting
+/api/v1/policies/groups/{id} clears /api/v1/policies/groups.
+'''
+import copy
+import json
+import time
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+# POST endpoints that only read data and never invalidate the cache.
+READ_ONLY_SUFFIXES = ('/search', '/export')
+
+
+class _Entry:
+    __slots__ = ('path', 'data', 'expires', 'etag', 'last_modified')
+
+    def __init__(self, path, data, expires, etag=None, last_modified=None):
+        self.path = path
+        self.data = data
+        self.expires = expires
+        self.etag = etag
+        self.last_modified = last_modified
+
+
+def _related(path: str, other: str) -> bool:
+    '''True when one path is the other or one of its parents.'''
+    return path == other or path.startswith(other + '/') or other.startswith(path + '/')
+
+
+class ResponseCache:
+
+    def __init__(self, ttl: Optional[float] = None, ttls: Optional[Dict[str, float]] = None, maxsize: int = 1024):
+        self.ttl = ttl
+        self.ttls = dict(ttls or {})
+        self.maxsize = maxsize
+        self._prefixes = sorted(self.ttls, key=len, reverse=True)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self.invalidations = 0
+
+    def ttl_for(self, path: str) -> Optional[float]:
+        for prefix in self._prefixes:
+            if path.startswith(prefix):
+                return self.ttls[prefix]
+        return self.ttl
+
+    @staticmethod
+    def key(method: str, url: str, params: Optional[dict] = None) -> tuple:
+        return (method, url, json.dumps(params or {}, sort_keys=True, default=str))
+
+    def lookup(self, method: str, url: str, params: Optional[dict] = None):
+        '''
+        Return (key, data, headers): `data` is a copy of the cached result when
+        the entry is fresh, otherwise None and `headers` holds the conditional
+        headers to revalidate a stale entry with. `key` is None when the call
+        is not cacheable.
+        '''
+        if method != 'GET' or self.ttl_for(urlsplit(url).path) is None:
+            return None, None, {}
+
+        key = self.key(method, url, params)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return key, None, {}
+            self._entries.move_to_end(key)
+            if entry.expires > time.monotonic():
+                self.hits += 1
+                return key, copy.deepcopy(entry.data), {}
+            self.misses += 1
+            headers = {}
+            if entry.etag:
+                headers['If-None-Match'] = entry.etag
+            if entry.last_modified:
+                headers['If-Modified-Since'] = entry.last_modified
+            return key, None, headers
+
+    def store(self, key: tuple, url: str, data, headers=None):
+        path = urlsplit(url).path
+        headers = headers or {}
+        entry = _Entry(path, data, time.monotonic() + self.ttl_for(path), headers.get('ETag'), headers.get('Last-Modified'))
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def revalidated(self, key: tuple):
+        '''Mark an entry as still valid after a 304 and return a copy of its data.'''
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            entry.expires = time.monotonic() + self.ttl_for(entry.path)
+            self.revalidations += 1
+            return copy.deepcopy(entry.data)
+
+    def invalidate(self, path: Optional[str] = None):
+        '''Drop every entry, or the entries related to the resource `path`.'''
+        with self._lock:
+            if path is None:
+                dropped = list(self._entries)
+            else:
+                dropped = [key for key, entry in self._entries.items() if _related(entry.path, path)]
+            for key in dropped:
+                del self._entries[key]
+            self.invalidations += len(dropped)
+
+    def mutated(self, method: str, url: str):
+        '''Invalidate the entries touched by a successful mutating call.'''
+        path = urlsplit(url).path
+        if method == 'GET' or path.endswith(READ_ONLY_SUFFIXES):
+            return
+        self.invalidate(path)
+
+    def clear(self):
+        self.invalidate()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'revalidations': self.revalidations,
+                'invalidations': self.invalidations,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'revalidation_rate': self.revalidations / self.misses if self.misses else 0.0,
+            }
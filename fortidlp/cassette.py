@@ -0,0 +1,185 @@
+'''
+Recording and replay of the HTTP traffic of a connection.
+
+    connection.record('tenant.cassette.gz')      # talk to the API, keep every exchange
+    ...
+    connection.close()
+
+    connection.replay('tenant.cassette.gz', latency_scale=0)   # no network
+    Incidents(connection).iter_incidents()
+
+A cassette is a file of one JSON line per exchange (gzip-compressed when the
+name ends with .gz): method, URL, request headers, a hash of the request
+body, response status, headers and body as sent on the wire, and the time
+the exchange took. Credentials headers are written as REDACTED and request
+bodies are only kept as their hash. Response bodies are read whole while
+recording, downloads included.
+
+On replay, requests are matched on method, path and query and body hash,
+whatever the host, and answered in the order they were recorded; once the
+recorded answers to a request are used up the last one is repeated (unless
+repeat=False). The answer waits for the recorded time multiplied by
+latency_scale (0 for none). A request that was never recorded fails with
+CassetteMiss. The adapters plug in below the retries, rate limiting and
+decoding of APIHandler, so those run as they do against the API.
+'''
+import io
+import gzip
+import json
+import time
+import base64
+import hashlib
+import threading
+from collections import deque
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3 import HTTPResponse
+
+from fortidlp.auth import redact_headers
+
+# Headers of the wire encoding, rebuilt from the recorded body.
+_FRAMING_HEADERS = ('transfer-encoding', 'content-length')
+
+
+class CassetteMiss(requests.exceptions.RequestException):
+    '''The replayed cassette holds no answer for the request.'''
+
+
+def _open(path: str, mode: str):
+    if path.lower().endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+
+def _body_hash(body) -> str:
+    if body is None:
+        return None
+    if isinstance(body, str):
+        body = body.encode('utf-8')
+    if not isinstance(body, bytes):
+        # Streamed uploads are matched on method and URL only.
+        return None
+    return hashlib.sha1(body).hexdigest()
+
+
+def _key(method: str, url: str, body_hash) -> tuple:
+    parts = urlsplit(url)
+    return method, f'{parts.path}?{parts.query}' if parts.query else parts.path, body_hash
+
+
+def _response(adapter: HTTPAdapter, request, status: int, reason: str, headers: dict, body: bytes) -> requests.Response:
+    '''A requests response reading `body`, as the adapter would have built it.'''
+    headers = {name: value for name, value in headers.items() if name.lower() not in _FRAMING_HEADERS}
+    headers['Content-Length'] = str(len(body))
+    raw = HTTPResponse(body=io.BytesIO(body), headers=headers, status=status, reason=reason, preload_content=False, decode_content=True)
+    return adapter.build_response(request, raw)
+
+
+def _encode_body(body: bytes, headers: dict) -> dict:
+    encoded = any(name.lower() == 'content-encoding' and value != 'identity' for name, value in headers.items())
+    if not encoded:
+        try:
+            return {'body': body.decode('utf-8')}
+        except UnicodeDecodeError:
+            pass
+    return {'body64': base64.b64encode(body).decode('ascii')}
+
+
+def _decode_body(exchange: dict) -> bytes:
+    if 'body64' in exchange:
+        return base64.b64decode(exchange['body64'])
+    return exchange.get('body', '').encode('utf-8')
+
+
+class RecordingAdapter(HTTPAdapter):
+    '''Sends requests as usual and appends every exchange to the cassette at `path`.'''
+
+    def __init__(self, path: str, **options):
+        super().__init__(**options)
+        self.path = path
+        self.count = 0
+        self._lock = threading.Lock()
+        self._file = _open(path, 'w')
+
+    def send(self, request, **kwargs):
+        started = time.monotonic()
+        response = super().send(request, **kwargs)
+        # The body as it came on the wire (compressed or not), so replay
+        # decodes it like the original.
+        body = response.raw.read(decode_content=False) if response.raw is not None else b''
+        elapsed = time.monotonic() - started
+        response.close()
+
+        headers = dict(response.headers)
+        exchange = {
+            'method': request.method,
+            'url': request.url,
+            'request_headers': redact_headers(request.headers),
+            'request_body': _body_hash(request.body),
+            'status': response.status_code,
+            'reason': response.reason,
+            'headers': redact_headers(headers),
+            'elapsed': round(elapsed, 6),
+            **_encode_body(body, headers),
+        }
+        line = json.dumps(exchange, separators=(',', ':')) + '\n'
+        with self._lock:
+            if self._file is not None:
+                self._file.write(line)
+                self._file.flush()
+                self.count += 1
+        return _response(self, request, response.status_code, response.reason, headers, body)
+
+    def finish(self):
+        '''Close the cassette; later exchanges are not recorded.'''
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+class ReplayAdapter(HTTPAdapter):
+    '''Answers requests from the cassette at `path` without any network.'''
+
+    def __init__(self, path: str, latency_scale: float = 1.0, repeat: bool = True, **options):
+        super().__init__(**options)
+        self.path = path
+        self.latency_scale = latency_scale
+        self.repeat = repeat
+        self.recorded = 0
+        self.served = 0
+        self.missed = 0
+        self._lock = threading.Lock()
+        self._exchanges = {}
+        self._last = {}
+        with _open(path, 'r') as f:
+            for line in f:
+                if line.strip():
+                    exchange = json.loads(line)
+                    key = _key(exchange['method'], exchange['url'], exchange.get('request_body'))
+                    self._exchanges.setdefault(key, deque()).append(exchange)
+                    self.recorded += 1
+
+    def _next(self, key: tuple):
+        with self._lock:
+            exchanges = self._exchanges.get(key)
+            if exchanges:
+                exchange = exchanges.popleft()
+                self._last[key] = exchange
+            elif self.repeat and key in self._last:
+                exchange = self._last[key]
+            else:
+                self.missed += 1
+                return None
+            self.served += 1
+            return exchange
+
+    def send(self, request, **kwargs):
+        exchange = self._next(_key(request.method, request.url, _body_hash(request.body)))
+        if exchange is None:
+            raise CassetteMiss(f'No recorded answer for {request.method} {request.url}', request=request)
+        if self.latency_scale:
+            time.sleep(exchange.get('elapsed', 0) * self.latency_scale)
+        return _response(self, request, exchange['status'], exchange.get('reason'), exchange['headers'], _decode_body(exchange))
@@ -0,0 +1,259 @@
+'''
+Splitting of large ID-list payloads into concurrent chunked requests.
+
+Endpoints such as Agents.assign_labels take a list of IDs in one request
+body. submit_chunks cuts the list into chunks, sends them concurrently with
+bounded parallelism and aggregates the per-chunk outcomes into the usual
+{'status': ..., 'data': ...} result, whatever the number of chunks. The
+chunked calls change data, so only chunks the server refused without
+applying them (413 too large, 429 throttled, 503 unavailable) are retried,
+split in half each time so an oversized chunk gets through; other failures,
+500, 502 and 504 included, are final as the chunk may have been applied. The chunk size adapts to the observed
+latency: it grows while calls are fast and shrinks as soon as they get
+slower than `target_latency`.
+
+Endpoints taking an `all`/`filter` selection instead of an ID list (e.g.
+Incidents.update_status) go through FilterBatchPlanner: it packs a stream of
+IDs into the largest filters that fit the payload limits.
+'''
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Any, Awaitable, Callable, Iterable, List, Optional, Sequence
+
+from fortidlp.codec import default_codec
+
+DEFAULT_CHUNK_SIZE = 1000
+# Upper bound on the encoded filter of one FilterBatchPlanner batch.
+DEFAULT_MAX_FILTER_BYTES = 256 * 1024
+# Chunk failures worth sending again, smaller: the server refused the chunk
+# before applying it, as for the mutation_statuses of throttle.RetryPolicy.
+RETRY_STATUSES = (413, 429, 503)
+
+
+class ChunkPlanner:
+    '''Hands out chunks of `items`, sizing them from the latency of the previous ones.'''
+
+    def __init__(self, items: Sequence, chunk_size: int = DEFAULT_CHUNK_SIZE, target_latency: float = 5.0, min_chunk_size: int = 50, max_chunk_size: int = 10000, adaptive: bool = True):
+        self.items = list(items)
+        self.chunk_size = chunk_size
+        self.target_latency = target_latency
+        self.min_chunk_size = min(min_chunk_size, chunk_size)
+        self.max_chunk_size = max(max_chunk_size, chunk_size)
+        self.adaptive = adaptive
+        self.offset = 0
+        self._lock = threading.Lock()
+
+    def next_chunk(self) -> List:
+        with self._lock:
+            chunk = self.items[self.offset:self.offset + self.chunk_size]
+            self.offset += len(chunk)
+            return chunk
+
+    def observe(self, latency: float):
+        if not self.adaptive:
+            return
+        with self._lock:
+            if latency > self.target_latency:
+                self.chunk_size = max(self.min_chunk_size, self.chunk_size // 2)
+            elif latency < self.target_latency / 2:
+                self.chunk_size = min(self.max_chunk_size, int(self.chunk_size * 1.5))
+
+
+class FilterBatchPlanner:
+    '''
+    Hands out batches of the IDs of `ids` (any iterable, read lazily), each
+    as large as `max_ids` and the `max_bytes` encoded size of its filter
+    allow. `id_filter(batch)` turns a batch into the filter list of the
+    request. Repeated IDs are sent once.
+    '''
+
+    def __init__(self, ids: Iterable, id_filter: Callable[[list], list], max_ids: int = DEFAULT_CHUNK_SIZE, max_bytes: int = DEFAULT_MAX_FILTER_BYTES, codec: Optional[object] = None):
+        self.id_filter = id_filter
+        self.max_ids = max_ids
+        self.max_bytes = max_bytes
+        self.codec = codec or default_codec()
+        self.batches = 0
+        self._ids = iter(ids)
+        self._next = None
+        self._seen = set()
+        self._lock = threading.Lock()
+
+    def _size(self, batch: list) -> int:
+        return len(self.codec.dumps(self.id_filter(batch)))
+
+    def _take(self):
+        if self._next is not None:
+            item, self._next = self._next, None
+            return item
+        for item in self._ids:
+            if item not in self._seen:
+                return item
+        return None
+
+    def next_chunk(self) -> List:
+        with self._lock:
+            batch = []
+            size = self._size([])
+            while len(batch) < self.max_ids:
+                item = self._take()
+                if item is None:
+                    break
+                # What the ID adds to the encoded filter.
+                cost = self._size([item, item]) - self._size([item])
+                if batch and size + cost > self.max_bytes:
+                    self._next = item
+                    break
+                batch.append(item)
+                self._seen.add(item)
+                size += cost
+            if batch:
+                self.batches += 1
+            return batch
+
+    def filters(self, batch: list) -> list:
+        return list(self.id_filter(batch))
+
+    def observe(self, latency: float):
+        pass
+
+
+def _retryable(response: Any) -> bool:
+    data = response.get('data') if isinstance(response, dict) else None
+    return isinstance(data, dict) and data.get('status_code') in RETRY_STATUSES
+
+
+class _Outcome:
+
+    def __init__(self):
+        self.results = []
+        self.failed = []
+        self.batches = []
+        self.succeeded = 0
+        self.chunks = 0
+
+    def add(self, chunk: list, response: Any, retries_left: int, retry: Callable[[list, int], None]):
+        self.chunks += 1
+        status = isinstance(response, dict) and response.get('status')
+        if status:
+            self.succeeded += len(chunk)
+            self.results.append(response.get('data'))
+            self.batches.append({'size': len(chunk), 'status': True, 'data': response.get('data')})
+        elif retries_left > 0 and _retryable(response):
+            # Retry only this chunk, in halves in case it was too large.
+            middle = max(1, len(chunk) // 2)
+            for part in (chunk[:middle], chunk[middle:]):
+                if part:
+                    retry(part, retries_left - 1)
+        else:
+            error = response.get('data') if isinstance(response, dict) else response
+            self.failed.append({'items': chunk, 'error': error})
+            self.batches.append({'size': len(chunk), 'status': False, 'data': error})
+
+    def result(self) -> dict:
+        return {
+            'status': not self.failed,
+            'data': {
+                'chunks': self.chunks,
+                'succeeded': self.succeeded,
+                'failed': self.failed,
+                'results': self.results,
+                'batches': self.batches,
+            }
+        }
+
+
+def _call(call: Callable[[list], dict], chunk: list):
+    start = time.monotonic()
+    try:
+        response = call(chunk)
+    except Exception as e:
+        response = {'status': False, 'data': str(e)}
+    return chunk, response, time.monotonic() - start
+
+
+def submit_chunks(call: Callable[[list], dict], items: Sequence, chunk_size: int = DEFAULT_CHUNK_SIZE, workers: int = 4, retries: int = 2, planner: Optional[object] = None, **planner_options) -> dict:
+    '''
+    Send `call(chunk)` for every chunk of `items`, `workers` at a time.
+
+    'data' holds the number of chunks sent, the number of items that
+    succeeded, the per-chunk results, the outcome of every chunk in
+    'batches' and the failed chunks with their error, however few items
+    there are. An empty `items` is sent as one empty chunk. With a `planner`
+    (e.g. a FilterBatchPlanner) the chunks come from it instead of `items`.
+    '''
+    outcome = _Outcome()
+    retry_queue = []
+    if planner is None:
+        items = list(items)
+        if not items:
+            outcome.add(items, _call(call, items)[1], 0, None)
+            return outcome.result()
+        planner = ChunkPlanner(items, chunk_size=chunk_size, **planner_options)
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='fortidlp-chunks') as pool:
+        pending = {}
+
+        def fill():
+            while len(pending) < workers:
+                if retry_queue:
+                    chunk, retries_left = retry_queue.pop()
+                else:
+                    chunk, retries_left = planner.next_chunk(), retries
+                if not chunk:
+                    return
+                pending[pool.submit(_call, call, chunk)] = retries_left
+
+        fill()
+        while pending:
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                retries_left = pending.pop(future)
+                chunk, response, latency = future.result()
+                planner.observe(latency)
+                outcome.add(chunk, response, retries_left, lambda part, left: retry_queue.append((part, left)))
+            fill()
+
+    return outcome.result()
+
+
+async def submit_chunks_async(call: Callable[[list], Awaitable[dict]], items: Sequence, chunk_size: int = DEFAULT_CHUNK_SIZE, workers: int = 4, retries: int = 2, planner: Optional[object] = None, **planner_options) -> dict:
+    '''submit_chunks for coroutine calls, run on the current event loop.'''
+    import asyncio
+
+    outcome = _Outcome()
+    queue = []
+    if planner is None:
+        items = list(items)
+        if not items:
+            try:
+                response = await call(items)
+            except Exception as e:
+                response = {'status': False, 'data': str(e)}
+            outcome.add(items, response, 0, None)
+            return outcome.result()
+        planner = ChunkPlanner(items, chunk_size=chunk_size, **planner_options)
+
+    async def worker():
+        while True:
+            if queue:
+                chunk, retries_left = queue.pop()
+            else:
+                chunk, retries_left = planner.next_chunk(), retries
+            if not chunk:
+                return
+            start = time.monotonic()
+            try:
+                response = await call(chunk)
+            except Exception as e:
+                response = {'status': False, 'data': str(e)}
+            planner.observe(time.monotonic() - start)
+            outcome.add(chunk, response, retries_left, lambda part, left: queue.append((part, left)))
+
+    # A worker may stop while another one is about to queue retries, so run
+    # rounds until nothing is left to send.
+    while True:
+        await asyncio.gather(*(worker() for _ in range(workers)))
+        if not queue:
+            break
+    return outcome.result()
@@ -0,0 +1,279 @@
+'''
+Command line interface.
+
+    fortidlp agents search --filter '...' | jq .hostname
+    fortidlp audit search --start 2026-01-01T00:00:00Z --workers 8 > audit.ndjson
+    fortidlp audit tail --checkpoint audit.json
+    cut -f1 agents.tsv | fortidlp labels assign --label 42
+    fortidlp policies export GROUP_ID --output groups.zip
+
+The host and token come from --host/--token or the FORTIDLP_HOST and
+FORTIDLP_TOKEN environment variables. Search commands write one JSON record
+per line (NDJSON) as the pages arrive, so memory stays flat however many
+records there are; other commands write their result as one JSON line.
+Commands taking IDs read them from the arguments or, when there are none,
+one per line from stdin (NDJSON objects with an "id" are accepted too).
+
+The token is checked with the first request rather than at startup, and
+with --token-cache it is only checked once per hour across runs, so the
+command is cheap enough to run in shell loops. Errors, an unreachable host
+included, go to stderr as JSON and set the exit status to 1.
+'''
+import os
+import sys
+import json
+import argparse
+from typing import Iterable, Iterator, List, Optional
+
+from fortidlp.codec import default_codec
+
+EXIT_ERROR = 1
+
+
+class CommandError(Exception):
+    '''A failed API call, carrying its {'status': False, 'data': ...} result.'''
+
+    def __init__(self, response):
+        super().__init__(response)
+        self.response = response
+
+
+def _value(text: str):
+    '''A --filter value: JSON when it parses, the text itself otherwise.'''
+    try:
+        return json.loads(text)
+    except ValueError:
+        return text
+
+
+def read_ids(arguments: List[str], stream=None) -> Iterator[str]:
+    '''IDs from the arguments, or from `stream` (stdin) one per line.'''
+    if arguments:
+        yield from arguments
+        return
+    for line in stream if stream is not None else sys.stdin:
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith('{'):
+            line = json.loads(line).get('id')
+            if not line:
+                continue
+        yield line
+
+
+class _Output:
+    '''Writes records as NDJSON to a binary stream.'''
+
+    def __init__(self, stream=None):
+        self.stream = stream if stream is not None else sys.stdout.buffer
+        self.codec = default_codec()
+        self.count = 0
+
+    def write(self, record):
+        self.stream.write(self.codec.dumps(getattr(record, 'raw', record)) + b'\n')
+        self.count += 1
+
+    def page(self, records: Iterable):
+        for record in records:
+            self.write(record)
+        self.stream.flush()
+
+
+def _result(response: dict):
+    if not response.get('status'):
+        raise CommandError(response)
+    return response.get('data')
+
+
+def _client(args):
+    from fortidlp.auth import TokenCache
+    from fortidlp.client import Client
+
+    host = args.host or os.environ.get('FORTIDLP_HOST')
+    token = args.token or os.environ.get('FORTIDLP_TOKEN')
+    if not host or not token:
+        raise SystemExit('fortidlp: set --host and --token (or FORTIDLP_HOST and FORTIDLP_TOKEN)')
+    token_cache = TokenCache(args.token_cache) if args.token_cache else None
+    if ',' in host:
+        host = [name.strip() for name in host.split(',') if name.strip()]
+    return Client(host, token, token_cache=token_cache, verify=not args.insecure)
+
+
+def agents_search(client, args, output):
+    pages = client.agents.iter_agents(filter=args.filter, results_per_page=args.page_size, sort_order=args.sort, max_items=args.max).iter_pages()
+    for page in pages:
+        output.page(page)
+
+
+def agents_delete_archived(client, args, output):
+    output.page([_result(client.agents.delete_archived_agents(list(read_ids(args.ids)), chunk_size=args.chunk_size, workers=args.workers))])
+
+
+def incidents_search(client, args, output):
+    include = not args.bare
+    pages = client.incidents.iter_incidents(filter=args.filter, include_agents=include, include_cluster_data=include, include_labels=include, include_users=include,
+                                            results_per_page=args.page_size, max_items=args.max, stream=True).iter_pages()
+    for page in pages:
+        output.page(page)
+
+
+def audit_search(client, args, output):
+    if args.workers > 1:
+        if not args.start:
+            raise SystemExit('fortidlp: --workers needs --start')
+        pages = client.audit.scan_audit_logs(args.start, args.end, filter=args.filter, operation_types=args.type, results_per_page=args.page_size,
+                                             sort_order=args.sort, workers=args.workers, max_items=args.max).iter_pages()
+    else:
+        pages = client.audit.iter_audit_logs(filter=args.filter, start_time=args.start, end_time=args.end, operation_types=args.type,
+                                             results_per_page=args.page_size, sort_order=args.sort, max_items=args.max).iter_pages()
+    for page in pages:
+        output.page(page)
+
+
+def audit_tail(client, args, output):
+    tail = client.audit.tail(args.checkpoint, filter=args.filter, operation_types=args.type, start_time=args.start,
+                             min_interval=args.interval, max_interval=args.max_interval)
+    for log in tail.poll() if args.once else tail.follow():
+        output.page([log])
+
+
+def labels_list(client, args, output):
+    for page in client.labels.iter_labels(filter=args.filter, results_per_page=args.page_size).iter_pages():
+        output.page(page)
+
+
+def labels_assign(client, args, output):
+    call = client.agents.assign_labels if args.command == 'assign' else client.agents.unassign_labels
+    output.page([_result(call(list(read_ids(args.ids)), args.label, chunk_size=args.chunk_size, workers=args.workers))])
+
+
+def cases_list(client, args, output):
+    output.page([_result(client.cases.list_cases())])
+
+
+def policies_export(client, args, output):
+    if args.output == '-':
+        _result(client.policies.export_policy_groups(args.group_ids, fileobj=sys.stdout.buffer))
+        sys.stdout.buffer.flush()
+        return
+    with open(args.output, 'wb') as f:
+        response = client.policies.export_policy_groups(args.group_ids, fileobj=f)
+    if not response.get('status'):
+        os.remove(args.output)
+    _result(response)
+    output.page([{'file': args.output, 'size': response['size'], 'hash': response['hash']}])
+
+
+def _searching(parser, page_size=100, sort=None):
+    parser.add_argument('--filter', action='append', type=_value, default=[], help='search filter, JSON or text (repeatable)')
+    parser.add_argument('--page-size', type=int, default=page_size, help='records per request')
+    parser.add_argument('--max', type=int, default=None, help='stop after this many records')
+    if sort:
+        parser.add_argument('--sort', choices=('asc', 'desc'), default=sort)
+
+
+def _bulk(parser):
+    parser.add_argument('ids', nargs='*', help='IDs (read from stdin, one per line, when omitted)')
+    parser.add_argument('--chunk-size', type=int, default=1000, help='IDs per request')
+    parser.add_argument('--workers', type=int, default=4, help='requests in flight')
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='fortidlp', description='FortiDLP Cloud API from the command line, NDJSON on stdout.')
+    parser.add_argument('--host', help='management host, or hosts to fail over between separated by commas (default: $FORTIDLP_HOST)')
+    parser.add_argument('--token', help='API token (default: $FORTIDLP_TOKEN)')
+    parser.add_argument('--token-cache', metavar='PATH', help='remember for an hour that the token was accepted')
+    parser.add_argument('--insecure', action='store_true', help='do not verify the TLS certificate')
+    resources = parser.add_subparsers(dest='resource', metavar='RESOURCE', required=True)
+
+    agents = resources.add_parser('agents').add_subparsers(dest='command', metavar='COMMAND', required=True)
+    search = agents.add_parser('search', help='every agent matching the filters')
+    _searching(search, sort='asc')
+    search.set_defaults(run=agents_search)
+    delete = agents.add_parser('delete-archived', help='delete archived agents by ID')
+    _bulk(delete)
+    delete.set_defaults(run=agents_delete_archived)
+
+    incidents = resources.add_parser('incidents').add_subparsers(dest='command', metavar='COMMAND', required=True)
+    search = incidents.add_parser('search', help='every incident matching the filters')
+    _searching(search)
+    search.add_argument('--bare', action='store_true', help='leave out agents, users, labels and cluster data')
+    search.set_defaults(run=incidents_search)
+
+    audit = resources.add_parser('audit').add_subparsers(dest='command', metavar='COMMAND', required=True)
+    search = audit.add_parser('search', help='audit logs of a time range')
+    _searching(search, page_size=500, sort='desc')
+    search.add_argument('--start', help='ISO start time')
+    search.add_argument('--end', help='ISO end time')
+    search.add_argument('--type', action='append', help='operation type (repeatable)')
+    search.add_argument('--workers', type=int, default=1, help='time shards fetched concurrently (needs --start)')
+    search.set_defaults(run=audit_search)
+    tail = audit.add_parser('tail', help='follow new audit logs, resuming from a checkpoint file')
+    tail.add_argument('--checkpoint', required=True, help='checkpoint file, created on first use')
+    tail.add_argument('--filter', action='append', type=_value, default=None)
+    tail.add_argument('--type', action='append', help='operation type (repeatable)')
+    tail.add_argument('--start', help='ISO time to start from without a checkpoint')
+    tail.add_argument('--interval', type=float, default=5.0, help='seconds between polls while logs arrive')
+    tail.add_argument('--max-interval', type=float, default=300.0, help='longest wait between polls')
+    tail.add_argument('--once', action='store_true', help='poll once and exit')
+    tail.set_defaults(run=audit_tail)
+
+    labels = resources.add_parser('labels').add_subparsers(dest='command', metavar='COMMAND', required=True)
+    search = labels.add_parser('list', help='every label')
+    _searching(search)
+    search.set_defaults(run=labels_list)
+    for name in ('assign', 'unassign'):
+        command = labels.add_parser(name, help=f'{name} labels to agents given by ID')
+        command.add_argument('--label', action='append', required=True, help='label ID (repeatable)')
+        _bulk(command)
+        command.set_defaults(run=labels_assign)
+
+    cases = resources.add_parser('cases').add_subparsers(dest='command', metavar='COMMAND', required=True)
+    cases.add_parser('list', help='every case').set_defaults(run=cases_list)
+
+    policies = resources.add_parser('policies').add_subparsers(dest='command', metavar='COMMAND', required=True)
+    export = policies.add_parser('export', help='export policy groups as an archive')
+    export.add_argument('group_ids', nargs='+')
+    export.add_argument('--output', required=True, help="archive path, '-' for stdout")
+    export.set_defaults(run=policies_export)
+    return parser
+
+
+def _error(error) -> dict:
+    from fortidlp.pagination import PaginationError
+
+    if isinstance(error, CommandError):
+        return {'error': error.response.get('data')}
+    if isinstance(error, PaginationError):
+        return {'error': error.response.get('data'), 'cursor': error.cursor}
+    return {'error': str(error), 'type': type(error).__name__}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    output = _Output()
+    try:
+        with _client(args) as client:
+            args.run(client, args, output)
+    except KeyboardInterrupt:
+        return 130
+    except BrokenPipeError:
+        # The reader went away (e.g. `| head`): stop quietly.
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return 0
+    except SystemExit as e:
+        # The usage errors of the CLI exit as they are; an exit raised from
+        # a connection error deeper down is reported like any other error.
+        if e.__cause__ is None:
+            raise
+        sys.stderr.write(json.dumps(_error(e.__cause__), default=str) + '\n')
+        return EXIT_ERROR
+    except Exception as e:
+        sys.stderr.write(json.dumps(_error(e), default=str) + '\n')
+        return EXIT_ERROR
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,103 @@
+'''
+Client objects, one per FortiDLP host and token.
+
+    client = Client('tenant1.fortidlp.example.com', token)
+    client.agents.get_agents()
+    client.incidents.iter_incidents()
+
+A Client owns its connection: session and connection pool, headers, cache,
+rate limits and retry policy. Nothing is shared with the module connection
+set up by auth() or with other clients, so several tenants can be used from
+one process, each from as many threads as needed:
+
+    clients = [Client(host, token) for host, token in tenants]
+    for result in bulk(lambda client: client.agents.get_agents(), clients):
+        ...
+'''
+from typing import Optional
+
+import fortidlp.fortidlp as _sync
+from fortidlp.auth import TokenCache
+from fortidlp.cache import ResponseCache
+from fortidlp.metrics import Metrics
+from fortidlp.throttle import RateLimiter, RetryPolicy
+from fortidlp.fortidlp import (
+    Audit, Cases, Operators, Users, Policies, PoliciesData, Incidents, SaaS,
+    Agents, AgentConfigs, AgentEnrollment, Labels,
+)
+
+
+class AuthenticationError(Exception):
+    '''The host rejected the token, or could not be reached, while creating a Client.'''
+
+    def __init__(self, host: str, error):
+        super().__init__(f'Authentication to {host} failed: {error}')
+        self.host = host
+        self.error = error
+
+
+class Client:
+    '''
+    Connection to one host with one token, exposing the resources as
+    attributes (client.agents, client.labels, ...).
+
+    By default the token is checked on the first call (validate='lazy'), so
+    creating a client makes no request and a rejected token or an unreachable
+    host shows up as the usual {'status': False, ...} result of every call;
+    validate='eager' checks it at once and raises AuthenticationError. `verify` and `debug` default to the module
+    settings (fortidlp.ignore_certificate() / fortidlp.enable_debug()).
+
+    `host` may also be a list of hosts, or a HostPool, serving the same
+    tenant: requests then go to the fastest healthy one (see
+    fortidlp.failover), reads being hedged after `hedge_after` seconds.
+    '''
+
+    def __init__(self, host, access_token: str, validate: str = 'lazy', token_cache: Optional[TokenCache] = None,
+                 verify: Optional[bool] = None, debug: Optional[bool] = None,
+                 pool_connections: int = 10, pool_maxsize: int = 10, keepalive_timeout: Optional[float] = None,
+                 max_concurrency: Optional[int] = None, rate_limit: Optional[RateLimiter] = None,
+                 retry: Optional[RetryPolicy] = None, cache: Optional[ResponseCache] = None, metrics: Optional[Metrics] = None,
+                 codec: Optional[object] = None, compress_threshold: Optional[int] = None,
+                 coalesce: bool = True, hedge_after: Optional[float] = None):
+        self.host = host
+        connection, self.authentication = _sync._connect(
+            host, access_token, validate=validate, token_cache=token_cache,
+            verify=_sync.ssl_verification if verify is None else verify,
+            debug=_sync.debug if debug is None else debug,
+            pool_connections=pool_connections, pool_maxsize=pool_maxsize, keepalive_timeout=keepalive_timeout,
+            max_concurrency=max_concurrency, rate_limit=rate_limit, retry=retry, cache=cache, metrics=metrics,
+            codec=codec, compress_threshold=compress_threshold, coalesce=coalesce, hedge_after=hedge_after,
+        )
+        if connection is None:
+            raise AuthenticationError(host, self.authentication['data'])
+        self.connection = connection
+
+        self.audit = Audit(connection)
+        self.cases = Cases(connection)
+        self.operators = Operators(connection)
+        self.users = Users(connection)
+        self.policies = Policies(connection)
+        self.policies_data = PoliciesData(connection)
+        self.incidents = Incidents(connection)
+        self.saas = SaaS(connection)
+        self.agents = Agents(connection)
+        self.agent_configs = AgentConfigs(connection)
+        self.agent_enrollment = AgentEnrollment(connection)
+        self.labels = Labels(connection)
+
+    def authenticate(self) -> dict:
+        '''Run the deferred token check now instead of on the first call.'''
+        error = self.connection._authenticate()
+        return error or {'status': True, 'data': 'AUTHENTICATION_SUCCEEDED'}
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __repr__(self):
+        return f'Client({self.host!r})'
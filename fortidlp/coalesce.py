@@ -0,0 +1,109 @@
+'''
+Single-flight coalescing of identical concurrent reads.
+
+When several threads (or tasks) of one connection ask for the same GET or
+search at the same time, only the first request goes out; the others wait
+for it and share its response. The key is the method, the URL and the
+parameters with their keys sorted. Only calls overlapping in time are
+coalesced: a call made after the response arrived sends its own request
+(see ResponseCache for reuse over time).
+
+Callers share the raw response and each one decodes the body itself, so no
+two callers get the same objects.
+'''
+import json
+import threading
+from typing import Any, Awaitable, Callable, Hashable, Optional, Tuple
+
+from fortidlp.cache import READ_ONLY_SUFFIXES
+
+
+def flight_key(method: str, url: str, params: Optional[dict]) -> Optional[Hashable]:
+    '''The coalescing key of a call, None for calls that must not be shared.'''
+    path = url.split('?', 1)[0]
+    if method != 'GET' and not (method == 'POST' and path.endswith(READ_ONLY_SUFFIXES)):
+        return None
+    return method, url, json.dumps(params or {}, sort_keys=True, default=str)
+
+
+class _Flight:
+    __slots__ = ('done', 'result', 'error', 'waiters')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    '''Runs one call per key at a time; concurrent callers with the same key wait for it and share its result.'''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}
+        self.requests = 0
+        self.coalesced = 0
+
+    def do(self, key: Hashable, call: Callable[[], Any]) -> Tuple[Any, bool]:
+        '''Return (result of call, shared); shared is True for the callers that waited on another one.'''
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self.requests += 1
+            else:
+                flight.waiters += 1
+                self.coalesced += 1
+
+        if leader:
+            try:
+                flight.result = call()
+            except BaseException as e:
+                flight.error = e
+            finally:
+                with self._lock:
+                    del self._flights[key]
+                flight.done.set()
+        else:
+            flight.done.wait()
+
+        if flight.error is not None:
+            raise flight.error
+        return flight.result, not leader
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'requests': self.requests, 'coalesced': self.coalesced, 'in_flight': len(self._flights)}
+
+
+class AsyncSingleFlight:
+    '''SingleFlight for coroutines, on one event loop.'''
+
+    def __init__(self):
+        self._flights = {}
+        self.requests = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, call: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        import asyncio
+
+        future = self._flights.get(key)
+        if future is not None:
+            self.coalesced += 1
+            # A waiter being cancelled must not cancel the shared request.
+            return await asyncio.shield(future), True
+
+        self.requests += 1
+        future = self._flights[key] = asyncio.ensure_future(call())
+
+        def forget(_):
+            if self._flights.get(key) is future:
+                del self._flights[key]
+
+        future.add_done_callback(forget)
+        return await asyncio.shield(future), False
+
+    def stats(self) -> dict:
+        return {'requests': self.requests, 'coalesced': self.coalesced, 'in_flight': len(self._flights)}
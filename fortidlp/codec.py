@@ -0,0 +1,67 @@
+'''
+JSON codecs used to encode request bodies and decode responses.
+
+orjson is used when it is installed (pip install fortidlp[fast]), the
+standard library json module otherwise. Any object with `dumps(obj) -> bytes`
+and `loads(bytes)` can be plugged in, per connection (APIHandler(codec=...))
+or for the whole process with set_default_codec().
+'''
+import json
+import gzip
+from typing import Any, Optional
+
+GZIP_LEVEL = 5
+
+
+class StdlibCodec:
+    name = 'json'
+
+    def dumps(self, obj: Any) -> bytes:
+        return json.dumps(obj, separators=(',', ':'), ensure_ascii=False).encode()
+
+    def loads(self, data) -> Any:
+        return json.loads(data)
+
+
+class OrjsonCodec:
+    '''orjson, falling back to the standard library for what it cannot encode (e.g. integers over 64 bits).'''
+
+    name = 'orjson'
+
+    def __init__(self):
+        import orjson
+        self._orjson = orjson
+        self._fallback = StdlibCodec()
+
+    def dumps(self, obj: Any) -> bytes:
+        try:
+            return self._orjson.dumps(obj, option=self._orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            return self._fallback.dumps(obj)
+
+    def loads(self, data) -> Any:
+        return self._orjson.loads(data)
+
+
+_default = None
+
+
+def default_codec():
+    '''The process wide codec: orjson when available, else the standard library.'''
+    global _default
+    if _default is None:
+        try:
+            _default = OrjsonCodec()
+        except ImportError:
+            _default = StdlibCodec()
+    return _default
+
+
+def set_default_codec(codec: Optional[object]):
+    '''Replace the process wide codec; None picks the best available one again.'''
+    global _default
+    _default = codec
+
+
+def compress(body: bytes, level: int = GZIP_LEVEL) -> bytes:
+    return gzip.compress(body, compresslevel=level, mtime=0)
@@ -1,23 +1,142 @@
+from __future__ import annotations
+
+import os
+import copy
 import json
+import time
 import logging
-import requests
+import threading
+from types import MappingProxyType
 from datetime import datetime
+from urllib.parse import urlsplit
+from fortidlp.throttle import RetryPolicy, ThrottleStats, idempotent, parse_retry_after
+from fortidlp.download import DOWNLOAD_CHUNK_SIZE, DownloadInterrupted, download_to_file, stream_download
+from fortidlp.upload import UPLOAD_CHUNK_SIZE, MultipartStream
+from fortidlp.jsonstream import StreamedPage
+from fortidlp.lazy import requests
+from fortidlp.auth import redact_headers
+from fortidlp.codec import compress, default_codec
+from fortidlp.coalesce import SingleFlight, flight_key
 
-# Globally disable SSL warnings
-requests.packages.urllib3.disable_warnings()
+# Read size used when parsing streamed responses.
+STREAM_CHUNK_SIZE = 64 * 1024
 
 class APIHandler:
 
-    def __init__(self):
+    def __init__(self, pool_connections=10, pool_maxsize=10, keepalive_timeout=None, max_concurrency=None, rate_limit=None, retry=None, cache=None, metrics=None, codec=None, compress_threshold=None, coalesce=True):
         self.host = None
+        # HostPool routing the requests when conn() was given several hosts
+        # (see fortidlp.failover); self.host is then the first of them.
+        self.hosts = None
         self.headers = None
         self.SSL_Verify = True
         self.debug_enabled = False
 
-    def enable_debug(self):
-        import http.client as http_client
-        http_client.HTTPConnection.debuglevel = 1
+        # Connection pool settings. pool_connections is the number of per-host
+        # pools kept alive, pool_maxsize the number of connections kept per host
+        # and keepalive_timeout the idle time (in seconds) after which the pooled
+        # connections are dropped and reopened on the next call.
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.keepalive_timeout = keepalive_timeout
+        self._session = None
+        self._session_lock = threading.Lock()
+        self._last_used = 0.0
+
+        # Upper bound on the requests in flight through this connection, shared
+        # by every thread using it (None means unbounded).
+        self.set_max_concurrency(max_concurrency)
+
+        # Client side throttling (a RateLimiter, None to disable) and retries
+        # of throttled or failed calls (a RetryPolicy, False to disable).
+        self.rate_limit = rate_limit
+        self.retry = RetryPolicy() if retry is None else (retry or None)
+        self.throttle_stats = ThrottleStats()
+
+        # Optional ResponseCache for the read-mostly GET endpoints.
+        self.cache = cache
+
+        # Optional Metrics collecting per-endpoint latency, sizes and errors.
+        self.metrics = metrics
+
+        # JSON codec of the bodies (None for the process default, see
+        # fortidlp.codec) and the size from which request bodies are sent
+        # gzip-compressed (None never compresses them). A server answering
+        # 415 to a compressed body turns compression off for the connection.
+        self.codec = codec
+        self.compress_threshold = compress_threshold
+
+        # Identical GETs and searches in flight at the same time share one
+        # request (see fortidlp.coalesce); None when coalesce=False.
+        self.flights = SingleFlight() if coalesce else None
+
+        # Deferred authentication check (see defer_authentication) and the
+        # callback run when the API rejects the token.
+        self._pending_auth = None
+        self._auth_lock = threading.Lock()
+        self.on_unauthorized = None
+
+        # Adapter mounted instead of the pooled one, set by record() and
+        # replay() (see fortidlp.cassette).
+        self.transport = None
+
+    def set_max_concurrency(self, max_concurrency=None):
+        self.max_concurrency = max_concurrency
+        self._concurrency = threading.BoundedSemaphore(max_concurrency) if max_concurrency else None
 
+    @property
+    def session(self) -> requests.Session:
+        with self._session_lock:
+            now = time.monotonic()
+            if self._session is not None and self.keepalive_timeout is not None \
+                    and now - self._last_used > self.keepalive_timeout:
+                self._session.close()
+                self._session = None
+            if self._session is None:
+                self._session = self._new_session()
+            self._last_used = now
+            return self._session
+
+    def _new_session(self) -> requests.Session:
+        session = requests.Session()
+        session.headers['Accept-Encoding'] = 'gzip, deflate'
+        adapter = self.transport or requests.adapters.HTTPAdapter(pool_connections=self.pool_connections, pool_maxsize=self.pool_maxsize)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
+    def close(self):
+        with self._session_lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+            if hasattr(self.transport, 'finish'):
+                self.transport.finish()
+        if self.hosts is not None:
+            self.hosts.close()
+
+    def record(self, path):
+        '''
+        Write every exchange from now on to the cassette at `path` (see
+        fortidlp.cassette); the file is complete once the connection is closed.
+        '''
+        from fortidlp.cassette import RecordingAdapter
+        self._use_transport(RecordingAdapter(path, pool_connections=self.pool_connections, pool_maxsize=self.pool_maxsize))
+        return self.transport
+
+    def replay(self, path, latency_scale=1.0, repeat=True):
+        '''Answer every request from the cassette at `path`, with no network.'''
+        from fortidlp.cassette import ReplayAdapter
+        self._use_transport(ReplayAdapter(path, latency_scale=latency_scale, repeat=repeat))
+        return self.transport
+
+    def _use_transport(self, transport):
+        self.close()
+        self.transport = transport
+
+    def enable_debug(self):
+        # http.client debug output is left off: it prints the raw request,
+        # bearer token included. urllib3 logs the request lines.
         logging.basicConfig()
         logger = logging.getLogger().setLevel(logging.DEBUG)
         requests_log = logging.getLogger("requests.packages.urllib3")
@@ -26,18 +145,46 @@ class APIHandler:
         self.debug_enabled = True
 
     def conn(self, headers=None, host=None, enable_debug=False, enable_ssl=True, organization = None):
+        '''`host` is one management host, or a list of them (or a HostPool) to fail over between.'''
+        self.hosts = None
+        if host is not None and not isinstance(host, str):
+            # Only loaded with several hosts: it needs requests at import.
+            from fortidlp.failover import HostPool
+            self.hosts = host if isinstance(host, HostPool) else HostPool(host)
+            host = self.hosts.primary
         self.host = host
-        self.headers = headers
+        # Read-only: calls that need extra headers build their own copy, so
+        # threads sharing the connection never see each other's headers.
+        self.headers = MappingProxyType(dict(headers)) if headers is not None else None
         if enable_debug:
             self.enable_debug()
 
         self.SSL_Verify = enable_ssl
+        if self.hosts is not None and self.headers is not None:
+            self.hosts.start_probing(lambda: self.session, dict(self.headers), self.SSL_Verify)
+
+    def defer_authentication(self, check):
+        '''
+        Run `check()` before the first request instead of now. It returns
+        (status, error); while it fails every call returns the error.
+        '''
+        self._pending_auth = check
+
+    def _authenticate(self):
+        with self._auth_lock:
+            if self._pending_auth is None:
+                return None
+            status, error = self._pending_auth()
+            if not status:
+                return {"status": False, "data": error}
+            self._pending_auth = None
+            return None
 
-    def get(self, url, params=None, request_type=None) -> dict:
-        return self._exec("GET", url, params, request_type=request_type)
+    def get(self, url, params=None, request_type=None, stream=False) -> dict:
+        return self._exec("GET", url, params, request_type=request_type, stream_items=stream)
 
-    def send(self, url, params=None, request_type=None) -> dict:
-        return self._exec("POST", url, params, request_type=request_type)
+    def send(self, url, params=None, request_type=None, stream=False) -> dict:
+        return self._exec("POST", url, params, request_type=request_type, stream_items=stream)
 
     def insert(self, url, params=None, request_type=None) -> dict:
         return self._exec("PUT", url, params, request_type=request_type)
@@ -48,57 +195,143 @@ class APIHandler:
     def delete(self, url, params=None, request_type=None) -> dict:
         return self._exec("DELETE", url, params, request_type=request_type)
     
-    def download(self, url, params=None, request_type=None, file_format = 'zip', download_folder = '') -> object:
-        self.download_folder = download_folder
-        return self._exec("GET", url, params, request_type=request_type, download_file=True, file_format=file_format)
+    def download(self, url, params=None, request_type=None, file_format = 'zip', download_folder = '', fileobj = None, chunk_size = DOWNLOAD_CHUNK_SIZE, hash_algorithm = 'sha256') -> object:
+        '''
+        Stream a file to `download_folder` (a timestamped file) or into the
+        writable binary `fileobj`. The result holds the file name (or the file
+        object) in 'data', plus the 'size' and 'hash' of the content.
+        '''
+        download = {'folder': download_folder or '.', 'fileobj': fileobj, 'chunk_size': chunk_size, 'hash_algorithm': hash_algorithm}
+        return self._exec("GET", url, params, request_type=request_type, download_file=download, file_format=file_format)
     
-    def upload(self, url, file, params=None, request_type=None ) -> dict:
-        return self._exec("POST", url, params, request_type=request_type, upload_file=file)
+    def upload(self, url, file, params=None, request_type=None, field='file', chunk_size=UPLOAD_CHUNK_SIZE, manifest=None) -> dict:
+        '''
+        Upload `file` (a path, a binary file object or a requests style files
+        dict) as multipart/form-data, streamed in `chunk_size` reads; `params`
+        are sent as form fields. With an UploadManifest, a path whose content
+        was already uploaded to `url` is skipped and the result holds the
+        manifest record with 'skipped': True.
+        '''
+        path = os.fspath(file) if isinstance(file, (str, os.PathLike)) else None
+        destination = f"{self.host}{url}"
+        if manifest is not None and path is not None:
+            entry = manifest.unchanged(destination, path)
+            if entry is not None:
+                return {'status': True, 'data': entry, 'skipped': True}
+
+        hash_algorithm = manifest.hash_algorithm if manifest is not None else None
+        opened = open(path, 'rb') if path is not None else None
+        try:
+            files = file if isinstance(file, dict) else {field: opened or file}
+            params = {k: v for k, v in (params or {}).items() if v is not None}
+            stream = MultipartStream(files, params, chunk_size=chunk_size, hash_algorithm=hash_algorithm)
+            result = self._exec("POST", url, request_type=stream.content_type, upload_file=stream)
+        finally:
+            if opened is not None:
+                opened.close()
 
-    def _exec(self, method, url, params=None, download_file=False, request_type=None, file_format=None, upload_file=None) -> dict:
+        if result['status'] and manifest is not None and path is not None:
+            manifest.record(destination, path, stream.digests[field].hexdigest())
+        return result
+
+    def _exec(self, method, url, params=None, download_file=False, request_type=None, file_format=None, upload_file=None, stream_items=False) -> dict:
+        '''
+        Send the request and return {'status': ..., 'data': ...}. With
+        stream_items, 'data' is a StreamedPage yielding the records of the
+        page while the body is being read.
+        '''
         if method not in ['GET', 'POST', 'PUT', 'PATCH', 'DELETE']:
             raise ValueError("Method not supported")
 
         if not self.headers or not self.host:
             return {"status": False, "data": "NOT AUTHENTICATED. Run Auth() first."}
 
+        if self._pending_auth is not None:
+            error = self._authenticate()
+            if error is not None:
+                return error
+
         params = {k: v for k, v in (params or {}).items() if v is not None}
         url = f"https://{self.host}{url}"
 
+        headers = self.headers
         if request_type:
-            self.headers['Content-Type'] = request_type
+            headers = {**headers, 'Content-Type': request_type}
 
         if self.debug_enabled:
             print("URL = ", url)
-            print(json.dumps(self.headers, indent=4))
+            print(json.dumps(redact_headers(headers), indent=4))
             print(json.dumps(params, indent=4))
 
+        cache_key = None
+        if self.cache is not None and not download_file and upload_file is None and not stream_items:
+            cache_key, cached, conditional = self.cache.lookup(method, url, params)
+            if cached is not None:
+                return cached
+            if conditional:
+                headers = {**headers, **conditional}
+
+        codec = self.codec or default_codec()
+        body = upload_file
+        compressed = False
+        if method in ['POST', 'PUT', 'PATCH'] and upload_file is None:
+            body = codec.dumps(params)
+            if 'Content-Type' not in headers:
+                headers = {**headers, 'Content-Type': 'application/json'}
+            if self.compress_threshold is not None and len(body) >= self.compress_threshold:
+                compressed = True
+
+        request = {
+            'params': params if method == 'GET' else None,
+            'verify': self.SSL_Verify,
+            'stream': bool(download_file or stream_items),
+        }
+        key = None
+        if self.flights is not None and not (download_file or stream_items or compressed) and upload_file is None:
+            key = flight_key(method, url, params)
+        shared = False
+        started = time.monotonic()
         try:
-            response = requests.request(
-                method,
-                url,
-                headers=self.headers,
-                json=params if method in ['POST', 'PUT', 'PATCH'] else None,
-                params=params if method == 'GET' else None,
-                verify=self.SSL_Verify,
-                stream=download_file,
-                files=upload_file
-            )
+            if key is not None:
+                # The body is read before it is shared; every caller decodes it.
+                response, shared = self.flights.do(key, lambda: self._send(method, url, headers=headers, data=body, **request))
+            elif compressed:
+                response = self._send(method, url, headers={**headers, 'Content-Encoding': 'gzip'}, data=compress(body), **request)
+                if response.status_code == 415:
+                    # The server does not take compressed bodies: stop sending them.
+                    self.compress_threshold = None
+                    response.close()
+                    compressed = False
+            if key is None and not compressed:
+                response = self._send(method, url, headers=headers, data=body, **request)
         except requests.exceptions.ConnectionError as e:
+             self._observe(method, url, started, error=e)
              return {
                 'status': False,
                 'data': {'status_code': 500, 'error_message': f'Failed to connect to {url}. Error: {e}'}
             }
         except requests.exceptions.RequestException as e:
+            self._observe(method, url, started, error=e)
             return {
                 'status': False,
                 'data': {'status_code': 500, 'error_message': e}
             }
 
+        if self.metrics is not None and not shared and (response.status_code >= 300 or not (download_file or stream_items)):
+            self._observe(method, url, started, response)
+
+        if response.status_code == 304 and cache_key is not None:
+            cached = self.cache.revalidated(cache_key)
+            if cached is not None:
+                return cached
+
+        if response.status_code == 401 and self.on_unauthorized is not None:
+            self.on_unauthorized()
+
         if not response.ok:
             try:
-                error_message = response.json().get('errorMessage', response.text)
-            except ValueError:
+                error_message = codec.loads(response.content).get('errorMessage', response.text)
+            except (ValueError, AttributeError):
                 error_message = response.text
             return {
                 'status': False,
@@ -108,19 +341,148 @@ class APIHandler:
         if download_file:
             filename_function = url.split('/')[-1].replace('-','_')
             filename_function = filename_function.split('?')[0]
-            if not self.download_folder:
-                self.download_folder = '.'
-            return self._handle_file_download(response, filename_function, file_format)
+
+            def reopen(offset, previous):
+                range_headers = {**headers, 'Range': f'bytes={offset}-'}
+                validator = previous.headers.get('ETag') or previous.headers.get('Last-Modified')
+                if validator:
+                    range_headers['If-Range'] = validator
+                return self._send(method, url, headers=range_headers, params=params if method == 'GET' else None, verify=self.SSL_Verify, stream=True)
+
+            options = download_file if isinstance(download_file, dict) else {}
+            try:
+                result = self._handle_file_download(response, filename_function, file_format, reopen=reopen, **options)
+                self._observe(method, url, started, response, received=result['size'])
+                return result
+            except (DownloadInterrupted, requests.exceptions.RequestException) as e:
+                self._observe(method, url, started, response, error=e)
+                return {
+                    'status': False,
+                    'data': {'status_code': 500, 'error_message': str(e)}
+                }
+
+        if stream_items:
+            # Latency up to the headers; the body is read by the caller.
+            self._observe(method, url, started, response, received=int(response.headers.get('Content-Length') or 0))
+            return {'status': True, 'data': StreamedPage(response.iter_content(STREAM_CHUNK_SIZE), on_close=response.close)}
 
         try:
-            return {'status': True, 'data': response.json()}
+            result = {'status': True, 'data': codec.loads(response.content)}
         except ValueError:  # If response is not JSON
-            return {'status': True, 'data': response.text}
+            result = {'status': True, 'data': response.text}
+
+        if self.cache is not None:
+            if cache_key is not None:
+                self.cache.store(cache_key, url, copy.deepcopy(result), response.headers)
+            self.cache.mutated(method, url)
+        return result
+
+    def _observe(self, method, url, started, response=None, error=None, received=None):
+        if self.metrics is None:
+            return
+        sent = 0
+        status = None
+        if response is not None:
+            status = response.status_code
+            sent = int(response.request.headers.get('Content-Length') or 0)
+            if received is None:
+                # Bytes on the wire: the compressed size for gzip-encoded responses.
+                received = int(response.headers.get('Content-Length') or len(response.content))
+        self.metrics.observe(
+            method,
+            urlsplit(url).path,
+            time.monotonic() - started,
+            status=status,
+            error=type(error).__name__ if error is not None else None,
+            sent=sent,
+            received=received or 0,
+        )
+
+    def _hedge_slot(self, path):
+        '''
+        Take a rate limiter token and a max_concurrency slot for a hedged copy
+        of a request (see fortidlp.failover) without waiting. Returns their
+        release, or None when one of them is not free now.
+        '''
+        concurrency = self._concurrency
+        if concurrency is not None and not concurrency.acquire(blocking=False):
+            return None
+        if self.rate_limit is not None and not self.rate_limit.try_acquire(self.host, path):
+            if concurrency is not None:
+                concurrency.release()
+            return None
+        self.throttle_stats.add(requests=1)
+        return concurrency.release if concurrency is not None else (lambda: None)
+
+    def _send(self, method, url, **kwargs) -> requests.Response:
+        '''
+        Send one request, waiting for the rate limiter and retrying throttled
+        calls and dropped connections according to the retry policy (calls
+        changing data only when that cannot apply them twice).
+        '''
+        # Streamed upload bodies cannot be sent twice.
+        retry = self.retry if isinstance(kwargs.get('data'), (bytes, type(None))) else None
+        path = urlsplit(url).path
+        safe = idempotent(method, path)
+        attempt = 0
+        spent = 0.0
+
+        while True:
+            if self.rate_limit is not None:
+                waited = self.rate_limit.acquire(self.host, path)
+                if waited:
+                    self.throttle_stats.add(throttled=1, throttled_time=waited)
+                    if self.metrics is not None:
+                        self.metrics.throttled(method, path, waited)
+
+            error = None
+            response = None
+            concurrency = self._concurrency
+            if concurrency is not None:
+                concurrency.acquire()
+            try:
+                self.throttle_stats.add(requests=1)
+                if self.hosts is not None:
+                    response = self.hosts.request(self.session, method, url, hedge_slot=lambda: self._hedge_slot(path), **kwargs)
+                else:
+                    response = self.session.request(method, url, **kwargs)
+            except requests.exceptions.ConnectionError as e:
+                # A HostPool already sent the call to every host it could.
+                if retry is None or self.hosts is not None or not retry.retries(error=e, idempotent=safe):
+                    raise
+                error = e
+            finally:
+                if concurrency is not None:
+                    concurrency.release()
+
+            if response is not None and (retry is None or not retry.retries(response, idempotent=safe)
+                                         or self.hosts is not None and safe and response.status_code in self.hosts.failure_statuses):
+                return response
+
+            retry_after = parse_retry_after(response.headers.get('Retry-After')) if response is not None else None
+            delay = retry.delay(attempt, spent, retry_after)
+            if delay is None:
+                self.throttle_stats.add(gave_up=1)
+                if error is not None:
+                    raise error
+                return response
+
+            if response is not None:
+                response.close()
+            time.sleep(delay)
+            spent += delay
+            attempt += 1
+            self.throttle_stats.add(retries=1, backoff_time=delay)
+            if self.metrics is not None:
+                self.metrics.retried(method, path)
+
+    def _handle_file_download(self, response, filename_prefix, file_format='zip', folder='.', fileobj=None, reopen=None, chunk_size=DOWNLOAD_CHUNK_SIZE, hash_algorithm='sha256'):
+        options = {'reopen': reopen, 'chunk_size': chunk_size, 'hash_algorithm': hash_algorithm}
+        if fileobj is not None:
+            result = stream_download(response, fileobj, **options)
+            return {'status': True, 'data': fileobj, 'size': result['size'], 'hash': result['hash']}
 
-    def _handle_file_download(self, response, filename_prefix, file_format='zip'):
         date_now = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"{self.download_folder}/{filename_prefix}_{date_now}.{file_format}"
-        with open(filename, 'wb') as f:
-            for chunk in response.iter_content(chunk_size=1024):
-                f.write(chunk)
-        return {'status': True, 'data': filename}
\ No newline at end of file
+        filename = f"{folder}/{filename_prefix}_{date_now}.{file_format}"
+        result = download_to_file(response, filename, **options)
+        return {'status': True, 'data': filename, 'size': result['size'], 'hash': result['hash']}
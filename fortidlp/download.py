@@ -0,0 +1,141 @@
+'''
+Streaming file downloads for APIHandler.download.
+
+The body is copied with readinto() into one reusable buffer (large chunks,
+no per-chunk bytes objects), hashed on the fly and written to a temporary
+file that is renamed into place only once complete. When the connection
+drops mid-transfer the download is resumed with an HTTP Range request from
+the last byte written.
+'''
+from __future__ import annotations
+
+import os
+import hashlib
+import tempfile
+import functools
+from typing import BinaryIO, Callable, Optional
+
+from fortidlp.lazy import requests
+
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+MAX_RESUMES = 3
+
+
+@functools.lru_cache(maxsize=None)
+def read_errors() -> tuple:
+    '''Errors raised while reading the body of a dropped connection.'''
+    import urllib3
+    import http.client
+    return (
+        requests.exceptions.ConnectionError,
+        requests.exceptions.ChunkedEncodingError,
+        urllib3.exceptions.HTTPError,
+        http.client.HTTPException,
+        ConnectionError,
+    )
+
+
+class DownloadInterrupted(Exception):
+    '''The connection dropped and the download could not be resumed.'''
+
+    def __init__(self, error, written: int):
+        super().__init__(f'Download interrupted after {written} bytes: {error}')
+        self.error = error
+        self.written = written
+
+
+class _Stream:
+
+    def __init__(self, out: BinaryIO, chunk_size: int, hash_algorithm: Optional[str]):
+        self.out = out
+        self.chunk_size = chunk_size
+        self.hash_algorithm = hash_algorithm
+        self.start = out.tell() if out.seekable() else 0
+        self.restart()
+
+    def restart(self):
+        self.written = 0
+        self.digest = hashlib.new(self.hash_algorithm) if self.hash_algorithm else None
+
+    def copy(self, response: requests.Response):
+        encoded = response.headers.get('Content-Encoding', 'identity') != 'identity'
+        expected = response.headers.get('Content-Length')
+        expected = self.written + int(expected) if expected and not encoded else None
+        try:
+            if encoded:
+                # Compressed bodies have to be decoded by requests.
+                for chunk in response.iter_content(chunk_size=self.chunk_size):
+                    self._write(chunk)
+            else:
+                buffer = memoryview(bytearray(self.chunk_size))
+                while True:
+                    read = response.raw.readinto(buffer)
+                    if not read:
+                        break
+                    self._write(buffer[:read])
+        except read_errors() as e:
+            raise DownloadInterrupted(e, self.written) from e
+        if expected is not None and self.written < expected:
+            raise DownloadInterrupted('connection closed before the end of the body', self.written)
+
+    def _write(self, chunk):
+        self.out.write(chunk)
+        if self.digest is not None:
+            self.digest.update(chunk)
+        self.written += len(chunk)
+
+
+def stream_download(response: requests.Response, out: BinaryIO, reopen: Optional[Callable[[int, requests.Response], requests.Response]] = None, chunk_size: int = DOWNLOAD_CHUNK_SIZE, hash_algorithm: Optional[str] = 'sha256', max_resumes: int = MAX_RESUMES) -> dict:
+    '''
+    Copy the body of `response` into `out` and return {'size': ..., 'hash': ...}.
+
+    `reopen(offset, response)` must send the request again asking for the
+    bytes from `offset` on; it is called after a dropped connection, at most
+    `max_resumes` times.
+    '''
+    stream = _Stream(out, chunk_size, hash_algorithm)
+    resumes = 0
+    try:
+        while True:
+            try:
+                stream.copy(response)
+                break
+            except DownloadInterrupted:
+                if reopen is None or resumes >= max_resumes or response.headers.get('Content-Encoding', 'identity') != 'identity':
+                    raise
+                resumes += 1
+                response.close()
+                response = reopen(stream.written, response)
+                if response.status_code == 200 and out.seekable():
+                    # The server ignored the Range header: start over.
+                    out.seek(stream.start)
+                    out.truncate()
+                    stream.restart()
+                elif response.status_code != 206:
+                    raise
+    finally:
+        response.close()
+
+    return {
+        'size': stream.written,
+        'hash': stream.digest.hexdigest() if stream.digest is not None else None,
+        'resumes': resumes,
+    }
+
+
+def download_to_file(response: requests.Response, filename: str, **options) -> dict:
+    '''
+    stream_download into `filename`, through a temporary file in the same
+    folder renamed into place once the body is complete.
+    '''
+    folder, name = os.path.split(os.path.abspath(filename))
+    fd, temp_name = tempfile.mkstemp(dir=folder, prefix=f'.{name}.', suffix='.part')
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            result = stream_download(response, out, **options)
+        os.replace(temp_name, filename)
+    except BaseException:
+        if os.path.exists(temp_name):
+            os.unlink(temp_name)
+        raise
+    return result
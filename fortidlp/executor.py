@@ -0,0 +1,118 @@
+'''
+Concurrent execution of per-ID calls.
+
+    from fortidlp import bulk, Cases
+
+    for result in bulk(Cases().delete_case, case_ids):
+        if not result.status:
+            print(result.item, result.data)
+
+Calls run on a thread pool and share the pooled session of the connection.
+Results are yielded as soon as each call finishes, not in input order. The
+connection max_concurrency (see auth()) caps the requests in flight across
+every bulk run and thread of the process.
+
+By default there are as many workers as the connection keeps pooled
+connections (pool_maxsize), since further threads would open connections
+that urllib3 drops afterwards. Raise pool_maxsize with the worker count.
+'''
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Any, Callable, Iterable, Iterator, NamedTuple, Optional
+
+
+class BulkResult(NamedTuple):
+    item: Any
+    status: bool
+    data: Any
+    elapsed: float
+
+
+class BulkProgress:
+    '''Running totals of a bulk run, passed to the progress callback.'''
+
+    def __init__(self, total: Optional[int] = None):
+        self.total = total
+        self.done = 0
+        self.failed = 0
+        self.started = time.monotonic()
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    @property
+    def rate(self) -> float:
+        '''Completed calls per second.'''
+        elapsed = self.elapsed
+        return self.done / elapsed if elapsed > 0 else 0.0
+
+    def __repr__(self):
+        total = f"/{self.total}" if self.total is not None else ""
+        return f"<BulkProgress {self.done}{total} done, {self.failed} failed, {self.rate:.1f}/s>"
+
+
+def _call(func: Callable, item: Any) -> BulkResult:
+    start = time.monotonic()
+    try:
+        response = func(item)
+    except Exception as e:
+        return BulkResult(item, False, e, time.monotonic() - start)
+
+    if isinstance(response, dict) and 'status' in response:
+        return BulkResult(item, bool(response['status']), response.get('data'), time.monotonic() - start)
+    return BulkResult(item, True, response, time.monotonic() - start)
+
+
+def _pool_size(func: Callable) -> int:
+    '''pool_maxsize of the connection `func` (a resource method) sends through, the module connection otherwise.'''
+    connection = getattr(getattr(func, '__self__', None), 'connection', None)
+    if connection is None:
+        from fortidlp.fortidlp import fortidlp_connection as connection
+    return getattr(connection, 'pool_maxsize', None) or 10
+
+
+def bulk(func: Callable[[Any], dict], items: Iterable, workers: Optional[int] = None, progress: Optional[Callable[[BulkProgress], None]] = None) -> Iterator[BulkResult]:
+    '''
+    Call `func(item)` for every item on `workers` threads and yield a
+    BulkResult per item as the calls finish. `workers` defaults to the
+    pool_maxsize of the connection.
+
+    Only about 2 * workers items are pulled from `items` at a time, so it can
+    be a generator over millions of IDs. `progress` is called with the
+    running BulkProgress after every completed call.
+    '''
+    workers = workers or _pool_size(func)
+    total = len(items) if hasattr(items, '__len__') else None
+    state = BulkProgress(total)
+    source = iter(items)
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='fortidlp-bulk') as pool:
+        pending = set()
+
+        def fill():
+            while len(pending) < workers * 2:
+                try:
+                    item = next(source)
+                except StopIteration:
+                    return
+                pending.add(pool.submit(_call, func, item))
+
+        try:
+            fill()
+            while pending:
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    pending.discard(future)
+                    result = future.result()
+                    state.done += 1
+                    if not result.status:
+                        state.failed += 1
+                    if progress:
+                        progress(state)
+                    yield result
+                fill()
+        finally:
+            # On early exit only the calls already running are waited for.
+            for future in pending:
+                future.cancel()
@@ -0,0 +1,331 @@
+'''
+Columnar export of agents, incidents and audit logs.
+
+    from fortidlp.export import export_agents, iter_batches
+
+    export_agents('agents.parquet')                  # or .arrow, .csv, .csv.gz
+    for batch in iter_batches(Incidents().iter_incidents().iter_pages()):
+        frame = batch.to_pandas()
+
+Pages are fetched one after the other (the next one is requested while the
+current one is being converted and written) and turned into column batches
+with a stable schema: nested objects are flattened into dotted columns
+(users.name), lists are kept as JSON text, and the columns are fixed by the
+first page (or `columns`), keys that show up later going to the `_extra`
+JSON column. Files are written batch by batch to a temporary file renamed
+into place once complete, so memory stays bounded by `batch_rows`. An
+export without any record is still a readable file, holding the `columns`
+given (as strings) or none.
+
+Arrow column types are inferred from the first batch, columns mixing types
+there being strings; `column_types` ({column: pyarrow type}) sets them
+instead. A later value the type cannot hold raises ValueError, as a null
+would hide it; string columns take the JSON text of other values.
+
+Parquet and Arrow IPC need the optional pyarrow dependency
+(pip install fortidlp[arrow]); CSV works with the standard library alone.
+Without pyarrow, iter_batches yields {column: list} dicts, which
+pandas.DataFrame and numpy.asarray accept as they are.
+'''
+import os
+import csv
+import gzip
+import json
+import queue
+import tempfile
+import threading
+from typing import Iterable, Iterator, List, Optional
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:  # pragma: no cover - optional dependency
+    pyarrow = None
+
+from fortidlp.fortidlp import Agents, Audit, Incidents
+
+EXTRA_COLUMN = '_extra'
+FORMATS = ('parquet', 'arrow', 'csv')
+
+
+def flatten(record: dict, sep: str = '.', prefix: str = '', out: Optional[dict] = None) -> dict:
+    '''{'user': {'name': 'x'}, 'labels': [...]} -> {'user.name': 'x', 'labels': '[...]'}'''
+    out = {} if out is None else out
+    for key, value in record.items():
+        name = f'{prefix}{key}'
+        if isinstance(value, dict) and value:
+            flatten(value, sep, f'{name}{sep}', out)
+        elif isinstance(value, (list, dict)):
+            out[name] = json.dumps(value, separators=(',', ':'))
+        else:
+            out[name] = value
+    return out
+
+
+class Columnizer:
+    '''
+    Turns pages of records into {column: list} batches with a stable set of
+    columns, taken from `columns` or from the first page.
+    '''
+
+    def __init__(self, columns: Optional[List[str]] = None, sep: str = '.'):
+        self.columns = list(columns) if columns else None
+        self.sep = sep
+
+    def __call__(self, page: Iterable[dict]) -> dict:
+        rows = [flatten(getattr(record, 'raw', record), self.sep) for record in page]
+        if self.columns is None:
+            seen = {}
+            for row in rows:
+                seen.update(dict.fromkeys(row))
+            self.columns = list(seen) + [EXTRA_COLUMN]
+        known = set(self.columns)
+
+        batch = {column: [row.get(column) for row in rows] for column in self.columns if column != EXTRA_COLUMN}
+        extras = []
+        for row in rows:
+            extra = {key: value for key, value in row.items() if key not in known}
+            extras.append(json.dumps(extra, separators=(',', ':')) if extra else None)
+        if EXTRA_COLUMN in known:
+            batch[EXTRA_COLUMN] = extras
+        return batch
+
+
+_ARROW_ERRORS = () if pyarrow is None else (pyarrow.ArrowInvalid, pyarrow.ArrowTypeError, TypeError, ValueError)
+
+
+def _arrow_type(values: list) -> 'pyarrow.DataType':
+    try:
+        kind = pyarrow.array(values).type
+    except _ARROW_ERRORS:
+        # Mixed types, e.g. numbers and strings.
+        return pyarrow.string()
+    return pyarrow.string() if pyarrow.types.is_null(kind) else kind
+
+
+def _arrow_types(batch: dict, column_types: Optional[dict] = None) -> 'pyarrow.Schema':
+    column_types = column_types or {}
+    return pyarrow.schema([pyarrow.field(column, column_types.get(column) or _arrow_type(values)) for column, values in batch.items()])
+
+
+def _arrow_column(values: list, field) -> 'pyarrow.Array':
+    try:
+        return pyarrow.array(values, type=field.type)
+    except _ARROW_ERRORS:
+        pass
+    if not pyarrow.types.is_string(field.type):
+        for value in values:
+            try:
+                pyarrow.scalar(value, type=field.type)
+            except _ARROW_ERRORS:
+                raise ValueError(f"Column {field.name!r} is {field.type} (from the first batch) but holds {value!r}; "
+                                 f"set its type with column_types={{{field.name!r}: pyarrow.string()}}") from None
+    # A value of another type than in the first batch: strings take its text.
+    fixed = [value if value is None or isinstance(value, str) else json.dumps(value) for value in values]
+    return pyarrow.array(fixed, type=field.type)
+
+
+class _Batches:
+    '''Shared conversion of columns to Arrow record batches.'''
+
+    schema = None
+    column_types = None
+
+    def arrow(self, batch: dict) -> 'pyarrow.RecordBatch':
+        if self.schema is None:
+            self.schema = _arrow_types(batch, self.column_types)
+        return pyarrow.RecordBatch.from_arrays([_arrow_column(batch[field.name], field) for field in self.schema], schema=self.schema)
+
+
+def _prefetched(pages: Iterable, depth: int = 2) -> Iterator:
+    '''Iterate over `pages` with up to `depth` pages fetched ahead in a thread.'''
+    if depth <= 0:
+        yield from pages
+        return
+    done = object()
+    buffer = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def fetch():
+        try:
+            for page in pages:
+                if not put(page):
+                    return
+            put(done)
+        except BaseException as e:
+            put(e)
+
+    thread = threading.Thread(target=fetch, name='fortidlp-export-prefetch', daemon=True)
+    thread.start()
+    try:
+        while True:
+            page = buffer.get()
+            if page is done:
+                return
+            if isinstance(page, BaseException):
+                raise page
+            yield page
+    finally:
+        stop.set()
+
+
+def _rebatched(pages: Iterable, columnize: Columnizer, batch_rows: int) -> Iterator[dict]:
+    '''Column batches of about `batch_rows` rows from the pages.'''
+    pending, rows = None, 0
+    for page in pages:
+        batch = columnize(page)
+        if pending is None:
+            pending = batch
+        else:
+            for column, values in batch.items():
+                pending[column].extend(values)
+        rows += len(page)
+        if rows >= batch_rows:
+            yield pending
+            pending, rows = None, 0
+    if pending is not None and rows:
+        yield pending
+
+
+def iter_batches(pages: Iterable[list], columns: Optional[List[str]] = None, batch_rows: int = 50000, arrow: Optional[bool] = None, prefetch: int = 2,
+                 column_types: Optional[dict] = None) -> Iterator:
+    '''
+    Column batches of the records in `pages` (e.g. Paginator.iter_pages()):
+    pyarrow RecordBatches when pyarrow is installed (or arrow=True), else
+    {column: list} dicts.
+    '''
+    arrow = pyarrow is not None if arrow is None else arrow
+    if arrow and pyarrow is None:
+        raise ImportError("Arrow batches require pyarrow. Install it with: pip install fortidlp[arrow]")
+    converter = _Batches()
+    converter.column_types = column_types
+    for batch in _rebatched(_prefetched(pages, prefetch), Columnizer(columns), batch_rows):
+        yield converter.arrow(batch) if arrow else batch
+
+
+class _CSVWriter:
+
+    def __init__(self, path: str, compress: bool, columns: Optional[List[str]] = None):
+        self.file = gzip.open(path, 'wt', newline='', encoding='utf-8') if compress else open(path, 'w', newline='', encoding='utf-8')
+        self.writer = csv.writer(self.file)
+        self.columns = columns
+        self.header = False
+
+    def write(self, batch: dict):
+        if not self.header:
+            self.writer.writerow(batch)
+            self.header = True
+        self.writer.writerows(zip(*batch.values()))
+
+    def close(self, complete: bool = True):
+        if complete and not self.header and self.columns:
+            self.writer.writerow(self.columns)
+            self.header = True
+        self.file.close()
+
+
+class _ArrowWriter(_Batches):
+
+    def __init__(self, path: str, format: str, compression: Optional[str], columns: Optional[List[str]] = None, column_types: Optional[dict] = None):
+        self.path = path
+        self.format = format
+        self.compression = compression
+        self.columns = columns
+        self.column_types = column_types
+        self.writer = None
+
+    def _open(self, schema: 'pyarrow.Schema'):
+        if self.format == 'parquet':
+            self.writer = pyarrow.parquet.ParquetWriter(self.path, schema, compression=self.compression or 'snappy')
+        else:
+            self.writer = pyarrow.ipc.new_file(self.path, schema)
+
+    def write(self, batch: dict):
+        batch = self.arrow(batch)
+        if self.writer is None:
+            self._open(batch.schema)
+        if self.format == 'parquet':
+            self.writer.write_batch(batch)
+        else:
+            self.writer.write(batch)
+
+    def close(self, complete: bool = True):
+        if self.writer is None and complete:
+            # No record: an empty table with the declared columns.
+            self._open(_arrow_types({column: [] for column in self.columns or []}, self.column_types))
+        if self.writer is not None:
+            self.writer.close()
+
+
+def _format_of(path: str) -> str:
+    name = path.lower()
+    if name.endswith('.parquet'):
+        return 'parquet'
+    if name.endswith(('.arrow', '.feather', '.ipc')):
+        return 'arrow'
+    return 'csv'
+
+
+def write(pages: Iterable[list], path: str, format: Optional[str] = None, columns: Optional[List[str]] = None, batch_rows: int = 50000, compression: Optional[str] = None, prefetch: int = 2,
+          column_types: Optional[dict] = None) -> dict:
+    '''
+    Write the records of `pages` to `path` as Parquet, Arrow IPC or CSV
+    (from the extension unless `format` is given; .csv.gz is compressed).
+    `column_types` ({column: pyarrow type}) overrides the inferred Arrow types.
+    Returns {'status': True, 'data': path, 'rows': ..., 'columns': [...]}.
+    '''
+    format = format or _format_of(path)
+    if format not in FORMATS:
+        raise ValueError(f"format must be one of {', '.join(FORMATS)}")
+    if format != 'csv' and pyarrow is None:
+        raise ImportError(f"{format} export requires pyarrow. Install it with: pip install fortidlp[arrow]")
+
+    folder = os.path.dirname(os.path.abspath(path))
+    fd, temp_name = tempfile.mkstemp(dir=folder, prefix='.export.', suffix='.part')
+    os.close(fd)
+    if format == 'csv':
+        writer = _CSVWriter(temp_name, compress=compression == 'gzip' or path.lower().endswith('.gz'), columns=columns)
+    else:
+        writer = _ArrowWriter(temp_name, format, compression, columns=columns, column_types=column_types)
+
+    columnize = Columnizer(columns)
+    rows = 0
+    try:
+        for batch in _rebatched(_prefetched(pages, prefetch), columnize, batch_rows):
+            writer.write(batch)
+            rows += len(next(iter(batch.values()), []))
+        writer.close()
+    except BaseException:
+        writer.close(complete=False)
+        os.remove(temp_name)
+        raise
+    os.replace(temp_name, path)
+    return {'status': True, 'data': path, 'rows': rows, 'columns': columnize.columns or []}
+
+
+def export_agents(path: str, agents: Optional[Agents] = None, filter: list = [], results_per_page: int = 1000, **options) -> dict:
+    '''Export every agent matching `filter` to `path` (see write()).'''
+    pages = (agents or Agents()).iter_agents(filter=filter, results_per_page=results_per_page).iter_pages()
+    return write(pages, path, **options)
+
+
+def export_incidents(path: str, incidents: Optional[Incidents] = None, filter: list = [], results_per_page: int = 1000, stream: bool = True, **options) -> dict:
+    '''Export every incident matching `filter`, with agents, users, labels and cluster data, to `path`.'''
+    pages = (incidents or Incidents()).iter_incidents(filter=filter, results_per_page=results_per_page, stream=stream).iter_pages()
+    return write(pages, path, **options)
+
+
+def export_audit_logs(path: str, audit: Optional[Audit] = None, filter: list = None, start_time: Optional[str] = None, end_time: Optional[str] = None, results_per_page: int = 1000, **options) -> dict:
+    '''Export the audit logs between `start_time` and `end_time` to `path`, oldest first.'''
+    pages = (audit or Audit()).iter_audit_logs(filter=filter, start_time=start_time, end_time=end_time, results_per_page=results_per_page, sort_order='asc').iter_pages()
+    return write(pages, path, **options)
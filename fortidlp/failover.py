@@ -0,0 +1,342 @@
+'''
+Routing of the requests of one connection over several management hosts.
+
+    auth(['eu.fortidlp.example.com', 'us.fortidlp.example.com', 'standby.fortidlp.example.com'], token)
+    client = Client(HostPool(hosts, hedge_after=0.5, probe_interval=30), token)
+
+Each request goes to the host with the lowest latency (an exponentially
+weighted moving average of its response times) among the hosts whose
+circuit breaker is closed; hosts not measured yet come after the measured
+ones, in the order given. Connection errors and 5xx answers count as
+failures of the host: after `failure_threshold` in a row its breaker opens
+and no request is sent to it for `reset_timeout` seconds, after which one
+trial request (or a probe) decides whether it closes again.
+
+Reads (GETs and the read-only searches and exports) that fail move on to the
+next host. A call that changes data only does when its connection could not
+be opened, as the server may otherwise have applied it: other connection
+errors are raised and 5xx answers returned as they are. With a pool, this
+failover replaces the retries of connection errors and 5xx answers to reads
+of the connection RetryPolicy, which still handles throttling.
+
+Reads (GETs and searches) that have not answered after `hedge_after`
+seconds are sent a second time to the next best host, and the first good
+answer wins; the other one is discarded when it arrives. The second copy
+counts against the limits of the connection: APIHandler hands the pool a
+`hedge_slot` taking a rate limiter token and a max_concurrency slot without
+waiting, and when none is free the request is not hedged.
+
+Probes reuse the endpoints of AuthenticationHandler.test_authentication.
+probe() measures every host once (auth() runs it when validating the
+token) and `probe_interval` keeps probing in a background thread, which is
+how a host whose breaker opened comes back without a request paying for it.
+'''
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Callable, Iterable, List, Optional, Tuple
+from urllib.parse import urlsplit, urlunsplit
+
+from fortidlp.lazy import requests
+from fortidlp.auth import AuthenticationHandler
+from fortidlp.throttle import connect_failed, idempotent
+
+# Answers counted as a failure of the host rather than of the request.
+FAILURE_STATUSES = (500, 502, 503, 504)
+
+# Reserves the limits of the connection for a hedged copy, returning their release or None.
+HedgeSlot = Callable[[], Optional[Callable[[], None]]]
+
+
+class CircuitBreaker:
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        '''Whether a request may go to the host; an open breaker lets one trial through once reset_timeout is over.'''
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                return True
+            return False
+
+    def success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened = time.monotonic()
+
+
+class Host:
+    '''Health and latency of one management host.'''
+
+    def __init__(self, name: str, breaker: CircuitBreaker, alpha: float):
+        self.name = name
+        self.breaker = breaker
+        self.alpha = alpha
+        self.latency = None
+        self.requests = 0
+        self.failures = 0
+        self._lock = threading.Lock()
+
+    def success(self, latency: float):
+        with self._lock:
+            self.requests += 1
+            self.latency = latency if self.latency is None else self.alpha * latency + (1 - self.alpha) * self.latency
+        self.breaker.success()
+
+    def failure(self):
+        with self._lock:
+            self.requests += 1
+            self.failures += 1
+        self.breaker.failure()
+
+    def snapshot(self) -> dict:
+        return {
+            'state': self.breaker.state,
+            'latency': self.latency,
+            'requests': self.requests,
+            'failures': self.failures,
+        }
+
+    def __repr__(self):
+        latency = f'{self.latency * 1000:.1f} ms' if self.latency is not None else 'unmeasured'
+        return f'<Host {self.name} {self.breaker.state} {latency}>'
+
+
+class NoHealthyHost(requests.exceptions.ConnectionError):
+    '''Every host of the pool has its circuit breaker open.'''
+
+
+class HostPool:
+
+    failure_statuses = FAILURE_STATUSES
+
+    def __init__(self, hosts: Iterable[str], alpha: float = 0.3, failure_threshold: int = 3, reset_timeout: float = 30.0,
+                 hedge_after: Optional[float] = None, hedge_workers: int = 16, probe_interval: Optional[float] = None):
+        names = [hosts] if isinstance(hosts, str) else list(hosts)
+        if not names:
+            raise ValueError("HostPool needs at least one host")
+        self.hosts = [Host(name, CircuitBreaker(failure_threshold, reset_timeout), alpha) for name in names]
+        self.hedge_after = hedge_after
+        self.hedge_workers = hedge_workers
+        self.probe_interval = probe_interval
+        self.hedged = 0
+        self.hedges_won = 0
+        self.failovers = 0
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        self._prober = None
+        self._stopped = threading.Event()
+
+    @property
+    def primary(self) -> str:
+        return self.hosts[0].name
+
+    def __str__(self):
+        return ','.join(host.name for host in self.hosts)
+
+    def ranked(self, exclude: Iterable[Host] = ()) -> List[Host]:
+        '''Hosts not excluded, best first, whatever the state of their breaker.'''
+        order = {id(host): number for number, host in enumerate(self.hosts)}
+        candidates = [host for host in self.hosts if host not in exclude]
+        candidates.sort(key=lambda host: (host.latency is None, host.latency or 0.0, order[id(host)]))
+        return candidates
+
+    def choose(self, exclude: Iterable[Host] = ()) -> Optional[Host]:
+        '''The best host a request may go to now, None when every breaker is open.'''
+        for host in self.ranked(exclude):
+            # Only asked of the host picked, as it lets a half-open breaker's trial through.
+            if host.breaker.allow():
+                return host
+        return None
+
+    def _send(self, session, host: Host, method: str, url: str, kwargs: dict):
+        target = urlunsplit(urlsplit(url)._replace(netloc=host.name))
+        started = time.monotonic()
+        try:
+            response = session.request(method, target, **kwargs)
+        except requests.exceptions.RequestException:
+            host.failure()
+            raise
+        if response.status_code in FAILURE_STATUSES:
+            host.failure()
+        else:
+            host.success(time.monotonic() - started)
+        return response
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.hedge_workers, thread_name_prefix='fortidlp-hedge')
+            return self._executor
+
+    def _hedged(self, session, first: Host, tried: List[Host], method: str, url: str, kwargs: dict, hedge_slot: Optional[HedgeSlot]):
+        '''
+        Send to `first`, and to the next best host too if `first` is slower
+        than hedge_after. `hedge_slot()` reserves what the second copy needs
+        and returns its release, or None to send no second copy.
+        '''
+        primary = self.executor.submit(self._send, session, first, method, url, kwargs)
+        done, _ = wait([primary], timeout=self.hedge_after)
+        if done:
+            return primary.result()
+        release = hedge_slot() if hedge_slot is not None else _nothing
+        if release is None:
+            return primary.result()
+        second = self.choose(exclude=tried)
+        if second is None:
+            release()
+            return primary.result()
+
+        tried.append(second)
+        self.hedged += 1
+        backup = self.executor.submit(self._send, session, second, method, url, kwargs)
+        copies = [primary, backup]
+        pending = list(copies)
+        # The caller frees its own slot once this returns, while the losing
+        # copy may still be running: the reserved slot is held until both end.
+        ended = []
+        lock = threading.Lock()
+
+        def end(future):
+            with lock:
+                ended.append(future)
+                last = len(ended) == len(copies)
+            if last:
+                release()
+
+        for future in copies:
+            future.add_done_callback(end)
+        while True:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                pending.remove(future)
+                good = future.exception() is None and future.result().status_code not in FAILURE_STATUSES
+                if good or not pending:
+                    for other in pending:
+                        other.add_done_callback(_discard)
+                    if good and future is backup:
+                        self.hedges_won += 1
+                    return future.result()
+                if future.exception() is None:
+                    future.result().close()
+
+    def request(self, session, method: str, url: str, hedge_slot: Optional[HedgeSlot] = None, **kwargs):
+        '''Send the request to the best host, failing over to the next ones.'''
+        read = idempotent(method, urlsplit(url).path)
+        hedge = read and self.hedge_after is not None and not kwargs.get('stream') \
+            and isinstance(kwargs.get('data'), (bytes, type(None)))
+        tried = []
+        error = None
+        response = None
+        while True:
+            host = self.choose(exclude=tried)
+            if host is None:
+                if response is not None:
+                    return response
+                raise error or NoHealthyHost(f'No healthy host among {self}')
+            if tried:
+                self.failovers += 1
+            tried.append(host)
+            if response is not None:
+                response.close()
+            try:
+                response = self._hedged(session, host, tried, method, url, kwargs, hedge_slot) if hedge else self._send(session, host, method, url, kwargs)
+            except requests.exceptions.ConnectionError as e:
+                if not read and not connect_failed(e):
+                    raise
+                error, response = e, None
+                continue
+            if response.status_code not in FAILURE_STATUSES or not read:
+                return response
+
+    def probe(self, session, headers: dict, verify: bool = True) -> Tuple[bool, object]:
+        '''
+        Check every host once on the authentication endpoints. Returns
+        (True, None) when one of them accepted the token, else (False, error).
+        '''
+        login = AuthenticationHandler()
+        error = None
+        accepted = False
+        for host in self.hosts:
+            for path in login.urls:
+                started = time.monotonic()
+                try:
+                    response = session.get(f'https://{host.name}/{path}', headers=headers, verify=verify)
+                    response.close()
+                except requests.exceptions.RequestException as e:
+                    host.failure()
+                    error = error or str(e)
+                    break
+                if response.status_code in FAILURE_STATUSES:
+                    host.failure()
+                    error = error or login.errors.get(response.status_code, response.status_code)
+                    break
+                # Any other answer shows the host is up, even a rejected token.
+                host.success(time.monotonic() - started)
+                if response.status_code in login.errors:
+                    error = login.errors[response.status_code]
+                    continue
+                accepted = True
+                break
+        return accepted, None if accepted else error
+
+    def start_probing(self, session_factory, headers: dict, verify: bool = True):
+        '''Probe the hosts every probe_interval seconds in a background thread.'''
+        if not self.probe_interval or self._prober is not None:
+            return
+
+        def run():
+            while not self._stopped.wait(self.probe_interval):
+                try:
+                    self.probe(session_factory(), headers, verify)
+                except Exception:
+                    pass
+
+        self._stopped.clear()
+        self._prober = threading.Thread(target=run, name='fortidlp-probe', daemon=True)
+        self._prober.start()
+
+    def close(self):
+        self._stopped.set()
+        self._prober = None
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+
+    def snapshot(self) -> dict:
+        return {
+            'hosts': {host.name: host.snapshot() for host in self.hosts},
+            'hedged': self.hedged,
+            'hedges_won': self.hedges_won,
+            'failovers': self.failovers,
+        }
+
+
+def _nothing():
+    pass
+
+
+def _discard(future):
+    if future.exception() is None:
+        future.result().close()
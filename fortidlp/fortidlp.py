@@ -1,22 +1,46 @@
 
 import re
 import os
-import json
-from typing import BinaryIO, Optional
-from fortidlp.auth import AuthenticationHandler
+from typing import BinaryIO, Callable, Iterable, Optional
+from fortidlp.auth import AuthenticationHandler, TokenCache
 from fortidlp.connector import APIHandler
+from fortidlp.pagination import Paginator
+from fortidlp.models import Agent, AuditLog, Incident, Label
+from fortidlp.throttle import RateLimiter, RetryPolicy
+from fortidlp.cache import ResponseCache
+from fortidlp.metrics import Metrics
+from fortidlp.tail import AuditTail
+from fortidlp.scan import TimeShardedScan
+from fortidlp.chunking import DEFAULT_CHUNK_SIZE, DEFAULT_MAX_FILTER_BYTES, FilterBatchPlanner, submit_chunks
 
 version = '0.1'
 
 fortidlp_connection = APIHandler()
 
-class Audit:
+class Resource:
+	'''
+	Base of the resource classes.
+	Description:  Resources send their requests through the connection given at
+	creation time, or through the module connection set up by auth().
+	'''
+
+	def __init__(self, connection: Optional[APIHandler] = None):
+		self._connection = connection
+
+	@property
+	def connection(self) -> APIHandler:
+		return self._connection if self._connection is not None else fortidlp_connection
+
+	def _chunked(self, call, items: list, chunk_size: int = DEFAULT_CHUNK_SIZE, workers: int = 4, planner: Optional[FilterBatchPlanner] = None) -> dict:
+		return submit_chunks(call, items, chunk_size=chunk_size, workers=workers, planner=planner)
+
+class Audit(Resource):
 	'''
 	Class Audit
 	Description:  Return a list of audit logs.
 	'''
 
-	def get_audit_logs(self, filter: list = None, start_time: str = None, end_time: str = None, operation_types: list[str] = None, results_per_page: int = 100, sort_order: str = 'desc') -> dict:
+	def get_audit_logs(self, filter: list = None, start_time: str = None, end_time: str = None, operation_types: list[str] = None, results_per_page: int = 100, sort_order: str = 'desc', cursor: Optional[str] = None) -> dict:
 		'''
 		Class Audit
 		Description:  Return a list of audit logs.
@@ -25,6 +49,7 @@ class Audit:
 			start_time (str): Start time for the logs in ISO format.
 			end_time (str): End time for the logs in ISO format.
 			limit (int): Number of logs to return.
+			cursor (str, optional): Cursor for pagination.
 
 		Returns:
 			bool: Status of the request (True or False). 
@@ -44,14 +69,72 @@ class Audit:
 
 		if operation_types:
 			parameters["types"] = operation_types if isinstance(operation_types, list) else [operation_types]
+		if cursor:
+			parameters["cursor"] = cursor
 
 		url = '/api/v1/audit/search'
 
 		url = f"{url}?results_per_page={results_per_page}&sort_order={sort_order}"
 
-		return fortidlp_connection.send(url, params=parameters)
-	
-class Cases:
+		return self.connection.send(url, params=parameters)
+
+	def iter_audit_logs(self, filter: list = None, start_time: str = None, end_time: str = None, operation_types: list[str] = None, results_per_page: int = 100, sort_order: str = 'desc', cursor: Optional[str] = None, max_items: Optional[int] = None, typed: bool = False) -> Paginator:
+		'''
+		Class Audit
+		Description:  Iterate over every audit log matching the search, following the page cursor.
+
+		Args:
+			start_time (str): Start time for the logs in ISO format.
+			end_time (str): End time for the logs in ISO format.
+			cursor (str, optional): Cursor to resume the iteration from.
+			max_items (int, optional): Stop after this many logs.
+			typed (bool, optional): Yield compact AuditLog models (see fortidlp.models) instead of dicts.
+
+		Returns:
+			Paginator: Iterator yielding one audit log at a time.
+		'''
+
+		return Paginator(lambda page_cursor: self.get_audit_logs(filter, start_time, end_time, operation_types, results_per_page, sort_order, page_cursor), cursor=cursor, max_items=max_items, model=AuditLog if typed else None)
+
+	def scan_audit_logs(self, start_time: str, end_time: Optional[str] = None, filter: list = None, operation_types: list[str] = None, results_per_page: int = 100, sort_order: str = 'desc', shards: Optional[int] = None, workers: int = 4, max_items: Optional[int] = None, typed: bool = False, time_field: str = 'timestamp') -> TimeShardedScan:
+		'''
+		Class Audit
+		Description:  Iterate over the audit logs of a long time range, paging through time shards concurrently.
+
+		Args:
+			start_time (str): Start time for the logs in ISO format.
+			end_time (str, optional): End time for the logs in ISO format, now by default.
+			shards (int, optional): Number of shards the range is first cut into; dense shards are split further.
+			workers (int): Number of shards paged through at the same time.
+			max_items (int, optional): Stop after this many logs.
+			typed (bool, optional): Yield compact AuditLog models (see fortidlp.models) instead of dicts.
+			time_field (str, optional): Field holding the time of a log, which decides the shard it belongs to.
+
+		Returns:
+			TimeShardedScan: Iterator yielding one audit log at a time, in sort_order.
+		'''
+
+		search = lambda start, end, page_cursor: self.get_audit_logs(filter, start, end, operation_types, results_per_page, sort_order, page_cursor)
+		return TimeShardedScan(search, start_time, end_time, sort_order=sort_order, shards=shards, workers=workers, time_field=time_field, max_items=max_items, model=AuditLog if typed else None)
+
+	def tail(self, checkpoint: str, filter: list = None, operation_types: list[str] = None, start_time: Optional[str] = None, results_per_page: int = 500, min_interval: float = 5.0, max_interval: float = 300.0) -> AuditTail:
+		'''
+		Class Audit
+		Description:  Follow the audit logs incrementally, keeping a high-watermark in a checkpoint file.
+
+		Args:
+			checkpoint (str): Path of the checkpoint file, created on first use.
+			start_time (str, optional): Where to start when there is no checkpoint yet, in ISO format.
+			min_interval (float): Seconds between polls while new logs keep arriving.
+			max_interval (float): Longest wait between polls while idle.
+
+		Returns:
+			AuditTail: Use poll() to fetch what is new once, or follow() to keep polling.
+		'''
+
+		return AuditTail(self, checkpoint, filter=filter, operation_types=operation_types, start_time=start_time, results_per_page=results_per_page, min_interval=min_interval, max_interval=max_interval)
+
+class Cases(Resource):
 
 	def list_cases(self, content_event_uri: Optional[str] = None, content_operated_by: Optional[str] = None, created_by: Optional[str] = None) -> dict:
 		'''
@@ -78,7 +161,7 @@ class Cases:
 		if created_by:
 			parameters["created_by"] = created_by
 
-		return fortidlp_connection.get(url, params=parameters)
+		return self.connection.get(url, params=parameters)
 
 	def delete_case(self, case_id: str) -> dict:
 		'''
@@ -94,9 +177,9 @@ class Cases:
 		'''
 
 		url = f'/api/v1/cases/{case_id}'
-		return fortidlp_connection.delete(url)
+		return self.connection.delete(url)
 
-class Operators:
+class Operators(Resource):
 	''''''
 
 	def list_operators(self) -> dict:
@@ -112,7 +195,7 @@ class Operators:
 		'''
 
 		url = '/api/v1/operators'
-		return fortidlp_connection.get(url)
+		return self.connection.get(url)
 
 	def create_operator(self, username:str, name: str, email: str, company: str, password: str, role, link_expiration: int = 1, password_reset_on_login: bool = True ) -> tuple[bool, None]:
 		'''
@@ -143,7 +226,7 @@ class Operators:
 			"passphrase_reset_on_login": password_reset_on_login
 		}
 
-		return fortidlp_connection.send(url, params=data)
+		return self.connection.send(url, params=data)
 		
 	def delete_operator(self, operator_id: str) -> dict:
 		'''
@@ -158,9 +241,9 @@ class Operators:
 			None: This function does not return any data.
 		'''
 		url = f'/api/v1/operators/{operator_id}'
-		return fortidlp_connection.delete(url)
+		return self.connection.delete(url)
 
-class Users:
+class Users(Resource):
 	'''
 	Class Users
 	Description:  Return a list of users.
@@ -179,7 +262,7 @@ class Users:
 		'''
 
 		url = '/api/v1/users'
-		return fortidlp_connection.get(url)
+		return self.connection.get(url)
 	
 	# Function to create a users, that might contain the following data as input:
 	# {
@@ -241,9 +324,9 @@ class Users:
 
 		url = '/api/v1/admin/users'
 
-		return fortidlp_connection.send(url, params=user)
+		return self.connection.send(url, params=user)
 
-class Policies:
+class Policies(Resource):
 	'''
 	Class Policies
 	Description:  Return a list of policies.
@@ -267,7 +350,7 @@ class Policies:
 		'''
 
 		url = '/api/v1/policies/groups'
-		return fortidlp_connection.send(url)
+		return self.connection.send(url)
 
 	def list_policies_groups(self) -> tuple[bool, None]:
 		'''
@@ -282,7 +365,7 @@ class Policies:
 		'''
 
 		url = '/api/v1/policies/groups'
-		return fortidlp_connection.get(url)
+		return self.connection.get(url)
 
 	def delete_policy_group(self, group_id: str) -> dict:
 		'''
@@ -298,15 +381,17 @@ class Policies:
 		'''
 
 		url = f'/api/v1/policies/groups/{group_id}'
-		return fortidlp_connection.delete(url)
+		return self.connection.delete(url)
 
-	def export_policy_groups(self, group_ids: list[str], include_data_objects: bool = True, include_labels: bool = True) -> tuple[bool, None]:
+	def export_policy_groups(self, group_ids: list[str], include_data_objects: bool = True, include_labels: bool = True, download_folder: str = '', fileobj: Optional[BinaryIO] = None) -> tuple[bool, None]:
 		'''
 		Class Policies
 		Description:  Export policy groups.
 		
 		Args:
 			group_ids (list[str]): List of policy group IDs to export.
+			download_folder (str, optional): Folder to save the export archive in. Defaults to the current folder.
+			fileobj (BinaryIO, optional): Writable binary file object to stream the archive into instead.
 
 		Returns:
 			bool: Status of the request (True or False). 
@@ -319,7 +404,7 @@ class Policies:
 			"include_data_objects": include_data_objects,
 			"include_labels": include_labels
 		}
-		return fortidlp_connection.download(url, params=data)
+		return self.connection.download(url, params=data, download_folder=download_folder, fileobj=fileobj)
 
 	def list_policies_data(self) -> tuple[bool, None]:
 		'''
@@ -334,7 +419,7 @@ class Policies:
 		'''
 
 		url = '/api/v1/policies/data'
-		return fortidlp_connection.get(url)
+		return self.connection.get(url)
 
 	def delete_policy_asset(self, asset_id: str) -> dict:
 		'''
@@ -350,9 +435,9 @@ class Policies:
 		'''
 
 		url = f'/api/v1/policies/data/{asset_id}'
-		return fortidlp_connection.delete(url)
+		return self.connection.delete(url)
 
-class PoliciesData:
+class PoliciesData(Resource):
 	'''
 	Class PoliciesData
 	Description:  Return a list of policies data.
@@ -373,7 +458,7 @@ class PoliciesData:
 		'''
 
 		url = '/api/v1/policies/data'
-		return fortidlp_connection.get(url)
+		return self.connection.get(url)
 
 	def get_policy_data(self, policy_id: str) -> tuple[bool, None]:
 		'''
@@ -389,7 +474,7 @@ class PoliciesData:
 		'''
 
 		url = f'/api/v1/policies/data/{policy_id}'
-		return fortidlp_connection.get(url)
+		return self.connection.get(url)
 	
 	def delete_policy_data(self, policy_id: str) -> tuple[bool, None]:
 		'''
@@ -405,15 +490,15 @@ class PoliciesData:
 		'''
 
 		url = f'/api/v1/policies/data/{policy_id}'
-		return fortidlp_connection.delete(url)
+		return self.connection.delete(url)
 
-class Incidents:
+class Incidents(Resource):
 	'''
 	Class Incidents
 	Description:  Return a list of incidents.
 	'''
 
-	def search_incidents(self, filter: list = [], include_agents: str = True, include_cluster_data: str = True, include_labels: str = True, include_users: str = True, results_per_page: int = 100) -> dict:
+	def search_incidents(self, filter: list = [], include_agents: str = True, include_cluster_data: str = True, include_labels: str = True, include_users: str = True, results_per_page: int = 100, cursor: Optional[str] = None, stream: bool = False) -> dict:
 		'''
 		Class Incidents
 		Description:  Return a list of incidents.
@@ -424,6 +509,9 @@ class Incidents:
 			include_cluster_data (bool): Whether to include cluster data in the response.
 			include_labels (bool): Whether to include labels in the response.
 			include_users (bool): Whether to include users in the response.
+			cursor (str, optional): Cursor for pagination.
+			stream (bool, optional): Parse the page while it is received. 'data' is then a StreamedPage
+				yielding the incidents one by one; its cursor is available once it has been read.
 
 		Returns:
 			bool: Status of the request (True or False). 
@@ -441,12 +529,56 @@ class Incidents:
 			parameters["include_labels"] = include_labels
 		if include_users:
 			parameters["include_users"] = include_users
+		if cursor:
+			parameters["cursor"] = cursor
 
 		url = '/api/v2/incidents/search'
 		if results_per_page:
 			url = f"{url}?results_per_page={results_per_page}"
 		
-		return fortidlp_connection.send(url, params=parameters)
+		return self.connection.send(url, params=parameters, stream=stream)
+
+	def iter_incidents(self, filter: list = [], include_agents: str = True, include_cluster_data: str = True, include_labels: str = True, include_users: str = True, results_per_page: int = 100, cursor: Optional[str] = None, max_items: Optional[int] = None, stream: bool = False, typed: bool = False) -> Paginator:
+		'''
+		Class Incidents
+		Description:  Iterate over every incident matching the search, following the page cursor.
+
+		Args:
+			filter (list): List of filters to apply to the incidents.
+			cursor (str, optional): Cursor to resume the iteration from.
+			max_items (int, optional): Stop after this many incidents.
+			stream (bool, optional): Parse each page while it is received, holding about one incident in memory.
+			typed (bool, optional): Yield compact Incident models (see fortidlp.models) instead of dicts.
+
+		Returns:
+			Paginator: Iterator yielding one incident at a time.
+		'''
+
+		return Paginator(lambda page_cursor: self.search_incidents(filter, include_agents, include_cluster_data, include_labels, include_users, results_per_page, page_cursor, stream), cursor=cursor, max_items=max_items, model=Incident if typed else None)
+
+	def scan_incidents(self, start_time: str, time_filter: Callable[[str, str], list], end_time: Optional[str] = None, filter: list = [], include_agents: str = True, include_cluster_data: str = True, include_labels: str = True, include_users: str = True, results_per_page: int = 100, sort_order: str = 'desc', shards: Optional[int] = None, workers: int = 4, max_items: Optional[int] = None, typed: bool = False, time_field: str = 'timestamp') -> TimeShardedScan:
+		'''
+		Class Incidents
+		Description:  Iterate over the incidents of a long time range, paging through time shards concurrently.
+
+		Args:
+			start_time (str): Start time in ISO format.
+			time_filter (callable): Turns the ISO start and end times of a shard into the filters selecting its incidents.
+			end_time (str, optional): End time in ISO format, now by default.
+			shards (int, optional): Number of shards the range is cut into.
+			workers (int): Number of shards paged through at the same time.
+			max_items (int, optional): Stop after this many incidents.
+			typed (bool, optional): Yield compact Incident models (see fortidlp.models) instead of dicts.
+			time_field (str, optional): Field holding the time of an incident, which decides its shard and order.
+
+		Returns:
+			TimeShardedScan: Iterator yielding one incident at a time, ordered by timestamp.
+			The search has no sort order, so each shard is read whole and sorted.
+		'''
+
+		filter = filter if isinstance(filter, list) else [filter]
+		search = lambda start, end, page_cursor: self.search_incidents(filter + list(time_filter(start, end)), include_agents, include_cluster_data, include_labels, include_users, results_per_page, page_cursor)
+		return TimeShardedScan(search, start_time, end_time, sort_order=sort_order, shards=shards, workers=workers, presorted=False, time_field=time_field, max_items=max_items, model=Incident if typed else None)
 
 	# Function to update incident status:
 	# This function receives: {
@@ -483,9 +615,31 @@ class Incidents:
 			parameters["reason"] = reason
 		
 		url = '/api/v2/incidents/status'
-		return fortidlp_connection.send(url, params=parameters)
+		return self.connection.send(url, params=parameters)
+
+	def bulk_update_status(self, status: str, incident_ids: Iterable[str], id_filter: Callable[[list], list], reason = None, max_ids: int = DEFAULT_CHUNK_SIZE, max_bytes: int = DEFAULT_MAX_FILTER_BYTES, workers: int = 4) -> dict:
+		'''
+		Class Incidents
+		Description:  Update the status of the given incidents, packing their IDs into as few filter batches as possible.
+
+		Args:
+			status (str): New status for the incidents.
+			incident_ids (iterable): IDs of the incidents, read lazily; repeated IDs are sent once.
+			id_filter (callable): Turns a batch of IDs into the filter list selecting those incidents.
+			reason (str): Reason for the status update.
+			max_ids (int, optional): Most IDs in one batch.
+			max_bytes (int, optional): Largest encoded filter of one batch.
+			workers (int, optional): Number of batches in flight at a time.
+
+		Returns:
+			dict: Status (False when a batch still failed after its retries), with the outcome of every batch
+			in 'data'['batches'] and the IDs of the failed ones in 'data'['failed'].
+		'''
 
-class SaaS:
+		planner = FilterBatchPlanner(incident_ids, id_filter, max_ids=max_ids, max_bytes=max_bytes)
+		return self._chunked(lambda batch: self.update_status(status, filter=planner.filters(batch), reason=reason), [], workers=workers, planner=planner)
+
+class SaaS(Resource):
 	'''
 	Class SaaS
 	Description:  Return a list of SaaS applications.
@@ -517,9 +671,30 @@ class SaaS:
 		if not all and filter:
 			data["filter"] = filter if isinstance(filter, list) else [filter]
 
-		return fortidlp_connection.send(url, params=data)
+		return self.connection.send(url, params=data)
+
+	def bulk_change_state(self, state: str, reason: str, application_ids: Iterable[str], id_filter: Callable[[list], list], max_ids: int = DEFAULT_CHUNK_SIZE, max_bytes: int = DEFAULT_MAX_FILTER_BYTES, workers: int = 4) -> dict:
+		'''
+		Class SaaS
+		Description:  Change the state of the given SaaS applications, packing their IDs into as few filter batches as possible.
+
+		Args:
+			state (str): The new state for the SaaS applications.
+			reason (str): Reason for the state change.
+			application_ids (iterable): IDs of the applications, read lazily; repeated IDs are sent once.
+			id_filter (callable): Turns a batch of IDs into the filter list selecting those applications.
+			max_ids (int, optional): Most IDs in one batch.
+			max_bytes (int, optional): Largest encoded filter of one batch.
+			workers (int, optional): Number of batches in flight at a time.
+
+		Returns:
+			dict: Status, with the outcome of every batch in 'data'['batches'] (see Incidents.bulk_update_status).
+		'''
 
-class Agents:
+		planner = FilterBatchPlanner(application_ids, id_filter, max_ids=max_ids, max_bytes=max_bytes)
+		return self._chunked(lambda batch: self.change_state(state, reason, filter=planner.filters(batch)), [], workers=workers, planner=planner)
+
+class Agents(Resource):
 	'''
 	Class Agents
 	Description:  Return a list of agents.
@@ -553,7 +728,24 @@ class Agents:
 		if results_per_page:
 			url = f"{url}?results_per_page={results_per_page}&sort_order={sort_order}"
 		
-		return fortidlp_connection.send(url, params=parameters)
+		return self.connection.send(url, params=parameters)
+
+	def iter_agents(self, filter: list = [], results_per_page: int = 100, sort_order: str = "asc", cursor: Optional[str] = None, max_items: Optional[int] = None, typed: bool = False) -> Paginator:
+		'''
+		Class Agents
+		Description:  Iterate over every agent matching the search, following the page cursor.
+
+		Args:
+			filter: (list): List of filters to apply to the agents.
+			cursor (str, optional): Cursor to resume the iteration from.
+			max_items (int, optional): Stop after this many agents.
+			typed (bool, optional): Yield compact Agent models (see fortidlp.models) instead of dicts.
+
+		Returns:
+			Paginator: Iterator yielding one agent at a time.
+		'''
+
+		return Paginator(lambda page_cursor: self.get_agents(filter, results_per_page, sort_order, page_cursor), cursor=cursor, max_items=max_items, model=Agent if typed else None)
 
 	def update_status(self, filter: Optional[list], new_state: Optional[str], reason: Optional[str]) -> dict:
 		'''
@@ -578,7 +770,28 @@ class Agents:
 		if filter:
 			data["filter"] = filter if isinstance(filter, list) else [filter]
 
-		return fortidlp_connection.send(url, params=data)
+		return self.connection.send(url, params=data)
+
+	def bulk_update_status(self, new_state: str, reason: str, agent_ids: Iterable[str], id_filter: Callable[[list], list], max_ids: int = DEFAULT_CHUNK_SIZE, max_bytes: int = DEFAULT_MAX_FILTER_BYTES, workers: int = 4) -> dict:
+		'''
+		Class Agents
+		Description:  Update the status of the given agents, packing their IDs into as few filter batches as possible.
+
+		Args:
+			new_state (str): New state for the agents.
+			reason (str): Reason for the status update.
+			agent_ids (iterable): IDs of the agents, read lazily; repeated IDs are sent once.
+			id_filter (callable): Turns a batch of IDs into the filter list selecting those agents.
+			max_ids (int, optional): Most IDs in one batch.
+			max_bytes (int, optional): Largest encoded filter of one batch.
+			workers (int, optional): Number of batches in flight at a time.
+
+		Returns:
+			dict: Status, with the outcome of every batch in 'data'['batches'] (see Incidents.bulk_update_status).
+		'''
+
+		planner = FilterBatchPlanner(agent_ids, id_filter, max_ids=max_ids, max_bytes=max_bytes)
+		return self._chunked(lambda batch: self.update_status(planner.filters(batch), new_state, reason), [], workers=workers, planner=planner)
 
 	# Function Delete archived agents
 	#{
@@ -591,11 +804,22 @@ class Agents:
 	# "revoked_days": "string"
 	# }
 
-	def delete_archived_agents(self, agent_ids: list, archived_days: Optional[str] = None, inactive_days: Optional[int] = None, never_reported: Optional[bool] = None, revoked_days: Optional[str] = None) -> dict:
+	def delete_archived_agents(self, agent_ids: list, archived_days: Optional[str] = None, inactive_days: Optional[int] = None, never_reported: Optional[bool] = None, revoked_days: Optional[str] = None, chunk_size: int = DEFAULT_CHUNK_SIZE, workers: int = 4) -> dict:
+		'''
+		Class Agents
+		Description:  Delete archived agents.
 
-		data = {
-			"agent_ids": agent_ids if isinstance(agent_ids, list) else [agent_ids]
-		}
+		Args:
+			agent_ids (list): List of agent IDs to delete.
+			chunk_size (int, optional): Agent IDs sent per request; larger lists are split and sent concurrently.
+			workers (int, optional): Number of chunks in flight at a time.
+
+		Returns:
+			dict: 'status' is False when a chunk failed; 'data' holds the submit_chunks summary (chunks, succeeded,
+			failed, results, batches), whatever the number of agent IDs.
+		'''
+
+		data = {}
 		
 		if archived_days:
 			data["archived_days"] = archived_days
@@ -606,12 +830,11 @@ class Agents:
 		if revoked_days:	
 			data["revoked_days"] = revoked_days
 
-		print(json.dumps(data, indent=4))
-
 		url = '/api/v1/admin/agents/archived/delete'
-		return fortidlp_connection.insert(url, params=data)
+		agent_ids = agent_ids if isinstance(agent_ids, list) else [agent_ids]
+		return self._chunked(lambda chunk: self.connection.insert(url, params={"agent_ids": chunk, **data}), agent_ids, chunk_size, workers)
 
-	def assign_labels(self, agent_ids: list[str], label_ids: list[str]) -> dict:
+	def assign_labels(self, agent_ids: list[str], label_ids: list[str], chunk_size: int = DEFAULT_CHUNK_SIZE, workers: int = 4) -> dict:
 		'''
 		Class Labels
 		Description:  Assign labels to agents.
@@ -619,40 +842,40 @@ class Agents:
 		Args:
 			agent_ids (list[str], optional): List of agent IDs to assign labels to.
 			label_ids (list[str], optional): List of label IDs to assign.
+			chunk_size (int, optional): Agent IDs sent per request; larger lists are split and sent concurrently.
+			workers (int, optional): Number of chunks in flight at a time.
 
 		Returns:
-			bool: Status of the request (True or False).
-			None: This function does not return any data.
+			dict: 'status' is False when a chunk failed; 'data' holds the submit_chunks summary (chunks, succeeded,
+			failed, results, batches), whatever the number of agent IDs.
 		'''
 	
 		url = '/api/v1/admin/agents/labels/add'
-		param = {
-			"agent_ids": agent_ids if isinstance(agent_ids, list) else [agent_ids],
-			"label_ids": label_ids if isinstance(label_ids, list) else [label_ids]
-		}
+		agent_ids = agent_ids if isinstance(agent_ids, list) else [agent_ids]
+		label_ids = label_ids if isinstance(label_ids, list) else [label_ids]
 		
-		return fortidlp_connection.insert(url, params=param)
+		return self._chunked(lambda chunk: self.connection.insert(url, params={"agent_ids": chunk, "label_ids": label_ids}), agent_ids, chunk_size, workers)
 
-	def unassign_labels(self, agent_ids: list[str], label_ids: list[str]) -> dict:
+	def unassign_labels(self, agent_ids: list[str], label_ids: list[str], chunk_size: int = DEFAULT_CHUNK_SIZE, workers: int = 4) -> dict:
 		'''
 		Class Labels
 		Description:  Unassign labels from agents.
 		Args:
 			agent_ids (list[str], optional): List of agent IDs to unassign labels from.
 			label_ids (list[str], optional): List of label IDs to unassign.
+			chunk_size (int, optional): Agent IDs sent per request; larger lists are split and sent concurrently.
+			workers (int, optional): Number of chunks in flight at a time.
 		Returns:
-			bool: Status of the request (True or False).
-			None: This function does not return any data.
+			dict: 'status' is False when a chunk failed; 'data' holds the submit_chunks summary (chunks, succeeded,
+			failed, results, batches), whatever the number of agent IDs.
 		'''
 
 		url = '/api/v1/admin/agents/labels/remove'
-		param = {
-			"agent_ids": agent_ids if isinstance(agent_ids, list) else [agent_ids],
-			"label_ids": label_ids if isinstance(label_ids, list) else [label_ids]
-		}
-		return fortidlp_connection.insert(url, params=param)
+		agent_ids = agent_ids if isinstance(agent_ids, list) else [agent_ids]
+		label_ids = label_ids if isinstance(label_ids, list) else [label_ids]
+		return self._chunked(lambda chunk: self.connection.insert(url, params={"agent_ids": chunk, "label_ids": label_ids}), agent_ids, chunk_size, workers)
 
-class AgentConfigs:
+class AgentConfigs(Resource):
 
 	def get_agent_configs(self) -> dict:
 		'''
@@ -663,7 +886,7 @@ class AgentConfigs:
 			dict: The response from the API.
 		'''
 		url = '/api/v1/agent-configs'
-		return fortidlp_connection.get(url)
+		return self.connection.get(url)
 	
 
 	def delete_agent_config(self, config_id: str) -> dict:
@@ -680,10 +903,10 @@ class AgentConfigs:
 		'''
 
 		url = f'/api/v1/agent-configs/{config_id}'
-		return fortidlp_connection.delete(url)
+		return self.connection.delete(url)
 
 
-class AgentEnrollment:
+class AgentEnrollment(Resource):
 
 	def get_tokens(self) -> dict:
 		'''
@@ -693,7 +916,7 @@ class AgentEnrollment:
 			dict: The response from the API.
 		'''
 		url = "/api/v1/enrollment/tokens"
-		return fortidlp_connection.get(url)
+		return self.connection.get(url)
 
 	def revoke_token(self, token_id: str) -> dict:
 		'''
@@ -709,9 +932,9 @@ class AgentEnrollment:
 		'''
 
 		url = f'/api/v1/enrollment/tokens/{token_id}/revoke'
-		return fortidlp_connection.send(url)
+		return self.connection.send(url)
 
-class Labels:
+class Labels(Resource):
 	'''Class Labels
 	Description:  Return a list of labels.
 	'''
@@ -746,7 +969,7 @@ class Labels:
 		if flagged is not None:
 			data["flagged"] = str(flagged)
 
-		return fortidlp_connection.send(url, params=data)
+		return self.connection.send(url, params=data)
 
 	def delete(self, id: str, force: Optional[bool] = False) -> dict:
 		'''
@@ -763,7 +986,7 @@ class Labels:
 		'''
 
 		url = f'/api/v1/labels/{id}'
-		return fortidlp_connection.delete(url)
+		return self.connection.delete(url)
 
 	def get_labels(self, filter: list = [], results_per_page: int = 100, sort_order: str = "asc", cursor: Optional[str] = None) -> dict:
 		'''	
@@ -791,7 +1014,24 @@ class Labels:
 		if cursor:
 			url = f"{url}&cursor={cursor}"
 
-		return fortidlp_connection.send(url, params=parameters)
+		return self.connection.send(url, params=parameters)
+
+	def iter_labels(self, filter: list = [], results_per_page: int = 100, sort_order: str = "asc", cursor: Optional[str] = None, max_items: Optional[int] = None, typed: bool = False) -> Paginator:
+		'''
+		Class Labels
+		Description:  Iterate over every label matching the search, following the page cursor.
+
+		Args:
+			filter (list): List of filters to apply to the labels.
+			cursor (str, optional): Cursor to resume the iteration from.
+			max_items (int, optional): Stop after this many labels.
+			typed (bool, optional): Yield compact Label models (see fortidlp.models) instead of dicts.
+
+		Returns:
+			Paginator: Iterator yielding one label at a time.
+		'''
+
+		return Paginator(lambda page_cursor: self.get_labels(filter, results_per_page, sort_order, page_cursor), cursor=cursor, max_items=max_items, model=Label if typed else None)
 
 debug = False
 ssl_verification = True
@@ -805,32 +1045,97 @@ def enable_debug():
 	global debug
 	debug = True
 
-def auth( host: str, access_token: str):
-	global debug
-	global fortidlp_connection
+def _connect(host, access_token: str, validate: str = 'eager', token_cache: Optional[TokenCache] = None, verify: bool = True, debug: bool = False, hedge_after: Optional[float] = None, **options) -> tuple:
+	'''
+	Description:  Build an authenticated APIHandler. Shared by auth() and Client. `host` may be a list of
+	hosts or a HostPool (see fortidlp.failover), the token being accepted when one of them accepts it.
+
+	Returns:
+		tuple: The connection, or None when the authentication failed, and the auth() style result.
+	'''
 	login = AuthenticationHandler()
 
+	if validate not in ('eager', 'lazy'):
+		raise ValueError("validate must be 'eager' or 'lazy'")
+
 	# ManagementHost = re.search(r'(https?://)?(([a-zA-Z0-9]+)(\.[a-zA-Z0-9.-]+))', host)
 	# host = ManagementHost.group(2)
 
-	headers, host_result = login.get_headers(
-		fdlp_host=host,
-		access_token=access_token,
-	)
-
-	if headers is None or not isinstance(host_result, str):
-		status = False
-		data = host_result
+	# The authentication probe goes through the new connection's session, so the
+	# connection it opens is reused by the first API calls.
+	connection = APIHandler(**options)
+	headers = login.headers(access_token)
+
+	hosts = None
+	if host is not None and not isinstance(host, str):
+		# Only loaded with several hosts: it needs requests at import.
+		from fortidlp.failover import HostPool
+		hosts = host = host if isinstance(host, HostPool) else HostPool(host, hedge_after=hedge_after)
+	# The token cache and on_unauthorized know a pool by its list of hosts.
+	name = str(host)
+
+	def check():
+		if hosts is not None:
+			status, data = hosts.probe(connection.session, headers, verify)
+		else:
+			try:
+				status, data, res_headers = login.test_authentication(headers, host, session=connection.session)
+			except SystemExit as err:
+				# test_authentication exits on connection errors; an unreachable host is a failed call here.
+				return False, {'status_code': 500, 'error_message': f'Failed to connect to {host}. Error: {err.__cause__ or err}'}
+		if status and token_cache is not None:
+			token_cache.record(name, access_token)
+		return status, data
+
+	if token_cache is not None and token_cache.valid(name, access_token):
+		status, data = True, 'AUTHENTICATION_CACHED'
+	elif validate == 'lazy':
+		connection.defer_authentication(check)
+		status, data = True, 'AUTHENTICATION_DEFERRED'
 	else:
-		status = True
-		data = 'AUTHENTICATION_SUCCEEDED'
+		status, data = check()
+		data = 'AUTHENTICATION_SUCCEEDED' if status else data
+
+	if not status:
+		connection.close()
+		if hosts is not None:
+			hosts.close()
+		return None, {'status': status, 'data': data}
 
-		fortidlp_connection = APIHandler()
-		authentication = fortidlp_connection.conn(headers, host_result, debug, ssl_verification)
+	if token_cache is not None:
+		connection.on_unauthorized = lambda: token_cache.forget(name, access_token)
+	connection.conn(headers, host, debug, verify)
+	return connection, {'status': status, 'data': data}
+
+def auth( host, access_token: str, pool_connections: int = 10, pool_maxsize: int = 10, keepalive_timeout: Optional[float] = None, max_concurrency: Optional[int] = None, rate_limit: Optional[RateLimiter] = None, retry: Optional[RetryPolicy] = None, cache: Optional[ResponseCache] = None, validate: str = 'eager', token_cache: Optional[TokenCache] = None, metrics: Optional[Metrics] = None, codec: Optional[object] = None, compress_threshold: Optional[int] = None, coalesce: bool = True, hedge_after: Optional[float] = None):
+	'''
+	Description:  Authenticate the global connection.
+
+	Args:
+		host (str | list | HostPool): Management host, or several to fail over between (see fortidlp.failover).
+		validate (str, optional): 'eager' probes the token now; 'lazy' defers the probe to the first API call.
+		token_cache (TokenCache, optional): Skips the probe while the token is recorded as valid for this host.
+		metrics (Metrics, optional): Collects per-endpoint latency, size and error metrics of the calls.
+		codec (optional): JSON codec of the bodies (see fortidlp.codec); orjson when installed by default.
+		compress_threshold (int, optional): Send request bodies of at least this many bytes gzip-compressed.
+		coalesce (bool, optional): Identical GETs and searches in flight at the same time share one request.
+		hedge_after (float, optional): With several hosts, send reads still unanswered after this many seconds to a second host too.
+
+	Returns:
+		dict: Status of the authentication, with 'AUTHENTICATION_SUCCEEDED', 'AUTHENTICATION_DEFERRED'
+		or 'AUTHENTICATION_CACHED' in 'data' on success.
+	'''
+	global fortidlp_connection
+
+	connection, result = _connect(
+		host, access_token, validate=validate, token_cache=token_cache, verify=ssl_verification, debug=debug,
+		pool_connections=pool_connections, pool_maxsize=pool_maxsize, keepalive_timeout=keepalive_timeout,
+		max_concurrency=max_concurrency, rate_limit=rate_limit, retry=retry, cache=cache, metrics=metrics,
+		codec=codec, compress_threshold=compress_threshold, coalesce=coalesce, hedge_after=hedge_after,
+	)
 
-		cur_dir = os.path.dirname(__file__)
+	if connection is not None:
+		fortidlp_connection.close()
+		fortidlp_connection = connection
 
-	return {
-		'status': status,
-		'data': data
-	}
+	return result
@@ -0,0 +1,203 @@
+'''
+Local SQLite inventory of agents and labels.
+
+    inventory = AgentInventory('agents.db')
+    inventory.sync()                      # first run: full pull, then deltas
+    inventory.by_hostname('LAPTOP-042')
+    inventory.by_label('Finance')
+
+The snapshot persists between runs, so a script can answer lookups from the
+last sync without paging through every agent again. Lookups hit indexes on
+ID, hostname, user and label.
+
+Delta syncs need a way to ask the API for the agents changed since a given
+time: pass `changed_filter`, a function turning the ISO time of the last
+sync into the `filter` list of Agents.get_agents. Without it every sync is a
+full refresh, which also drops the agents that no longer exist.
+'''
+import json
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from typing import Callable, List, Optional
+
+from fortidlp.fortidlp import Agents, Labels
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS agents (
+    id TEXT PRIMARY KEY,
+    hostname TEXT COLLATE NOCASE,
+    user TEXT COLLATE NOCASE,
+    generation INTEGER,
+    data TEXT
+);
+CREATE INDEX IF NOT EXISTS agents_hostname ON agents (hostname);
+CREATE INDEX IF NOT EXISTS agents_user ON agents (user);
+CREATE TABLE IF NOT EXISTS labels (
+    id TEXT PRIMARY KEY,
+    name TEXT COLLATE NOCASE,
+    data TEXT
+);
+CREATE INDEX IF NOT EXISTS labels_name ON labels (name);
+CREATE TABLE IF NOT EXISTS agent_labels (
+    agent_id TEXT,
+    label_id TEXT,
+    PRIMARY KEY (agent_id, label_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS agent_labels_label ON agent_labels (label_id);
+CREATE TABLE IF NOT EXISTS sync_state (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+'''
+
+
+def _first(record: dict, fields):
+    for field in fields:
+        value = record.get(field)
+        if value:
+            return value
+    return None
+
+
+class AgentInventory:
+
+    id_fields = ('id', 'agent_id', 'uuid')
+    hostname_fields = ('hostname', 'host_name', 'computer_name', 'name')
+    user_fields = ('user', 'username', 'last_user', 'logged_in_user')
+
+    def __init__(self, path: str, agents: Optional[Agents] = None, labels: Optional[Labels] = None, changed_filter: Optional[Callable[[str], list]] = None, results_per_page: int = 1000):
+        self.path = path
+        self.agents = agents or Agents()
+        self.labels = labels or Labels()
+        self.changed_filter = changed_filter
+        self.results_per_page = results_per_page
+        self._lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _state(self, key: str) -> Optional[str]:
+        row = self.db.execute('SELECT value FROM sync_state WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_state(self, key: str, value):
+        self.db.execute('INSERT OR REPLACE INTO sync_state (key, value) VALUES (?, ?)', (key, str(value)))
+
+    @property
+    def last_sync(self) -> Optional[str]:
+        return self._state('last_sync')
+
+    def _user(self, agent: dict) -> Optional[str]:
+        user = _first(agent, self.user_fields)
+        if user is None and isinstance(agent.get('users'), list) and agent['users']:
+            user = agent['users'][0]
+        if isinstance(user, dict):
+            user = _first(user, ('name', 'username', 'email'))
+        return user
+
+    @staticmethod
+    def _label_ids(agent: dict) -> List[str]:
+        ids = []
+        for label in agent.get('labels') or []:
+            label_id = label.get('id') if isinstance(label, dict) else label
+            if label_id:
+                ids.append(str(label_id))
+        return ids
+
+    def _store_agents(self, page: list, generation: int):
+        rows = []
+        links = []
+        for agent in page:
+            agent_id = _first(agent, self.id_fields)
+            if agent_id is None:
+                continue
+            agent_id = str(agent_id)
+            rows.append((agent_id, _first(agent, self.hostname_fields), self._user(agent), generation, json.dumps(agent)))
+            links.extend((agent_id, label_id) for label_id in self._label_ids(agent))
+        ids = [(row[0],) for row in rows]
+        self.db.executemany('INSERT OR REPLACE INTO agents (id, hostname, user, generation, data) VALUES (?, ?, ?, ?, ?)', rows)
+        self.db.executemany('DELETE FROM agent_labels WHERE agent_id = ?', ids)
+        self.db.executemany('INSERT OR IGNORE INTO agent_labels (agent_id, label_id) VALUES (?, ?)', links)
+
+    def _sync_labels(self):
+        rows = []
+        for label in self.labels.iter_labels(results_per_page=self.results_per_page):
+            label_id = label.get('id')
+            if label_id:
+                rows.append((str(label_id), label.get('name'), json.dumps(label)))
+        self.db.execute('DELETE FROM labels')
+        self.db.executemany('INSERT INTO labels (id, name, data) VALUES (?, ?, ?)', rows)
+
+    def sync(self, full: bool = False) -> dict:
+        '''
+        Refresh the snapshot. Fetches only the agents changed since the last
+        sync when possible (see changed_filter), everything otherwise.
+        Returns the number of agents written and whether it was a full sync.
+        '''
+        with self._lock:
+            started = datetime.now(timezone.utc).isoformat()
+            since = self.last_sync
+            full = full or since is None or self.changed_filter is None
+            generation = int(self._state('generation') or 0) + 1
+            filter = [] if full else self.changed_filter(since)
+
+            written = 0
+            with self.db:
+                pages = self.agents.iter_agents(filter=filter, results_per_page=self.results_per_page)
+                for page in pages.iter_pages():
+                    self._store_agents(page, generation)
+                    written += len(page)
+                if full:
+                    # Agents not seen during a full sync no longer exist.
+                    removed = [row[0] for row in self.db.execute('SELECT id FROM agents WHERE generation != ?', (generation,))]
+                    self.db.executemany('DELETE FROM agents WHERE id = ?', [(agent_id,) for agent_id in removed])
+                    self.db.executemany('DELETE FROM agent_labels WHERE agent_id = ?', [(agent_id,) for agent_id in removed])
+                self._sync_labels()
+                self._set_state('generation', generation)
+                self._set_state('last_sync', started)
+
+            return {'agents': written, 'full': full}
+
+    def _agents(self, query: str, args=()) -> List[dict]:
+        with self._lock:
+            return [json.loads(row[0]) for row in self.db.execute(query, args)]
+
+    def get(self, agent_id: str) -> Optional[dict]:
+        agents = self._agents('SELECT data FROM agents WHERE id = ?', (agent_id,))
+        return agents[0] if agents else None
+
+    def by_hostname(self, hostname: str) -> List[dict]:
+        return self._agents('SELECT data FROM agents WHERE hostname = ?', (hostname,))
+
+    def by_user(self, user: str) -> List[dict]:
+        return self._agents('SELECT data FROM agents WHERE user = ?', (user,))
+
+    def by_label(self, label: str) -> List[dict]:
+        '''Agents carrying the label with this ID or name.'''
+        return self._agents(
+            'SELECT agents.data FROM agent_labels JOIN agents ON agents.id = agent_labels.agent_id '
+            'WHERE agent_labels.label_id IN (SELECT id FROM labels WHERE id = ? OR name = ? UNION SELECT ?)',
+            (label, label, label),
+        )
+
+    def labels_of(self, agent_id: str) -> List[dict]:
+        with self._lock:
+            return [json.loads(row[0]) for row in self.db.execute(
+                'SELECT labels.data FROM agent_labels JOIN labels ON labels.id = agent_labels.label_id WHERE agent_labels.agent_id = ?',
+                (agent_id,),
+            )]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self.db.execute('SELECT COUNT(*) FROM agents').fetchone()[0]
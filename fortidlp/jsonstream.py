@@ -0,0 +1,201 @@
+'''
+Incremental parsing of large search responses.
+
+A search page looks like {"<items key>": [ {...}, {...}, ... ], "next_cursor": ...}.
+JSONItemParser is fed the body chunk by chunk as it arrives and hands back
+each record of the items array as soon as it has been decoded, so a page is
+never held in memory as a whole, neither as text nor as Python objects. The
+other top-level members (cursor, totals, ...) are collected in `meta`.
+'''
+import json
+import codecs
+from typing import AsyncIterator, Iterable, Iterator, Optional
+
+from fortidlp.pagination import ITEM_KEYS, next_cursor
+
+_WHITESPACE = ' \t\n\r'
+_decoder = json.JSONDecoder()
+_scanstring = json.decoder.scanstring
+
+
+class JSONItemParser:
+    '''
+    Push parser for one search page. `items_key` names the array to stream;
+    by default the first top-level array whose key is one of ITEM_KEYS. A
+    body that is a bare array is streamed as the items.
+    '''
+
+    def __init__(self, items_key: Optional[str] = None):
+        self.items_key = items_key
+        self.meta = {}
+        self._text = codecs.getincrementaldecoder('utf-8')()
+        self._buffer = ''
+        self._pos = 0
+        self._state = 'start'
+        self._key = None
+        self._streaming = None
+
+    @property
+    def done(self) -> bool:
+        return self._state == 'done'
+
+    def feed(self, data: bytes) -> list:
+        '''Add a chunk of the body and return the records completed by it.'''
+        self._buffer = self._buffer[self._pos:] + self._text.decode(data)
+        self._pos = 0
+        return self._parse(final=False)
+
+    def close(self) -> list:
+        '''Signal the end of the body, returning any last record.'''
+        self._buffer = self._buffer[self._pos:] + self._text.decode(b'', final=True)
+        self._pos = 0
+        items = self._parse(final=True)
+        if self._state != 'done':
+            raise ValueError('Truncated JSON response')
+        return items
+
+    def _skip(self) -> Optional[str]:
+        buffer, pos = self._buffer, self._pos
+        while pos < len(buffer) and buffer[pos] in _WHITESPACE:
+            pos += 1
+        self._pos = pos
+        return buffer[pos] if pos < len(buffer) else None
+
+    def _value(self, final: bool):
+        '''Decode the value at the current position, or raise EOFError if incomplete.'''
+        try:
+            value, end = _decoder.raw_decode(self._buffer, self._pos)
+        except json.JSONDecodeError:
+            if final:
+                raise
+            raise EOFError
+        # A number at the very end of the buffer may still have digits to come.
+        if end >= len(self._buffer) and not final:
+            raise EOFError
+        self._pos = end
+        return value
+
+    def _parse(self, final: bool) -> list:
+        items = []
+        try:
+            while self._state != 'done':
+                char = self._skip()
+                if char is None:
+                    break
+
+                if self._state == 'start':
+                    if char == '[':
+                        self._pos += 1
+                        self._streaming = self.items_key
+                        self._state = 'top_array'
+                    elif char == '{':
+                        self._pos += 1
+                        self._state = 'key'
+                    else:
+                        raise ValueError(f'Unexpected JSON response starting with {char!r}')
+
+                elif self._state == 'key':
+                    if char == ',':
+                        self._pos += 1
+                    elif char == '}':
+                        self._pos += 1
+                        self._state = 'done'
+                    elif char == '"':
+                        try:
+                            self._key, end = _scanstring(self._buffer, self._pos + 1)
+                        except json.JSONDecodeError:
+                            if final:
+                                raise
+                            break
+                        self._pos = end
+                        self._state = 'colon'
+                    else:
+                        raise ValueError(f'Unexpected {char!r} in JSON response')
+
+                elif self._state == 'colon':
+                    if char != ':':
+                        raise ValueError(f'Unexpected {char!r} in JSON response')
+                    self._pos += 1
+                    self._state = 'value'
+
+                elif self._state == 'value':
+                    if char == '[' and self._streaming is None and (self._key == self.items_key or (self.items_key is None and self._key in ITEM_KEYS)):
+                        self._pos += 1
+                        self._streaming = self._key
+                        self._state = 'array'
+                    else:
+                        self.meta[self._key] = self._value(final)
+                        self._state = 'key'
+
+                elif self._state in ('array', 'top_array'):
+                    if char == ',':
+                        self._pos += 1
+                    elif char == ']':
+                        self._pos += 1
+                        self._state = 'key' if self._state == 'array' else 'done'
+                    else:
+                        items.append(self._value(final))
+        except EOFError:
+            pass
+        return items
+
+
+class StreamedPage:
+    '''
+    One search page parsed while it is read. Iterate over it to get the
+    records; `meta` and `cursor` are complete once the iteration is over.
+    '''
+
+    def __init__(self, chunks: Iterable[bytes], items_key: Optional[str] = None, on_close=None):
+        self.parser = JSONItemParser(items_key)
+        self._chunks = chunks
+        self._on_close = on_close
+        self.count = 0
+
+    @property
+    def meta(self) -> dict:
+        return self.parser.meta
+
+    @property
+    def cursor(self) -> Optional[str]:
+        return next_cursor(self.parser.meta)
+
+    @property
+    def done(self) -> bool:
+        return self.parser.done
+
+    def __iter__(self) -> Iterator[dict]:
+        try:
+            for chunk in self._chunks:
+                for item in self.parser.feed(chunk):
+                    self.count += 1
+                    yield item
+            for item in self.parser.close():
+                self.count += 1
+                yield item
+        finally:
+            self.close()
+
+    def close(self):
+        if self._on_close is not None:
+            self._on_close()
+            self._on_close = None
+
+
+class AsyncStreamedPage(StreamedPage):
+    '''StreamedPage over an async iterator of chunks, for the asyncio client.'''
+
+    def __iter__(self):
+        raise TypeError("AsyncStreamedPage must be used with 'async for'")
+
+    async def __aiter__(self) -> AsyncIterator[dict]:
+        try:
+            async for chunk in self._chunks:
+                for item in self.parser.feed(chunk):
+                    self.count += 1
+                    yield item
+            for item in self.parser.close():
+                self.count += 1
+                yield item
+        finally:
+            self.close()
@@ -0,0 +1,52 @@
+'''
+Deferred imports of the heavy dependencies.
+
+Importing requests (and urllib3, certifi, charset detection, ...) takes
+longer than the rest of the package. Modules refer to it through a
+LazyModule instead, which imports it the first time one of its attributes is
+used, so `import fortidlp` stays cheap for short-lived scripts and the
+import cost is only paid once a request is actually sent.
+'''
+import importlib
+import threading
+from typing import Callable, Optional
+
+
+class LazyModule:
+    '''Stand-in for a module that is imported on first attribute access.'''
+
+    def __init__(self, name: str, on_import: Optional[Callable] = None):
+        self._name = name
+        self._on_import = on_import
+        self._module = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    module = importlib.import_module(self._name)
+                    if self._on_import is not None:
+                        self._on_import(module)
+                    self._module = module
+        return self._module
+
+    @property
+    def loaded(self) -> bool:
+        return self._module is not None
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __repr__(self):
+        state = 'loaded' if self.loaded else 'not loaded'
+        return f'<lazy module {self._name!r} ({state})>'
+
+
+def _disable_warnings(module):
+    # The API is commonly reached with certificate verification disabled, so
+    # the urllib3 warnings are silenced, but only once requests is in use.
+    module.packages.urllib3.disable_warnings()
+
+
+requests = LazyModule('requests', on_import=_disable_warnings)
@@ -0,0 +1,192 @@
+'''
+Opt-in request metrics, per endpoint template.
+
+    metrics = Metrics()
+    fortidlp.auth(host, token, metrics=metrics)
+    ...
+    metrics.snapshot()['GET /api/v1/cases/{id}']['latency']
+    print(metrics.prometheus())
+
+APIHandler records every call it sends: request count, latency histogram,
+request and response bytes, status codes, client side errors, retries and
+time spent throttled. Calls are grouped by method and endpoint template:
+path segments that look like IDs (numbers, UUIDs, long hex or mixed tokens)
+are replaced by {id}, so /api/v1/cases/4711 and /api/v1/cases/4712 count
+as one endpoint. Without a Metrics object the connection only pays for an
+`is not None` check per call.
+'''
+import re
+import bisect
+import functools
+import threading
+from typing import Optional, Sequence
+
+# Upper bounds (seconds) of the latency histogram buckets.
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_ID_SEGMENT = re.compile(
+    r'^(\d+'
+    r'|[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}'
+    r'|[0-9a-fA-F]{16,}'
+    r'|(?=[A-Za-z_-]*\d)[A-Za-z0-9_-]{20,})$'
+)
+
+
+@functools.lru_cache(maxsize=4096)
+def endpoint_template(path: str) -> str:
+    '''/api/v1/cases/4711/comments -> /api/v1/cases/{id}/comments'''
+    path = path.split('?', 1)[0]
+    return '/'.join('{id}' if _ID_SEGMENT.match(segment) else segment for segment in path.split('/'))
+
+
+class _Endpoint:
+    __slots__ = ('requests', 'statuses', 'errors', 'latency_buckets', 'latency_sum', 'latency_max',
+                 'bytes_sent', 'bytes_received', 'retries', 'throttled', 'throttled_time')
+
+    def __init__(self, buckets: int):
+        self.requests = 0
+        self.statuses = {}
+        self.errors = {}
+        self.latency_buckets = [0] * (buckets + 1)
+        self.latency_sum = 0.0
+        self.latency_max = 0.0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.retries = 0
+        self.throttled = 0
+        self.throttled_time = 0.0
+
+
+def _label(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+class Metrics:
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self._endpoints = {}
+
+    def _endpoint(self, method: str, path: str) -> _Endpoint:
+        key = (method, endpoint_template(path))
+        endpoint = self._endpoints.get(key)
+        if endpoint is None:
+            endpoint = self._endpoints[key] = _Endpoint(len(self.buckets))
+        return endpoint
+
+    def observe(self, method: str, path: str, latency: float, status: Optional[int] = None, error: Optional[str] = None, sent: int = 0, received: int = 0):
+        '''Record one call: its HTTP status, or the name of the error when no response came back.'''
+        with self._lock:
+            endpoint = self._endpoint(method, path)
+            endpoint.requests += 1
+            if status is not None:
+                endpoint.statuses[status] = endpoint.statuses.get(status, 0) + 1
+            if error is not None:
+                endpoint.errors[error] = endpoint.errors.get(error, 0) + 1
+            endpoint.latency_buckets[bisect.bisect_left(self.buckets, latency)] += 1
+            endpoint.latency_sum += latency
+            endpoint.latency_max = max(endpoint.latency_max, latency)
+            endpoint.bytes_sent += sent
+            endpoint.bytes_received += received
+
+    def retried(self, method: str, path: str):
+        with self._lock:
+            self._endpoint(method, path).retries += 1
+
+    def throttled(self, method: str, path: str, waited: float):
+        with self._lock:
+            endpoint = self._endpoint(method, path)
+            endpoint.throttled += 1
+            endpoint.throttled_time += waited
+
+    def reset(self):
+        with self._lock:
+            self._endpoints = {}
+
+    def _quantile(self, endpoint: _Endpoint, q: float) -> Optional[float]:
+        '''Upper bound of the bucket holding the q-quantile (None past the last bucket).'''
+        total = sum(endpoint.latency_buckets)
+        if not total:
+            return None
+        rank = q * total
+        seen = 0
+        for bound, count in zip(self.buckets + (None,), endpoint.latency_buckets):
+            seen += count
+            if seen >= rank:
+                return bound if bound is not None else endpoint.latency_max
+        return endpoint.latency_max
+
+    def snapshot(self) -> dict:
+        '''Current counters, keyed by "METHOD /endpoint/{id}".'''
+        with self._lock:
+            result = {}
+            for (method, template), endpoint in sorted(self._endpoints.items()):
+                count = sum(endpoint.latency_buckets)
+                result[f'{method} {template}'] = {
+                    'requests': endpoint.requests,
+                    'statuses': dict(endpoint.statuses),
+                    'errors': dict(endpoint.errors),
+                    'latency': {
+                        'count': count,
+                        'sum': endpoint.latency_sum,
+                        'mean': endpoint.latency_sum / count if count else None,
+                        'max': endpoint.latency_max,
+                        'p50': self._quantile(endpoint, 0.5),
+                        'p99': self._quantile(endpoint, 0.99),
+                        'buckets': dict(zip(self.buckets + (float('inf'),), endpoint.latency_buckets)),
+                    },
+                    'bytes_sent': endpoint.bytes_sent,
+                    'bytes_received': endpoint.bytes_received,
+                    'retries': endpoint.retries,
+                    'throttled': endpoint.throttled,
+                    'throttled_time': endpoint.throttled_time,
+                }
+            return result
+
+    def prometheus(self, prefix: str = 'fortidlp') -> str:
+        '''The metrics in the Prometheus text exposition format.'''
+        with self._lock:
+            endpoints = sorted(self._endpoints.items())
+            lines = []
+
+            def family(name, kind, help_text):
+                lines.append(f'# HELP {prefix}_{name} {help_text}')
+                lines.append(f'# TYPE {prefix}_{name} {kind}')
+
+            def labels(method, template, **extra):
+                pairs = {'method': method, 'endpoint': template, **extra}
+                return '{' + ','.join(f'{key}="{_label(value)}"' for key, value in pairs.items()) + '}'
+
+            family('requests_total', 'counter', 'Responses received, by HTTP status.')
+            for (method, template), endpoint in endpoints:
+                for status, count in sorted(endpoint.statuses.items()):
+                    lines.append(f'{prefix}_requests_total{labels(method, template, status=status)} {count}')
+
+            family('request_errors_total', 'counter', 'Calls that got no response, by error.')
+            for (method, template), endpoint in endpoints:
+                for error, count in sorted(endpoint.errors.items()):
+                    lines.append(f'{prefix}_request_errors_total{labels(method, template, error=error)} {count}')
+
+            family('request_duration_seconds', 'histogram', 'Latency of the calls, retries included.')
+            for (method, template), endpoint in endpoints:
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float('inf'),), endpoint.latency_buckets):
+                    cumulative += count
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append(f'{prefix}_request_duration_seconds_bucket{labels(method, template, le=le)} {cumulative}')
+                lines.append(f'{prefix}_request_duration_seconds_sum{labels(method, template)} {endpoint.latency_sum}')
+                lines.append(f'{prefix}_request_duration_seconds_count{labels(method, template)} {cumulative}')
+
+            for name, attribute, kind, help_text in (
+                ('request_bytes_total', 'bytes_sent', 'counter', 'Request body bytes sent.'),
+                ('response_bytes_total', 'bytes_received', 'counter', 'Response body bytes received.'),
+                ('retries_total', 'retries', 'counter', 'Calls retried after a throttled or failed attempt.'),
+                ('throttled_total', 'throttled', 'counter', 'Calls delayed by the client side rate limiter.'),
+                ('throttled_seconds_total', 'throttled_time', 'counter', 'Time spent waiting for the rate limiter.'),
+            ):
+                family(name, kind, help_text)
+                for (method, template), endpoint in endpoints:
+                    lines.append(f'{prefix}_{name}{labels(method, template)} {getattr(endpoint, attribute)}')
+
+            return '\n'.join(lines) + '\n'
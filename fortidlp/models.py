@@ -0,0 +1,143 @@
+'''
+Compact typed records for large result sets.
+
+    for agent in Agents().iter_agents(typed=True):
+        agent.hostname          # plain attribute
+        agent.labels            # decoded on access
+        agent.raw               # the original dict
+
+A record keeps its scalar fields in one tuple and everything else (users,
+labels, cluster data and any key the model does not know) as a single
+compact JSON blob, decoded only when one of those fields is read. Holding
+100k records this way takes a fraction of the memory of the plain dicts;
+see benchmarks/bench_models.py. Nested values are decoded again on every
+access, so keep a reference when reading one repeatedly.
+'''
+import sys
+import json
+from typing import Any, Iterable, List
+
+_MISSING = object()
+_encoder = json.JSONEncoder(separators=(',', ':'), ensure_ascii=False)
+
+
+def _scalar(index: int, name: str) -> property:
+    def get(self):
+        value = self._values[index]
+        return None if value is _MISSING else value
+    return property(get, doc=f'The {name!r} field.')
+
+
+def _nested(name: str) -> property:
+    def get(self):
+        return self._decode().get(name)
+    return property(get, doc=f'The {name!r} field, decoded on access.')
+
+
+class Record:
+    '''
+    Base of the models. Subclasses list their scalar `fields`, the `nested`
+    fields exposed as decoded-on-access attributes and the `categories`:
+    scalar fields with few distinct values (status, OS, ...), whose strings
+    are interned so that all records share one copy.
+    '''
+
+    __slots__ = ('_values', '_blob')
+    fields = ()
+    nested = ()
+    categories = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        for index, name in enumerate(cls.fields):
+            setattr(cls, name, _scalar(index, name))
+        for name in cls.nested:
+            setattr(cls, name, _nested(name))
+
+    def __init__(self, data: dict):
+        values = tuple(data.get(name, _MISSING) for name in self.fields)
+        if self.categories:
+            values = tuple(
+                sys.intern(value) if name in self.categories and type(value) is str else value
+                for name, value in zip(self.fields, values)
+            )
+        self._values = values
+        rest = {key: value for key, value in data.items() if key not in self.fields}
+        self._blob = _encoder.encode(rest).encode() if rest else None
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'Record':
+        return cls(data)
+
+    @classmethod
+    def from_list(cls, items: Iterable[dict]) -> List['Record']:
+        return [cls(item) for item in items]
+
+    def _decode(self) -> dict:
+        return json.loads(self._blob) if self._blob is not None else {}
+
+    @property
+    def raw(self) -> dict:
+        '''The record as the API returned it.'''
+        data = {name: value for name, value in zip(self.fields, self._values) if value is not _MISSING}
+        data.update(self._decode())
+        return data
+
+    def get(self, key: str, default: Any = None) -> Any:
+        if key in self.fields:
+            value = self._values[self.fields.index(key)]
+            return default if value is _MISSING else value
+        return self._decode().get(key, default)
+
+    def __getitem__(self, key: str) -> Any:
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, Record):
+            return type(self) is type(other) and self._values == other._values and self._blob == other._blob
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return f'{type(self).__name__}(id={self.get("id")!r})'
+
+    def __reduce__(self):
+        return type(self), (self.raw,)
+
+
+class Agent(Record):
+    __slots__ = ()
+    fields = ('id', 'hostname', 'status', 'os', 'os_version', 'agent_version', 'ip_address', 'last_seen', 'created_at')
+    nested = ('users', 'labels')
+    categories = ('status', 'os', 'os_version', 'agent_version')
+
+
+class Incident(Record):
+    __slots__ = ()
+    fields = ('id', 'timestamp', 'severity', 'status', 'title', 'policy_id', 'agent_id', 'hostname')
+    nested = ('agents', 'users', 'labels', 'cluster_data')
+    categories = ('severity', 'status', 'policy_id')
+
+
+class Label(Record):
+    __slots__ = ()
+    fields = ('id', 'name', 'description', 'color', 'created_at')
+
+
+class Case(Record):
+    __slots__ = ()
+    fields = ('id', 'title', 'status', 'severity', 'assignee', 'created_at', 'updated_at')
+    nested = ('incidents', 'comments', 'labels')
+    categories = ('status', 'severity', 'assignee')
+
+
+class AuditLog(Record):
+    __slots__ = ()
+    fields = ('id', 'timestamp', 'operation_type', 'user', 'ip_address')
+    nested = ('details',)
+    categories = ('operation_type',)
+
@@ -0,0 +1,198 @@
+'''
+Cursor based pagination helpers shared by the search endpoints.
+
+The search endpoints answer with one page of records together with the cursor
+of the next page. Paginator follows that cursor and yields the records one at a
+time, so only one page is held in memory at any moment.
+'''
+from typing import AsyncIterator, Awaitable, Callable, Iterator, Optional
+
+# Keys under which the search endpoints return the page records and the
+# cursor of the following page.
+ITEM_KEYS = ('results', 'items', 'data', 'agents', 'labels', 'incidents', 'entries', 'logs')
+CURSOR_KEYS = ('next_cursor', 'cursor', 'next_page_cursor', 'next')
+CURSOR_CONTAINERS = ('pagination', 'page_info', 'meta', 'metadata')
+
+
+class PaginationError(Exception):
+    '''
+    Raised when a page request fails. `response` holds the failed
+    {'status': False, 'data': ...} result and `cursor` the cursor of the page
+    that failed, so the iteration can be resumed from it.
+    '''
+
+    def __init__(self, response: dict, cursor: Optional[str] = None):
+        super().__init__(response.get('data'))
+        self.response = response
+        self.cursor = cursor
+
+
+def page_items(data) -> list:
+    if isinstance(data, list):
+        return data
+    if isinstance(data, dict):
+        for key in ITEM_KEYS:
+            if isinstance(data.get(key), list):
+                return data[key]
+    return []
+
+
+def next_cursor(data) -> Optional[str]:
+    if not isinstance(data, dict):
+        return None
+    containers = [data] + [data[key] for key in CURSOR_CONTAINERS if isinstance(data.get(key), dict)]
+    for container in containers:
+        for key in CURSOR_KEYS:
+            value = container.get(key)
+            if value and isinstance(value, str):
+                return value
+    return None
+
+
+class Paginator:
+    '''
+    Iterate over every record of a cursor based search.
+
+    `fetch` is called with the cursor of the page to request (None for the
+    first page) and must return the usual {'status': ..., 'data': ...} dict.
+
+    The iterator can be stopped at any point. `cursor` is the cursor of the
+    next page that has not been requested yet and `page_cursor` the cursor of
+    the page currently being yielded; passing `page_cursor` back as `cursor`
+    resumes without losing the rest of the current page. With a `model`
+    (see fortidlp.models) the records are yielded as model instances.
+    '''
+
+    def __init__(self, fetch: Callable[[Optional[str]], dict], cursor: Optional[str] = None, max_items: Optional[int] = None, model: Optional[type] = None):
+        self.fetch = fetch
+        self.model = model
+        self.cursor = cursor
+        self.page_cursor = cursor
+        self.max_items = max_items
+        self.pages = 0
+        self.count = 0
+        self.done = False
+        self._iterator = None
+        self._streamed = None
+
+    def __iter__(self) -> Iterator[dict]:
+        return self
+
+    def __next__(self) -> dict:
+        if self._iterator is None:
+            self._iterator = self._records()
+        return next(self._iterator)
+
+    def _fetch_page(self) -> list:
+        return self._accept(self.fetch(self.cursor))
+
+    def _accept(self, response: dict) -> list:
+        if not response.get('status'):
+            raise PaginationError(response, self.cursor)
+
+        data = response.get('data')
+        if not isinstance(data, (dict, list)) and hasattr(data, 'cursor'):
+            # Streamed page: the cursor is only known once it has been read.
+            self.pages += 1
+            self.page_cursor = self.cursor
+            self._streamed = data
+            return data
+
+        items = page_items(data)
+        cursor = next_cursor(data)
+
+        self.pages += 1
+        self.page_cursor = self.cursor
+        self.done = not items or not cursor or cursor == self.cursor
+        self.cursor = cursor
+        return items
+
+    def _finish_streamed(self):
+        page, self._streamed = self._streamed, None
+        if page is not None:
+            cursor = page.cursor
+            self.done = not page.count or not cursor or cursor == self.cursor
+            self.cursor = cursor
+
+    def _records(self) -> Iterator[dict]:
+        while not self.done:
+            if self.max_items is not None and self.count >= self.max_items:
+                return
+            for item in self._fetch_page():
+                if self.max_items is not None and self.count >= self.max_items:
+                    return
+                self.count += 1
+                yield self.model(item) if self.model is not None else item
+            self._finish_streamed()
+
+    def iter_pages(self) -> Iterator[list]:
+        '''Yield whole pages instead of single records.'''
+        while not self.done:
+            if self.max_items is not None and self.count >= self.max_items:
+                return
+            items = list(self._fetch_page())
+            self._finish_streamed()
+            if self.max_items is not None:
+                items = items[:self.max_items - self.count]
+            if items:
+                self.count += len(items)
+                yield self.model.from_list(items) if self.model is not None else items
+
+
+async def _aiter(items) -> AsyncIterator:
+    if hasattr(items, '__aiter__'):
+        async for item in items:
+            yield item
+    else:
+        for item in items:
+            yield item
+
+
+class AsyncPaginator(Paginator):
+    '''
+    Asynchronous flavour of Paginator, for `fetch` coroutines.
+
+        async for agent in AsyncAgents().iter_agents():
+            ...
+    '''
+
+    def __init__(self, fetch: Callable[[Optional[str]], Awaitable[dict]], cursor: Optional[str] = None, max_items: Optional[int] = None, model: Optional[type] = None):
+        super().__init__(fetch, cursor=cursor, max_items=max_items, model=model)
+
+    def __iter__(self):
+        raise TypeError("AsyncPaginator must be used with 'async for'")
+
+    def __aiter__(self) -> AsyncIterator[dict]:
+        return self
+
+    async def __anext__(self) -> dict:
+        if self._iterator is None:
+            self._iterator = self._records()
+        return await self._iterator.__anext__()
+
+    async def _fetch_page(self) -> list:
+        return self._accept(await self.fetch(self.cursor))
+
+    async def _records(self) -> AsyncIterator[dict]:
+        while not self.done:
+            if self.max_items is not None and self.count >= self.max_items:
+                return
+            async for item in _aiter(await self._fetch_page()):
+                if self.max_items is not None and self.count >= self.max_items:
+                    return
+                self.count += 1
+                yield self.model(item) if self.model is not None else item
+            self._finish_streamed()
+
+    async def iter_pages(self) -> AsyncIterator[list]:
+        '''Yield whole pages instead of single records.'''
+        while not self.done:
+            if self.max_items is not None and self.count >= self.max_items:
+                return
+            items = [item async for item in _aiter(await self._fetch_page())]
+            self._finish_streamed()
+            if self.max_items is not None:
+                items = items[:self.max_items - self.count]
+            if items:
+                self.count += len(items)
+                yield self.model.from_list(items) if self.model is not None else items
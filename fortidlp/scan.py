@@ -0,0 +1,335 @@
+'''
+Time-sharded parallel scans of the audit logs and incidents.
+
+    scan = Audit().scan_audit_logs('2026-01-01T00:00:00Z', '2026-01-31T00:00:00Z', workers=8)
+    for log in scan:
+        ...
+
+A search over a long time range is one sequential walk through its pages.
+TimeShardedScan cuts the range into shards paged through concurrently by
+`workers` threads and yields the records in `sort_order`, as the single
+search would.
+
+Shards are half-open time ranges [start, end), the latest one also taking
+the end of the range. A record is only kept by the shard that owns its
+timestamp, so records the API returns on both sides of a boundary come out
+once. Records without a readable `time_field` belong to no shard: they are
+skipped and logged as a warning, as AuditTail does, instead of coming out
+once per shard; `skipped` counts them each time a shard's page holds one.
+When the first page of a shard shows that it holds more than about
+`pages_per_shard` pages, the rest of the shard is split into smaller shards
+sized from the density of that page, so bursts of activity are spread over
+the workers. Shards are read in order while the following ones are fetched,
+with at most `buffer_pages` pages (8 per worker by default) held ahead of
+the reader.
+
+The requests go through the connection, whose max_concurrency caps them
+together with every other call of the process.
+'''
+import math
+import heapq
+import logging
+import threading
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Iterator, List, Optional
+
+from fortidlp.pagination import PaginationError, next_cursor, page_items
+
+logger = logging.getLogger(__name__)
+
+_DONE = object()
+
+
+def parse_time(value) -> Optional[datetime]:
+    '''ISO time (or datetime) as an aware datetime, naive times being UTC; None when unreadable.'''
+    if isinstance(value, datetime):
+        parsed = value
+    else:
+        try:
+            parsed = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+        except ValueError:
+            return None
+    return parsed if parsed.tzinfo is not None else parsed.replace(tzinfo=timezone.utc)
+
+
+def format_time(value: datetime) -> str:
+    return value.astimezone(timezone.utc).isoformat().replace('+00:00', 'Z')
+
+
+class Shard:
+    __slots__ = ('start', 'end', 'closed', 'buffer')
+
+    def __init__(self, start: datetime, end: datetime, closed: bool = False):
+        self.start = start
+        self.end = end
+        self.closed = closed
+        self.buffer = deque()
+
+    def owns(self, moment: datetime) -> bool:
+        return self.start <= moment and (moment <= self.end if self.closed else moment < self.end)
+
+    def __repr__(self):
+        return f"<Shard {format_time(self.start)} - {format_time(self.end)}{']' if self.closed else ')'}>"
+
+
+class TimeShardedScan:
+    '''
+    Records of `search` between `start_time` and `end_time` (now by default).
+
+    `search(start, end, cursor)` returns one page of the records between the
+    ISO times `start` and `end`, as the usual {'status': ..., 'data': ...}
+    dict. With presorted=False the pages are not ordered by time: each shard
+    is then read whole and sorted before it is yielded, and shards are not
+    split.
+    '''
+
+    def __init__(self, search: Callable[[str, str, Optional[str]], dict], start_time, end_time=None, sort_order: str = 'desc',
+                 shards: Optional[int] = None, workers: int = 4, pages_per_shard: int = 5, max_shards: int = 256,
+                 buffer_pages: Optional[int] = None, presorted: bool = True, time_field: str = 'timestamp',
+                 max_items: Optional[int] = None, model: Optional[type] = None):
+        if sort_order not in ('asc', 'desc'):
+            raise ValueError("sort_order must be 'asc' or 'desc'")
+        start = parse_time(start_time)
+        end = parse_time(end_time) if end_time is not None else datetime.now(timezone.utc)
+        if start is None or end is None or end <= start:
+            raise ValueError("start_time and end_time must be ISO times, start_time first")
+
+        self.search = search
+        self.start = start
+        self.end = end
+        self.sort_order = sort_order
+        self.workers = workers
+        self.pages_per_shard = pages_per_shard
+        self.max_shards = max_shards
+        self.buffer_pages = buffer_pages or workers * 8
+        self.presorted = presorted
+        self.time_field = time_field
+        self.max_items = max_items
+        self.model = model
+        self.pages = 0
+        self.count = 0
+        self.splits = 0
+        self.skipped = 0
+
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._active = 0
+        self._buffered = 0
+        self._reading = None
+        self._stop = threading.Event()
+        self._error = None
+        self._sequence = 0
+        self._pending = []
+        # Shards in the order their records are yielded.
+        self._order = self._slices(start, end, shards or (workers if presorted else workers * 4), closed=True)
+        self._started = False
+
+    @property
+    def shards(self) -> List[Shard]:
+        with self._lock:
+            return list(self._order)
+
+    def _slices(self, start: datetime, end: datetime, count: int, closed: bool) -> List[Shard]:
+        '''`count` shards of equal length over [start, end), in sort order.'''
+        count = max(1, min(count, self.max_shards))
+        step = (end - start) / count
+        bounds = [start + step * number for number in range(count)] + [end]
+        shards = [Shard(bounds[n], bounds[n + 1], closed and n == count - 1) for n in range(count)]
+        return shards if self.sort_order == 'asc' else shards[::-1]
+
+    def _queue(self, shard: Shard):
+        # Earlier shards in sort order are fetched first.
+        rank = shard.start.timestamp() if self.sort_order == 'asc' else -shard.end.timestamp()
+        self._sequence += 1
+        heapq.heappush(self._pending, (rank, self._sequence, shard))
+
+    def _take(self, finished: bool = False) -> Optional[Shard]:
+        '''The next shard to scan; waits while a shard being scanned may still be split.'''
+        with self._changed:
+            if finished:
+                self._active -= 1
+            while not self._pending and self._active and not self._stop.is_set():
+                self._changed.wait(0.1)
+            if not self._pending or self._stop.is_set():
+                return None
+            self._active += 1
+            return heapq.heappop(self._pending)[2]
+
+    def _put(self, shard: Shard, item) -> bool:
+        with self._changed:
+            # The shard being read never waits, so the reader always moves on.
+            while item is not _DONE and self._buffered >= self.buffer_pages and shard is not self._reading:
+                if self._stop.is_set():
+                    return False
+                self._changed.wait(0.1)
+            if self._stop.is_set():
+                return False
+            shard.buffer.append(item)
+            if item is not _DONE:
+                self._buffered += 1
+            self._changed.notify_all()
+            return True
+
+    def _fail(self, error: BaseException):
+        with self._lock:
+            if self._error is None:
+                self._error = error
+        self._stop.set()
+
+    def _time(self, record) -> Optional[datetime]:
+        return parse_time(record.get(self.time_field)) if isinstance(record, dict) and record.get(self.time_field) else None
+
+    def _owned(self, shard: Shard, items: list) -> list:
+        owned = []
+        for item in items:
+            moment = self._time(item)
+            if moment is None:
+                with self._lock:
+                    self.skipped += 1
+                logger.warning("Skipping record without a readable %s: %r", self.time_field,
+                               item.get(self.time_field) if isinstance(item, dict) else item)
+            elif shard.owns(moment):
+                owned.append(item)
+        return owned
+
+    def _split(self, shard: Shard, items: list) -> Optional[List[Shard]]:
+        '''
+        Split what the first page of `shard` did not cover into shards of
+        about pages_per_shard pages. Returns the new shards, `shard` then
+        ending where its first page did.
+        '''
+        boundary = self._time(items[-1])
+        if boundary is None or not shard.owns(boundary):
+            return None
+        covered = boundary - shard.start if self.sort_order == 'asc' else shard.end - boundary
+        if covered <= timedelta(0):
+            return None
+        remaining = (shard.end - shard.start) / covered - 1
+        with self._lock:
+            count = min(math.ceil(remaining / self.pages_per_shard), self.max_shards - len(self._order))
+            if count < 2:
+                return None
+            if self.sort_order == 'asc':
+                children = self._slices(boundary, shard.end, count, shard.closed)
+                shard.end, shard.closed = boundary, False
+            else:
+                # The records at the boundary itself go to the new shards.
+                boundary += timedelta(microseconds=1)
+                children = self._slices(shard.start, boundary, count, False)
+                shard.start = boundary
+            position = self._order.index(shard) + 1
+            self._order[position:position] = children
+            for child in children[1:]:
+                self._queue(child)
+            self.splits += 1
+            self._changed.notify_all()
+        return children
+
+    def _scan(self, shard: Shard) -> Optional[Shard]:
+        '''Page through `shard`; returns the next shard to scan when it was split.'''
+        cursor = None
+        first = True
+        held = []
+        page_size = 1
+        while not self._stop.is_set():
+            response = self.search(format_time(shard.start), format_time(shard.end), cursor)
+            if not response.get('status'):
+                self._fail(PaginationError(response, cursor))
+                return None
+            data = response.get('data')
+            items = page_items(data)
+            following = next_cursor(data)
+            with self._lock:
+                self.pages += 1
+            last = not items or not following or following == cursor
+            page_size = max(page_size, len(items))
+
+            children = self._split(shard, items) if first and not last and self.presorted else None
+            first = False
+            if self.presorted:
+                owned = self._owned(shard, items)
+                if owned and not self._put(shard, owned):
+                    return None
+            else:
+                held.extend(self._owned(shard, items))
+            if children:
+                self._put(shard, _DONE)
+                return children[0]
+            if last:
+                break
+            cursor = following
+
+        if held:
+            held.sort(key=self._time, reverse=self.sort_order == 'desc')
+            for offset in range(0, len(held), page_size):
+                if not self._put(shard, held[offset:offset + page_size]):
+                    return None
+        self._put(shard, _DONE)
+        return None
+
+    def _worker(self):
+        try:
+            shard = self._take()
+            while shard is not None:
+                # A split shard is followed by its first part, which the
+                # reader needs next.
+                shard = self._scan(shard) or self._take(finished=True)
+        except BaseException as e:
+            self._fail(e)
+
+    def _start(self):
+        with self._lock:
+            for shard in self._order:
+                self._queue(shard)
+        for number in range(min(self.workers, len(self._order))):
+            threading.Thread(target=self._worker, name=f'fortidlp-scan-{number}', daemon=True).start()
+        self._started = True
+
+    def _get(self, shard: Shard):
+        with self._changed:
+            while not shard.buffer:
+                if self._error is not None:
+                    raise self._error
+                self._changed.wait(0.1)
+            item = shard.buffer.popleft()
+            if item is not _DONE:
+                self._buffered -= 1
+            self._changed.notify_all()
+            return item
+
+    def _pages(self) -> Iterator[list]:
+        if self._started:
+            raise RuntimeError("A TimeShardedScan can only be iterated once")
+        self._start()
+        position = 0
+        try:
+            while True:
+                with self._changed:
+                    if position >= len(self._order):
+                        return
+                    shard = self._reading = self._order[position]
+                    self._changed.notify_all()
+                while True:
+                    page = self._get(shard)
+                    if page is _DONE:
+                        break
+                    if self.max_items is not None:
+                        page = page[:self.max_items - self.count]
+                    self.count += len(page)
+                    yield page
+                    if self.max_items is not None and self.count >= self.max_items:
+                        return
+                position += 1
+        finally:
+            self._stop.set()
+
+    def __iter__(self) -> Iterator[dict]:
+        for page in self._pages():
+            for item in page:
+                yield self.model(item) if self.model is not None else item
+
+    def iter_pages(self) -> Iterator[list]:
+        '''Yield whole pages instead of single records.'''
+        for page in self._pages():
+            yield self.model.from_list(page) if self.model is not None else page
@@ -0,0 +1,145 @@
+'''
+Checkpointed tailing of the audit logs.
+
+    tail = Audit().tail('/var/lib/siem/fortidlp-audit.json')
+    for log in tail.follow():
+        forward(log)
+
+AuditTail keeps a high-watermark (the newest timestamp delivered and the IDs
+already delivered at that timestamp) in a small JSON checkpoint file. Each
+poll only asks for logs from the watermark on, in ascending order, pages
+forward until caught up and skips what was already delivered. A log counts
+as delivered once the consumer asks for the next one. The checkpoint is
+rewritten atomically once every log of a page was delivered (and every
+`checkpoint_every` logs when set) and when the consumer stops, so a restart
+resumes right after the last log handled.
+
+Times without a timezone are taken as UTC. Logs without a readable
+timestamp cannot be placed against the watermark: they are skipped, counted
+in `skipped` and logged as a warning. Logs without an ID are told apart by
+a hash of their content instead.
+'''
+import os
+import json
+import hashlib
+import logging
+import tempfile
+import threading
+from typing import Iterator, Optional
+
+from fortidlp.scan import parse_time
+
+logger = logging.getLogger(__name__)
+
+
+class AuditTail:
+
+    def __init__(self, audit, checkpoint: str, filter: list = None, operation_types: list = None, start_time: Optional[str] = None,
+                 results_per_page: int = 500, time_field: str = 'timestamp', id_field: str = 'id',
+                 min_interval: float = 5.0, max_interval: float = 300.0, checkpoint_every: Optional[int] = None):
+        self.audit = audit
+        self.checkpoint = checkpoint
+        self.filter = filter
+        self.operation_types = operation_types
+        self.results_per_page = results_per_page
+        self.time_field = time_field
+        self.id_field = id_field
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.checkpoint_every = checkpoint_every
+        self.interval = min_interval
+        self.stopped = threading.Event()
+
+        self.watermark = start_time
+        self.seen = set()
+        self.skipped = 0
+        self._pending = 0
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.checkpoint) as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return
+        self.watermark = state.get('timestamp') or self.watermark
+        self.seen = set(state.get('ids') or [])
+
+    def save(self):
+        '''Write the watermark to the checkpoint file.'''
+        folder = os.path.dirname(os.path.abspath(self.checkpoint))
+        fd, temp_name = tempfile.mkstemp(dir=folder, prefix='.audit-tail.', suffix='.part')
+        with os.fdopen(fd, 'w') as f:
+            json.dump({'timestamp': self.watermark, 'ids': sorted(self.seen, key=str)}, f)
+        os.replace(temp_name, self.checkpoint)
+        self._pending = 0
+
+    def _key(self, log: dict):
+        '''The ID of the log, or a hash of its content when it has none.'''
+        key = log.get(self.id_field)
+        if key is not None:
+            return key
+        content = json.dumps(log, sort_keys=True, separators=(',', ':'), default=str)
+        return 'sha256:' + hashlib.sha256(content.encode()).hexdigest()
+
+    def _is_new(self, log: dict, moment) -> bool:
+        watermark = parse_time(self.watermark) if self.watermark is not None else None
+        if watermark is None:
+            return True
+        if moment != watermark:
+            return moment > watermark
+        return self._key(log) not in self.seen
+
+    def _delivered(self, log: dict, timestamp: str, moment):
+        if self.watermark is None or moment != parse_time(self.watermark):
+            self.watermark = timestamp
+            self.seen = set()
+        self.seen.add(self._key(log))
+        self._pending += 1
+        if self.checkpoint_every and self._pending >= self.checkpoint_every:
+            self.save()
+
+    def poll(self) -> Iterator[dict]:
+        '''Yield the logs newer than the watermark, until caught up.'''
+        pages = self.audit.iter_audit_logs(
+            filter=self.filter,
+            start_time=self.watermark,
+            operation_types=self.operation_types,
+            results_per_page=self.results_per_page,
+            sort_order='asc',
+        ).iter_pages()
+        try:
+            for page in pages:
+                for log in page:
+                    timestamp = log.get(self.time_field)
+                    moment = parse_time(timestamp) if timestamp else None
+                    if moment is None:
+                        self.skipped += 1
+                        logger.warning("Skipping audit log %s without a readable %s: %r", log.get(self.id_field), self.time_field, timestamp)
+                        continue
+                    if not self._is_new(log, moment):
+                        continue
+                    yield log
+                    self._delivered(log, timestamp, moment)
+                if self._pending:
+                    self.save()
+        finally:
+            if self._pending:
+                self.save()
+
+    def follow(self) -> Iterator[dict]:
+        '''
+        Poll forever (until stop()). The wait between polls starts at
+        min_interval, doubles while nothing new arrives, up to max_interval,
+        and drops back to min_interval as soon as new logs show up.
+        '''
+        while not self.stopped.is_set():
+            delivered = 0
+            for log in self.poll():
+                delivered += 1
+                yield log
+            self.interval = self.min_interval if delivered else min(self.max_interval, self.interval * 2)
+            self.stopped.wait(self.interval)
+
+    def stop(self):
+        self.stopped.set()
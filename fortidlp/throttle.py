@@ -0,0 +1,227 @@
+'''
+Client side throttling and retry scheduling for APIHandler.
+
+RateLimiter keeps a token bucket per management host and, optionally, per
+endpoint class (a path prefix such as '/api/v2/incidents'), so calls are
+spread out instead of being rejected with 429. RetryPolicy decides how long
+to back off after a 429, 502, 503, 504 or a dropped connection, honouring
+the Retry-After header and a total time budget per call.
+
+Only reads (GETs, searches and exports) are retried after any of those. A
+call that changes data may have been applied by the server before a 502,
+504 or dropped connection, so it is only retried when the server asked for
+it (429 or 503 with Retry-After) or the connection could not be opened at
+all, unless the policy has retry_mutations=True.
+'''
+import time
+import random
+import threading
+from typing import Dict, Optional
+
+from fortidlp.lazy import requests
+from fortidlp.cache import READ_ONLY_SUFFIXES
+
+
+class TokenBucket:
+    '''Thread-safe token bucket refilled at `rate` tokens per second.'''
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = float(rate)
+        self.capacity = float(burst if burst is not None else max(1.0, rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self) -> float:
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            return -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+    def acquire(self) -> float:
+        '''Take one token, sleeping until it is available. Returns the time waited.'''
+        wait = self._reserve()
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def try_acquire(self) -> bool:
+        '''Take one token only when it is available now.'''
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+    def refund(self):
+        '''Give back a token taken but not used.'''
+        with self._lock:
+            self.tokens = min(self.capacity, self.tokens + 1)
+
+
+class RateLimiter:
+    '''
+    Requests/sec limits shared by every connection using the limiter.
+
+        RateLimiter(rate=20, endpoint_rates={'/api/v2/incidents': 2})
+
+    `rate` applies to each host, `endpoint_rates` to the calls whose path
+    starts with the given prefix (longest prefix wins), on each host.
+    '''
+
+    def __init__(self, rate: Optional[float] = None, burst: Optional[float] = None, endpoint_rates: Optional[Dict[str, float]] = None):
+        self.rate = rate
+        self.burst = burst
+        self.endpoint_rates = dict(endpoint_rates or {})
+        self._prefixes = sorted(self.endpoint_rates, key=len, reverse=True)
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def _bucket(self, key, rate) -> TokenBucket:
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = TokenBucket(rate, self.burst)
+            return bucket
+
+    def endpoint_class(self, path: str) -> Optional[str]:
+        for prefix in self._prefixes:
+            if path.startswith(prefix):
+                return prefix
+        return None
+
+    def acquire(self, host: str, path: str) -> float:
+        '''Wait for the host and endpoint class budgets. Returns the time waited.'''
+        waited = 0.0
+        if self.rate:
+            waited += self._bucket((host, None), self.rate).acquire()
+        prefix = self.endpoint_class(path)
+        if prefix is not None:
+            waited += self._bucket((host, prefix), self.endpoint_rates[prefix]).acquire()
+        return waited
+
+    def try_acquire(self, host: str, path: str) -> bool:
+        '''Take the host and endpoint class tokens only when both are available now.'''
+        host_bucket = self._bucket((host, None), self.rate) if self.rate else None
+        if host_bucket is not None and not host_bucket.try_acquire():
+            return False
+        prefix = self.endpoint_class(path)
+        if prefix is not None and not self._bucket((host, prefix), self.endpoint_rates[prefix]).try_acquire():
+            if host_bucket is not None:
+                host_bucket.refund()
+            return False
+        return True
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    '''Seconds to wait from a Retry-After header (delta-seconds or HTTP date).'''
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    from email.utils import parsedate_to_datetime
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError, IndexError, OverflowError):
+        return None
+
+
+def idempotent(method: str, path: str) -> bool:
+    '''Whether sending the call twice is harmless: GETs and the read-only searches and exports.'''
+    return method in ('GET', 'HEAD') or (method == 'POST' and path.endswith(READ_ONLY_SUFFIXES))
+
+
+def connect_failed(error: Exception) -> bool:
+    '''Whether `error` happened while opening the connection, before anything was sent.'''
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    # Refused connections and DNS failures come as a ConnectionError around
+    # urllib3's MaxRetryError, whose reason is a NewConnectionError.
+    reason = getattr(error.args[0], 'reason', None) if error.args else None
+    return isinstance(reason, requests.packages.urllib3.exceptions.NewConnectionError)
+
+
+class RetryPolicy:
+    '''
+    Exponential backoff with full jitter.
+
+    A call is retried at most `max_retries` times and never waits more than
+    `budget` seconds in total; a Retry-After header sent by the server takes
+    precedence over the computed backoff. Calls that change data are only
+    retried after `mutation_statuses` answers carrying Retry-After, or
+    connections that could not be opened, unless retry_mutations=True.
+    '''
+
+    def __init__(self, max_retries: int = 3, backoff_factor: float = 0.5, backoff_max: float = 30.0, budget: float = 60.0, statuses=(429, 502, 503, 504), retry_connection_errors: bool = True,
+                 mutation_statuses=(429, 503), retry_mutations: bool = False):
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.backoff_max = backoff_max
+        self.budget = budget
+        self.statuses = frozenset(statuses)
+        self.retry_connection_errors = retry_connection_errors
+        self.mutation_statuses = frozenset(mutation_statuses)
+        self.retry_mutations = retry_mutations
+
+    def retries(self, response=None, error: Optional[Exception] = None, idempotent: bool = True) -> bool:
+        '''Whether the answer `response` (or the connection `error`) may be retried.'''
+        if error is not None:
+            return self.retry_connection_errors and (idempotent or self.retry_mutations or connect_failed(error))
+        if response.status_code not in self.statuses:
+            return False
+        if idempotent or self.retry_mutations:
+            return True
+        return response.status_code in self.mutation_statuses and bool(response.headers.get('Retry-After'))
+
+    def delay(self, attempt: int, spent: float, retry_after: Optional[float] = None) -> Optional[float]:
+        '''Seconds to wait before retry number `attempt` + 1, or None to give up.'''
+        if attempt >= self.max_retries:
+            return None
+        if retry_after is not None:
+            delay = retry_after
+        else:
+            delay = random.uniform(0, min(self.backoff_max, self.backoff_factor * (2 ** attempt)))
+        if self.budget is not None and spent + delay > self.budget:
+            return None
+        return delay
+
+
+class ThrottleStats:
+    '''Counters of the time calls spent throttled or backing off.'''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.requests = 0
+            self.throttled = 0
+            self.throttled_time = 0.0
+            self.retries = 0
+            self.backoff_time = 0.0
+            self.gave_up = 0
+
+    def add(self, **counters):
+        with self._lock:
+            for name, value in counters.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'throttled': self.throttled,
+                'throttled_time': self.throttled_time,
+                'retries': self.retries,
+                'backoff_time': self.backoff_time,
+                'gave_up': self.gave_up,
+            }
@@ -0,0 +1,191 @@
+'''
+Streaming multipart uploads for APIHandler.upload.
+
+MultipartStream builds the multipart/form-data body on the fly while the
+request is sent, reading the files in fixed-size chunks, so memory stays
+bounded whatever the file size. UploadManifest remembers the content hash of
+every file uploaded successfully, letting unchanged files be skipped.
+'''
+import os
+import json
+import time
+import uuid
+import hashlib
+import tempfile
+import threading
+from typing import Iterator, Optional
+
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+def _size(source) -> int:
+    if isinstance(source, (bytes, bytearray)):
+        return len(source)
+    try:
+        return os.fstat(source.fileno()).st_size - source.tell()
+    except (AttributeError, OSError, ValueError):
+        position = source.tell()
+        end = source.seek(0, os.SEEK_END)
+        source.seek(position)
+        return end - position
+
+
+def file_digest(path: str, hash_algorithm: str = 'sha256', chunk_size: int = UPLOAD_CHUNK_SIZE) -> str:
+    digest = hashlib.new(hash_algorithm)
+    buffer = memoryview(bytearray(chunk_size))
+    with open(path, 'rb', buffering=0) as f:
+        while True:
+            read = f.readinto(buffer)
+            if not read:
+                break
+            digest.update(buffer[:read])
+    return digest.hexdigest()
+
+
+class MultipartStream:
+    '''
+    multipart/form-data body read lazily from its parts.
+
+    `files` maps a form field to a file object, bytes, or a
+    (filename, file object or bytes[, content type]) tuple, as the requests
+    `files=` argument does; `fields` are sent as plain form fields.
+    Once the body has been read, `digests` holds the hash of each file field.
+    '''
+
+    def __init__(self, files: dict, fields: Optional[dict] = None, chunk_size: int = UPLOAD_CHUNK_SIZE, hash_algorithm: Optional[str] = 'sha256'):
+        self.boundary = uuid.uuid4().hex
+        self.content_type = f'multipart/form-data; boundary={self.boundary}'
+        self.chunk_size = chunk_size
+        self._parts = []
+        # Content hash of every file part, computed while it is sent.
+        self.digests = {} if hash_algorithm else None
+        self._hashed = {}
+
+        for name, value in (fields or {}).items():
+            if not isinstance(value, (str, bytes)):
+                value = json.dumps(value)
+            if isinstance(value, str):
+                value = value.encode()
+            self._parts.append(self._header(name) + value + b'\r\n')
+
+        for name, value in files.items():
+            filename, content_type = getattr(value, 'name', name), 'application/octet-stream'
+            if isinstance(value, tuple):
+                filename, value, content_type = (value + (content_type,))[:3]
+            if isinstance(value, str):
+                value = value.encode()
+            if isinstance(value, (bytes, bytearray)):
+                if self.digests is not None:
+                    self.digests[name] = hashlib.new(hash_algorithm, value)
+            elif self.digests is not None:
+                self.digests[name] = hashlib.new(hash_algorithm)
+                self._hashed[id(value)] = self.digests[name]
+            self._parts.append(self._header(name, os.path.basename(str(filename)), content_type))
+            self._parts.append(value)
+            self._parts.append(b'\r\n')
+
+        self._parts.append(f'--{self.boundary}--\r\n'.encode())
+        self.length = sum(_size(part) for part in self._parts)
+        self._index = 0
+        self._offset = 0
+
+    def _header(self, name, filename=None, content_type=None) -> bytes:
+        disposition = f'form-data; name="{name}"'
+        if filename is not None:
+            disposition += f'; filename="{filename}"'
+        header = f'--{self.boundary}\r\nContent-Disposition: {disposition}\r\n'
+        if content_type:
+            header += f'Content-Type: {content_type}\r\n'
+        return (header + '\r\n').encode()
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __iter__(self) -> Iterator[bytes]:
+        while True:
+            chunk = self.read(self.chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0:
+            size = self.length
+        chunks = []
+        while size > 0 and self._index < len(self._parts):
+            part = self._parts[self._index]
+            if isinstance(part, (bytes, bytearray)):
+                chunk = part[self._offset:self._offset + size]
+                self._offset += len(chunk)
+                if self._offset >= len(part):
+                    self._index += 1
+                    self._offset = 0
+            else:
+                chunk = part.read(min(size, self.chunk_size))
+                if not chunk:
+                    self._index += 1
+                    continue
+                digest = self._hashed.get(id(part))
+                if digest is not None:
+                    digest.update(chunk)
+            chunks.append(chunk)
+            size -= len(chunk)
+        return b''.join(chunks)
+
+
+class UploadManifest:
+    '''
+    On-disk record of the files uploaded successfully, keyed by destination
+    and file path. A file is unchanged when its size and modification time
+    match the record, or failing that when its content hash does.
+    '''
+
+    def __init__(self, path: str, hash_algorithm: str = 'sha256'):
+        self.path = path
+        self.hash_algorithm = hash_algorithm
+        self._lock = threading.Lock()
+        try:
+            with open(path) as f:
+                self.entries = json.load(f)
+        except FileNotFoundError:
+            self.entries = {}
+
+    @staticmethod
+    def key(destination: str, filename: str) -> str:
+        return f'{destination}|{os.path.abspath(filename)}'
+
+    def unchanged(self, destination: str, filename: str) -> Optional[dict]:
+        '''Return the record of the last upload when the file has not changed since.'''
+        entry = self.entries.get(self.key(destination, filename))
+        if entry is None:
+            return None
+        stat = os.stat(filename)
+        if stat.st_size != entry['size']:
+            return None
+        if stat.st_mtime_ns == entry['mtime_ns']:
+            return entry
+        if file_digest(filename, self.hash_algorithm) != entry['hash']:
+            return None
+        # Same content, only touched: remember the new modification time.
+        self.record(destination, filename, entry['hash'])
+        return entry
+
+    def record(self, destination: str, filename: str, digest: Optional[str] = None):
+        stat = os.stat(filename)
+        entry = {
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'hash': digest or file_digest(filename, self.hash_algorithm),
+            'uploaded_at': time.time(),
+        }
+        with self._lock:
+            self.entries[self.key(destination, filename)] = entry
+            self._save()
+        return entry
+
+    def _save(self):
+        folder = os.path.dirname(os.path.abspath(self.path))
+        fd, temp_name = tempfile.mkstemp(dir=folder, prefix='.manifest.', suffix='.part')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(self.entries, f)
+        os.replace(temp_name, self.path)
@@ -1,7 +1,7 @@
 import os
 from setuptools import find_packages, setup
 from setuptools.command.install import install
-cur_dir = os.path.dirname(__file__)
+cur_dir = os.path.dirname(os.path.abspath(__file__))
 
 with open(f"{cur_dir}/requirements.txt") as f:
     required_packages = f.read().splitlines()